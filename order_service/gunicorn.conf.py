@@ -0,0 +1,49 @@
+"""gunicorn 設定（正式環境）：gunicorn -c gunicorn.conf.py
+
+worker 數依 CPU 數計算，可用環境變數覆寫：
+- WEB_CONCURRENCY：worker 數
+- GUNICORN_WORKER_CLASS：gthread（預設，WSGI）或 uvicorn.workers.UvicornWorker（ASGI）
+- GUNICORN_THREADS：gthread 每個 worker 的執行緒數
+- PROMETHEUS_MULTIPROC_DIR：/metrics 加總各 worker 累計值的目錄，多個 worker 時預設為暫存目錄
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+SERVICE = 'order_service'
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+asgi = 'uvicorn' in worker_class.lower()
+wsgi_app = f'{SERVICE}.asgi:application' if asgi else f'{SERVICE}.wsgi:application'
+
+# 同步 worker 建議 2 * CPU + 1；gthread 以執行緒提供並行，ASGI worker 以事件迴圈提供並行，每個 CPU 一個 worker 即可
+default_workers = cpu_count * 2 + 1 if worker_class == 'sync' else cpu_count + 1
+workers = int(os.environ.get('WEB_CONCURRENCY') or default_workers)
+threads = int(os.environ.get('GUNICORN_THREADS', '4')) if worker_class == 'gthread' else 1
+
+# 效能指標保存在各 worker 的記憶體中；多個 worker 時寫入共用目錄，/metrics 才是所有 worker 的加總。
+# 設定檔在 master 執行，環境變數由 fork 出的 worker 繼承
+if workers > 1:
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f'{SERVICE}-metrics'))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+# 定期重啟 worker，避免長時間執行累積的記憶體；加上隨機值讓 worker 不會同時重啟
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def on_starting(server):
+    """清空上次執行留下的指標檔案，計數器從 0 開始"""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
@@ -6,7 +6,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key')
 DEBUG = os.environ.get('DEBUG', 'True') == 'True'
 
-ALLOWED_HOSTS = ['*']
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '*').split(',')
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -38,7 +38,10 @@ TEMPLATES = [
 ]
 
 MIDDLEWARE = [
+    'shared_models.middleware.TracingMiddleware',
+    'shared_models.middleware.PerformanceMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'shared_models.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,14 +61,23 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', 'password'),
         'HOST': os.environ.get('DB_HOST', 'order-db'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # 持久連線：同一個 worker 執行緒重用連線，取用前先檢查連線是否仍可用。
+        # 在 ASGI worker 下每個請求在不同執行緒執行，應設為 0 或改用 PgBouncer
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        # 經由 PgBouncer transaction pooling 連線時必須停用伺服器端游標
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True',
     }
 }
 
+# 以 orjson 輸出 JSON 回應（內容與 DRF JSONRenderer 相同）；未安裝 orjson 時記錄警告並改用 JSONRenderer
+FAST_JSON_RENDERER = os.environ.get('FAST_JSON_RENDERER', 'False') == 'True'
+
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'shared_models.pagination.KeysetPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'shared_models.renderers.ORJSONRenderer' if FAST_JSON_RENDERER else 'rest_framework.renderers.JSONRenderer',
     ],
 }
 
@@ -73,6 +85,64 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 PRODUCT_SERVICE_URL = os.environ.get('PRODUCT_SERVICE_URL', 'http://product-service:8000')
 
+# 商品服務客戶端：連線池、逾時（秒）、重試與斷路器設定
+PRODUCT_SERVICE_POOL_SIZE = int(os.environ.get('PRODUCT_SERVICE_POOL_SIZE', '20'))
+PRODUCT_SERVICE_CONNECT_TIMEOUT = float(os.environ.get('PRODUCT_SERVICE_CONNECT_TIMEOUT', '1'))
+PRODUCT_SERVICE_READ_TIMEOUT = float(os.environ.get('PRODUCT_SERVICE_READ_TIMEOUT', '3'))
+PRODUCT_SERVICE_MAX_RETRIES = int(os.environ.get('PRODUCT_SERVICE_MAX_RETRIES', '2'))
+PRODUCT_SERVICE_RETRY_BACKOFF = float(os.environ.get('PRODUCT_SERVICE_RETRY_BACKOFF', '0.1'))
+PRODUCT_SERVICE_RETRY_BUDGET_RATIO = float(os.environ.get('PRODUCT_SERVICE_RETRY_BUDGET_RATIO', '0.2'))
+PRODUCT_SERVICE_BREAKER_THRESHOLD = int(os.environ.get('PRODUCT_SERVICE_BREAKER_THRESHOLD', '5'))
+PRODUCT_SERVICE_BREAKER_RESET_TIMEOUT = float(os.environ.get('PRODUCT_SERVICE_BREAKER_RESET_TIMEOUT', '30'))
+# async view 批次查詢商品時同時進行的請求上限
+PRODUCT_SERVICE_ASYNC_CONCURRENCY = int(os.environ.get('PRODUCT_SERVICE_ASYNC_CONCURRENCY', '10'))
+
+# 商品目錄快取：行程內 LRU 筆數與存活秒數、ProductReference 資料表的有效秒數
+PRODUCT_CACHE_SIZE = int(os.environ.get('PRODUCT_CACHE_SIZE', '10000'))
+PRODUCT_CACHE_TTL = float(os.environ.get('PRODUCT_CACHE_TTL', '60'))
+PRODUCT_REFERENCE_TTL = float(os.environ.get('PRODUCT_REFERENCE_TTL', '300'))
+# 開啟後 ProductReference 由 consume_product_events 同步維護，不再依 TTL 過期；
+# 各行程 LRU 的資料最多落後 PRODUCT_CACHE_TTL 秒
+PRODUCT_CATALOG_REPLICATED = os.environ.get('PRODUCT_CATALOG_REPLICATED', 'False') == 'True'
+PRODUCT_EVENT_WAIT = float(os.environ.get('PRODUCT_EVENT_WAIT', '25'))
+PRODUCT_EVENT_BATCH_SIZE = int(os.environ.get('PRODUCT_EVENT_BATCH_SIZE', '500'))
+
+# 訂單批次匯入：每批寫入筆數與回報的錯誤列上限
+ORDER_IMPORT_CHUNK_SIZE = int(os.environ.get('ORDER_IMPORT_CHUNK_SIZE', '500'))
+ORDER_IMPORT_MAX_ERRORS = int(os.environ.get('ORDER_IMPORT_MAX_ERRORS', '100'))
+
+# 非同步建立訂單：開啟後 POST /api/orders/ 只寫入待處理訂單與外寄匣訊息並回傳 202，
+# 由 run_outbox_worker 預留庫存並確認或取消訂單
+ORDER_ASYNC_CREATE = os.environ.get('ORDER_ASYNC_CREATE', 'False') == 'True'
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '50'))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', '0.5'))
+OUTBOX_LEASE_SECONDS = float(os.environ.get('OUTBOX_LEASE_SECONDS', '60'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '10'))
+OUTBOX_RETRY_BACKOFF = float(os.environ.get('OUTBOX_RETRY_BACKOFF', '1'))
+
+# 串流匯出：每次從資料庫游標讀取（並預先載入關聯資料）的筆數
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
+
+# 壓測時在回應加上 X-DB-Query-Count 標頭（scripts/benchmark.py 會讀取）
+QUERY_COUNT_HEADER = os.environ.get('QUERY_COUNT_HEADER', 'False') == 'True'
+
+# 效能指標：依比例取樣（0~1）記錄各階段耗時，/metrics 提供 Prometheus 文字格式的直方圖；
+# Server-Timing 標頭會揭露內部耗時，對外服務可關閉
+PERF_METRICS_ENABLED = os.environ.get('PERF_METRICS_ENABLED', 'True') == 'True'
+PERF_METRICS_SAMPLE_RATE = float(os.environ.get('PERF_METRICS_SAMPLE_RATE', '1.0'))
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', 'True') == 'True'
+# 多個 worker 行程時各自的累計值寫入此目錄，/metrics 回傳所有 worker 的加總；gunicorn.conf.py 在多 worker 時自動設定
+PERF_METRICS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR', '')
+
+# 分散式追蹤：traceparent 標頭在服務間傳遞；span 匯出到檔案（每行一批 OTLP JSON）
+# 或 OTLP/HTTP collector（TRACING_EXPORTER=otlp）
+TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'False') == 'True'
+TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', '1.0'))
+TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME', 'order-service')
+TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'file')
+TRACING_FILE = os.environ.get('TRACING_FILE', 'traces.jsonl')
+TRACING_OTLP_ENDPOINT = os.environ.get('TRACING_OTLP_ENDPOINT', 'http://otel-collector:4318/v1/traces')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # 靜態文件設定
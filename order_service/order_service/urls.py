@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.urls import path, include
+from shared_models.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/', include('orders.urls')),
 ]
\ No newline at end of file
@@ -0,0 +1,244 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DailyOrderStats, DailyProductSales, Order, OrderItem
+
+# 營收統計預設排除已取消的訂單
+REVENUE_STATUSES = [status for status, _ in Order.STATUS_CHOICES if status != 'cancelled']
+DEFAULT_DAYS = 30
+MAX_DAYS = 366
+MAX_TOP = 100
+
+
+def _money(value) -> str:
+    return str(Decimal(value or 0).quantize(Decimal('0.01')))
+
+
+def contribution(order: Order, items: Iterable) -> Dict:
+    """訂單對每日統計的貢獻；items 為 OrderItem 或含相同欄位的 dict"""
+    lines = []
+    for item in items:
+        if isinstance(item, dict):
+            lines.append((item['product_id'], item['product_name'], item['quantity'], item['subtotal']))
+        else:
+            lines.append((item.product_id, item.product_name, item.quantity, item.subtotal))
+    return {
+        'date': order.created_at.date(),
+        'status': order.status,
+        'total': Decimal(order.total_amount),
+        'items': lines,
+    }
+
+
+def with_status(snapshot: Dict, status: str) -> Dict:
+    return {**snapshot, 'status': status}
+
+
+def order_snapshot(order: Order) -> Dict:
+    """從資料庫讀取訂單項目，取得目前的貢獻"""
+    return contribution(order, order.items.values('product_id', 'product_name', 'quantity', 'subtotal'))
+
+
+def record_created(orders: Iterable[Tuple[Order, Iterable]]):
+    """新建立的訂單 [(訂單, 項目)]；在建立訂單的交易中呼叫，統計在交易提交後才寫入"""
+    apply([], [contribution(order, items) for order, items in orders])
+
+
+def record_change(old: Dict, new: Dict):
+    """訂單狀態或金額變更：移除舊的貢獻並加上新的貢獻"""
+    apply([old], [new])
+
+
+def apply(removed: Sequence[Dict], added: Sequence[Dict]):
+    """在目前的交易提交後，將貢獻的差異寫入每日統計
+
+    當天、pending 的統計列是每筆下單都會更新的熱門列，若在訂單交易中 UPDATE，
+    列鎖會持有到訂單交易提交，所有建立訂單的交易因此依序執行；
+    提交後才以自己的短交易累加。程序在提交與累加之間中斷會造成少量誤差，可用 rebuild_order_rollups 修正。
+    """
+    removed, added = list(removed), list(added)
+    if removed or added:
+        transaction.on_commit(lambda: _apply(removed, added))
+
+
+def _apply(removed: Sequence[Dict], added: Sequence[Dict]):
+    """相同的 (日期, 狀態) 或 (日期, 狀態, 商品) 先合併成一次 UPDATE
+
+    統計列依鍵值排序後更新，讓並行的累加以相同順序取得列鎖。
+    """
+    orders: Dict[Tuple, List] = {}
+    products: Dict[Tuple, List] = {}
+    for sign, snapshots in ((-1, removed), (1, added)):
+        for snapshot in snapshots:
+            key = (snapshot['date'], snapshot['status'])
+            totals = orders.setdefault(key, [0, Decimal('0')])
+            totals[0] += sign
+            totals[1] += sign * snapshot['total']
+            for product_id, name, quantity, subtotal in snapshot['items']:
+                totals = products.setdefault(key + (product_id,), [0, Decimal('0'), ''])
+                totals[0] += sign * quantity
+                totals[1] += sign * Decimal(subtotal)
+                if sign > 0 and name:
+                    totals[2] = name
+
+    now = timezone.now()
+    with transaction.atomic():
+        for (day, status), (count, revenue) in sorted(orders.items()):
+            if count or revenue:
+                _increment(DailyOrderStats, {'date': day, 'status': status},
+                           {'order_count': count, 'revenue': revenue}, {}, now)
+        for (day, status, product_id), (quantity, revenue, name) in sorted(products.items()):
+            if quantity or revenue:
+                _increment(DailyProductSales, {'date': day, 'status': status, 'product_id': product_id},
+                           {'quantity': quantity, 'revenue': revenue}, {'product_name': name} if name else {}, now)
+
+
+def _increment(model, key: Dict, deltas: Dict, values: Dict, now):
+    """UPDATE ... SET 欄位 = 欄位 + n；統計列不存在時建立，並行建立衝突時改回 UPDATE"""
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**key).update(**updates, **values, updated_at=now):
+        if any(delta < 0 for delta in deltas.values()):
+            # 訂單全部移到其他狀態後刪除歸零的統計列，與重建的結果一致
+            model.objects.filter(**key, **dict.fromkeys(deltas, 0)).delete()
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas, **values)
+    except IntegrityError:
+        model.objects.filter(**key).update(**updates, **values, updated_at=now)
+
+
+def rebuild(start: date, end: date, chunk_days: int = 31) -> int:
+    """以訂單表重新計算 [start, end] 的每日統計，每次處理 chunk_days 天；回傳處理的天數"""
+    day = start
+    while day <= end:
+        last = min(day + timedelta(days=chunk_days - 1), end)
+        with transaction.atomic():
+            _rebuild_range(day, last)
+        day = last + timedelta(days=1)
+    return (end - start).days + 1
+
+
+def _rebuild_range(start: date, end: date):
+    DailyOrderStats.objects.filter(date__range=(start, end)).delete()
+    DailyProductSales.objects.filter(date__range=(start, end)).delete()
+    now = timezone.now()
+
+    orders = Order.objects.filter(created_at__date__range=(start, end)).annotate(
+        day=TruncDate('created_at')
+    ).values('day', 'status').annotate(order_count=Count('id'), revenue=Sum('total_amount'))
+    DailyOrderStats.objects.bulk_create([
+        DailyOrderStats(date=row['day'], status=row['status'], order_count=row['order_count'],
+                        revenue=row['revenue'] or 0, updated_at=now)
+        for row in orders
+    ], batch_size=1000)
+
+    items = OrderItem.objects.filter(order__created_at__date__range=(start, end)).annotate(
+        day=TruncDate('order__created_at')
+    ).values('day', 'order__status', 'product_id').annotate(
+        total_quantity=Sum('quantity'), revenue=Sum('subtotal'), name=Max('product_name')
+    )
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(date=row['day'], status=row['order__status'], product_id=row['product_id'],
+                          product_name=row['name'], quantity=row['total_quantity'],
+                          revenue=row['revenue'] or 0, updated_at=now)
+        for row in items.iterator(chunk_size=2000)
+    ], batch_size=1000)
+
+
+def _date(params, name) -> Optional[date]:
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f'{name} 日期格式錯誤: {value}（應為 YYYY-MM-DD）')
+    return parsed
+
+
+def parse_summary_params(params) -> Dict:
+    """驗證儀表板查詢參數，格式錯誤時拋出 ValueError
+
+    start、end 為包含兩端的日期，預設為最近 30 天；status 以逗號分隔；top 為熱銷商品數量。
+    """
+    end = _date(params, 'end') or timezone.now().date()
+    start = _date(params, 'start') or end - timedelta(days=DEFAULT_DAYS - 1)
+    if start > end:
+        raise ValueError('start 不可晚於 end')
+    if (end - start).days + 1 > MAX_DAYS:
+        raise ValueError(f'日期區間不可超過 {MAX_DAYS} 天')
+
+    statuses = [status for status in params.get('status', '').split(',') if status]
+    invalid = [status for status in statuses if status not in dict(Order.STATUS_CHOICES)]
+    if invalid:
+        raise ValueError(f"無效的訂單狀態: {', '.join(invalid)}")
+
+    top = params.get('top') or '10'
+    if not top.isdigit() or not 1 <= int(top) <= MAX_TOP:
+        raise ValueError(f'top 必須為 1 到 {MAX_TOP} 的整數')
+    return {'start': start, 'end': end, 'statuses': statuses or None, 'top': int(top)}
+
+
+def summarize(start: date, end: date, statuses: Optional[List[str]] = None, top: int = 10) -> Dict:
+    """儀表板資料：每日營收、各狀態訂單數與熱銷商品
+
+    只讀取統計表中日期區間內的資料列，查詢成本與訂單總數無關。
+    statuses 篩選每日營收與熱銷商品，預設排除已取消的訂單；各狀態的統計一律列出所有狀態。
+    """
+    statuses = statuses or REVENUE_STATUSES
+    days = DailyOrderStats.objects.filter(date__range=(start, end))
+
+    daily = {
+        row['date']: row for row in days.filter(status__in=statuses).values('date').annotate(
+            orders=Sum('order_count'), total=Sum('revenue')
+        )
+    }
+    by_status = {
+        row['status']: row for row in days.values('status').annotate(
+            orders=Sum('order_count'), total=Sum('revenue')
+        )
+    }
+    top_products = DailyProductSales.objects.filter(
+        date__range=(start, end), status__in=statuses
+    ).values('product_id').annotate(
+        name=Max('product_name'), total_quantity=Sum('quantity'), total=Sum('revenue')
+    ).order_by('-total', 'product_id')[:top]
+
+    dates = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    return {
+        'start': start,
+        'end': end,
+        'statuses': statuses,
+        # 沒有訂單的日期也列出，圖表不需要自行補零
+        'daily': [
+            {
+                'date': day,
+                'order_count': daily.get(day, {}).get('orders') or 0,
+                'revenue': _money(daily.get(day, {}).get('total')),
+            }
+            for day in dates
+        ],
+        'by_status': [
+            {
+                'status': status,
+                'order_count': by_status.get(status, {}).get('orders') or 0,
+                'revenue': _money(by_status.get(status, {}).get('total')),
+            }
+            for status, _ in Order.STATUS_CHOICES
+        ],
+        'top_products': [
+            {'product_id': row['product_id'], 'product_name': row['name'],
+             'quantity': row['total_quantity'], 'revenue': _money(row['total'])}
+            for row in top_products
+        ],
+    }
@@ -0,0 +1,176 @@
+import asyncio
+import functools
+import random
+import threading
+import weakref
+from typing import Dict, Optional
+
+import httpx
+from django.core.handlers.asgi import ASGIRequest
+from shared_models import metrics, tracing
+
+from .http_client import CircuitOpenError, get_product_client
+
+
+class AsyncServiceClient:
+    """httpx 非同步客戶端，重試規則與 ServiceClient 相同
+
+    斷路器與重試預算沿用同一行程的同步客戶端，兩種呼叫方式共享服務健康狀態。
+    """
+
+    RETRY_STATUS_CODES = {502, 503, 504}
+
+    def __init__(self, base_url: str, pool_size: int, connect_timeout: float, read_timeout: float,
+                 max_retries: int, backoff: float, backoff_cap: float, retry_budget, breaker,
+                 name: str = 'upstream'):
+        self.base_url = base_url.rstrip('/')
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.retry_budget = retry_budget
+        self.breaker = breaker
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        self._counters = {'calls': 0, 'retries': 0, 'failures': 0, 'rejected': 0}
+
+    async def request(self, method: str, path: str, idempotent: bool = True, **kwargs) -> httpx.Response:
+        """送出請求；5xx 與連線錯誤在預算內重試，非冪等請求只重試連線逾時"""
+        attributes = {'peer.service': self.name, 'http.method': method, 'http.url': f"{self.base_url}{path}"}
+        with metrics.track_upstream(self.name), \
+                tracing.start_span(f'{method} {path}', tracing.KIND_CLIENT, attributes) as span:
+            if span is None:
+                return await self._request(method, path, idempotent, **kwargs)
+            # 下游服務以 traceparent 延續同一個 trace
+            kwargs['headers'] = tracing.inject(dict(kwargs.get('headers') or {}))
+            response = await self._request(method, path, idempotent, **kwargs)
+            span.set_attribute('http.status_code', response.status_code)
+            return response
+
+    async def _request(self, method: str, path: str, idempotent: bool, **kwargs) -> httpx.Response:
+        if not self.breaker.allow_request():
+            self._counters['rejected'] += 1
+            raise CircuitOpenError(f"斷路器開啟中，暫停呼叫 {self.base_url}")
+
+        self._counters['calls'] += 1
+        self.retry_budget.deposit()
+        attempt = 0
+        # 與 ServiceClient 相同，每個離開路徑都在 finally 中回報斷路器；
+        # 用戶端中斷連線時 asyncio.CancelledError 不計入失敗，只釋放試探名額
+        succeeded = None
+
+        try:
+            while True:
+                error = None
+                response = None
+                try:
+                    response = await self.client.request(method, path, **kwargs)
+                except httpx.ConnectTimeout as e:
+                    error = e
+                except (httpx.TransportError, httpx.TimeoutException) as e:
+                    error = e
+                    if not idempotent:
+                        succeeded = False
+                        raise
+
+                if error is None and (response.status_code not in self.RETRY_STATUS_CODES or not idempotent):
+                    succeeded = response.status_code < 500
+                    return response
+
+                if attempt >= self.max_retries or not self.retry_budget.withdraw():
+                    succeeded = False
+                    if error is not None:
+                        raise error
+                    return response
+
+                attempt += 1
+                self._counters['retries'] += 1
+                # Full jitter：在 0 到指數退避上限之間隨機等待
+                await asyncio.sleep(random.uniform(0, min(self.backoff_cap, self.backoff * (2 ** attempt))))
+        except Exception:
+            # 其他錯誤（例如 httpx.DecodingError）同樣代表這次呼叫失敗
+            if succeeded is None:
+                succeeded = False
+            raise
+        finally:
+            self._record(succeeded)
+
+    def _record(self, succeeded: Optional[bool]):
+        if succeeded is None:
+            self.breaker.release_probe()
+        elif succeeded:
+            self.breaker.record_success()
+        else:
+            self._counters['failures'] += 1
+            self.breaker.record_failure()
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', path, idempotent=False, **kwargs)
+
+    def stats(self) -> Dict:
+        return {'base_url': self.base_url, 'calls': dict(self._counters)}
+
+
+# httpx.AsyncClient 綁定建立時的事件迴圈，每個迴圈各自建立一個客戶端
+_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+async def close_async_product_client():
+    """關閉並移除目前事件迴圈的客戶端（含連線池）"""
+    with _clients_lock:
+        client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.client.aclose()
+
+
+def closes_product_client(view):
+    """async view 裝飾器：不在 ASGI 下執行時，請求結束後關閉這個請求的客戶端
+
+    WSGI / runserver 下 Django 以 async_to_sync 為每個請求建立新的事件迴圈，
+    客戶端無法給下一個請求重用，不關閉的話每個請求都會留下一個客戶端與連線池。
+    ASGI 下事件迴圈由 worker 共用，客戶端保留給後續請求。
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        finally:
+            if not isinstance(request, ASGIRequest):
+                await close_async_product_client()
+    return wrapper
+
+
+def get_async_product_client() -> AsyncServiceClient:
+    """取得目前事件迴圈共用的商品服務非同步客戶端"""
+    from django.conf import settings
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            sync_client = get_product_client()
+            client = AsyncServiceClient(
+                settings.PRODUCT_SERVICE_URL,
+                pool_size=settings.PRODUCT_SERVICE_POOL_SIZE,
+                connect_timeout=settings.PRODUCT_SERVICE_CONNECT_TIMEOUT,
+                read_timeout=settings.PRODUCT_SERVICE_READ_TIMEOUT,
+                max_retries=settings.PRODUCT_SERVICE_MAX_RETRIES,
+                backoff=settings.PRODUCT_SERVICE_RETRY_BACKOFF,
+                backoff_cap=sync_client.backoff_cap,
+                retry_budget=sync_client.retry_budget,
+                breaker=sync_client.breaker,
+                name=sync_client.name,
+            )
+            _clients[loop] = client
+    return client
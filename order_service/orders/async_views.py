@@ -0,0 +1,137 @@
+import json
+import logging
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework import serializers, status
+from shared_models import metrics
+
+from .async_client import closes_product_client
+from .serializers import OrderCreateSerializer, OrderSerializer
+from .services import AsyncProductService, ProductService
+from .views import apply_reserved_prices, save_order
+
+logger = logging.getLogger(__name__)
+
+# 非同步 view 不經過 DRF，這裡產生與 BaseResponseSerializer 相同格式的回應。
+# Django 4.2 的 require_POST、csrf_exempt 等裝飾器不支援 async view，改為直接檢查或設定屬性
+
+
+def _response(result, message, data=None, error_code="", status_code=status.HTTP_200_OK):
+    with metrics.timer('serialize'):
+        return JsonResponse(
+            {"result": result, "errorCode": error_code, "message": message, "data": data},
+            status=status_code, encoder=DjangoJSONEncoder, json_dumps_params={'ensure_ascii': False}
+        )
+
+
+def _fail(message, error_code, status_code=status.HTTP_400_BAD_REQUEST):
+    return _response(False, message, error_code=error_code, status_code=status_code)
+
+
+def _first_error(errors):
+    if isinstance(errors, dict):
+        errors = next(iter(errors.values()), None)
+    if isinstance(errors, list) and errors:
+        return str(errors[0])
+    return "資料驗證失敗"
+
+
+@closes_product_client
+async def create_order(request):
+    """建立訂單（非同步）- 與 POST /api/orders/ 流程相同，等待商品服務時不佔用執行緒"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return _fail("請求內容必須為 JSON", "VALIDATION_ERROR")
+
+    # 欄位格式在本地檢查，商品資料改由下方以非同步方式取得
+    serializer = OrderCreateSerializer(data=payload, context={'resolve_products': False})
+    if not serializer.is_valid():
+        return _fail(_first_error(serializer.errors), "VALIDATION_ERROR")
+    validated_data = dict(serializer.validated_data)
+
+    products = await AsyncProductService.get_products_catalog(
+        item['product_id'] for item in validated_data['items']
+    )
+    if products is None:
+        return _fail("商品服務暫時無法使用，請稍後再試", "VALIDATION_ERROR")
+    try:
+        validated_data['items'] = OrderCreateSerializer.build_items(validated_data['items'], products)
+    except serializers.ValidationError as e:
+        return _fail(_first_error(e.detail), "VALIDATION_ERROR")
+
+    order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+    quantities = {}
+    for item in validated_data['items']:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+
+    reservation = await AsyncProductService.reserve_stock(order_number, quantities)
+    if reservation is None:
+        return _fail("商品服務暫時無法使用，請稍後再試", "PRODUCT_SERVICE_UNAVAILABLE",
+                     status.HTTP_503_SERVICE_UNAVAILABLE)
+    if not reservation.get('result'):
+        return _fail(reservation.get('message', '庫存預留失敗'),
+                     reservation.get('errorCode') or "STOCK_RESERVATION_FAILED", status.HTTP_409_CONFLICT)
+
+    reserved_items = reservation.get('data', {}).get('items', [])
+    changed = apply_reserved_prices(validated_data['items'], reserved_items)
+    if changed:
+        await sync_to_async(ProductService.refresh_products)(changed)
+
+    try:
+        order = await sync_to_async(save_order)(order_number, validated_data)
+    except Exception as e:
+        # 訂單未寫入，歸還預留的庫存
+        if await AsyncProductService.release_stock(order_number) is None:
+            logger.error(f"訂單 {order_number} 建立失敗且無法釋放庫存預留")
+        return _fail(f'訂單建立失敗: {str(e)}', "ORDER_CREATION_FAILED", status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    if await AsyncProductService.commit_stock(order_number) is None:
+        # 預留仍有效（庫存已扣除），僅確認狀態未同步
+        logger.warning(f"訂單 {order_number} 的庫存預留確認失敗")
+
+    return _response(True, "訂單建立成功", OrderSerializer(order).data, status_code=status.HTTP_201_CREATED)
+
+
+# 與 DRF 的 API view 一致，不檢查 CSRF token
+create_order.csrf_exempt = True
+
+
+@closes_product_client
+async def check_stock(request):
+    """檢查多個商品庫存（非同步）- 例如 ?items=1:2,5:1（商品ID:數量），超過批次上限時各批同時查詢"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    quantities = {}
+    try:
+        for part in filter(None, request.GET.get('items', '').split(',')):
+            product_id, _, quantity = part.partition(':')
+            quantities[int(product_id)] = quantities.get(int(product_id), 0) + int(quantity or 1)
+    except ValueError:
+        return _fail("items 格式應為 商品ID:數量，以逗號分隔", "VALIDATION_ERROR")
+    if not quantities:
+        return _fail("items 為必填參數", "VALIDATION_ERROR")
+
+    products = await AsyncProductService.get_products_info(quantities)
+    if products is None:
+        return _fail("商品服務暫時無法使用，請稍後再試", "PRODUCT_SERVICE_UNAVAILABLE",
+                     status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    items = []
+    for product_id, quantity in sorted(quantities.items()):
+        stock = products[product_id]['stock_quantity'] if product_id in products else 0
+        items.append({
+            'product_id': product_id,
+            'quantity': quantity,
+            'stock_quantity': stock,
+            'available': product_id in products and stock >= quantity,
+        })
+    return _response(True, "庫存查詢成功", {
+        'items': items,
+        'all_available': all(item['available'] for item in items),
+    })
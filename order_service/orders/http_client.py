@@ -0,0 +1,295 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from shared_models import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.RequestException):
+    """斷路器開啟中，請求直接失敗而不送出"""
+
+
+class CircuitBreaker:
+    """斷路器 - 連續失敗達門檻後開啟，冷卻時間過後放行一個試探請求"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """是否允許送出請求"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+            # 半開狀態只放行一個試探請求
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """請求沒有結果（例如被中斷或取消）時只釋放試探名額，不計入成功或失敗"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._times_opened += 1
+                    logger.warning(f"商品服務斷路器開啟，連續失敗 {self._failures} 次")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'times_opened': self._times_opened,
+            }
+
+
+class RetryBudget:
+    """重試預算 - 每個請求存入 ratio 個額度，每次重試消耗 1 個，避免重試放大故障"""
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            return self._tokens
+
+
+class ServiceClient:
+    """共用連線池的 HTTP 客戶端，內建逾時、有限重試與斷路器"""
+
+    RETRY_STATUS_CODES = {502, 503, 504}
+
+    def __init__(self, base_url: str, pool_size: int = 20, connect_timeout: float = 1.0,
+                 read_timeout: float = 3.0, max_retries: int = 2, backoff: float = 0.1,
+                 backoff_cap: float = 1.0, retry_budget: Optional[RetryBudget] = None,
+                 breaker: Optional[CircuitBreaker] = None, name: str = 'upstream'):
+        self.base_url = base_url.rstrip('/')
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.pool_size = pool_size
+
+        # 重試由本客戶端控制，連線池本身不重試
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+
+        self._counters = {'calls': 0, 'retries': 0, 'failures': 0, 'rejected': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    def _sleep_before_retry(self, attempt: int):
+        # Full jitter：在 0 到指數退避上限之間隨機等待
+        time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff * (2 ** attempt))))
+
+    def request(self, method: str, path: str, idempotent: bool = True, **kwargs) -> requests.Response:
+        """送出請求；5xx 與連線錯誤在預算內重試，非冪等請求只重試連線逾時"""
+        attributes = {'peer.service': self.name, 'http.method': method, 'http.url': f"{self.base_url}{path}"}
+        with metrics.track_upstream(self.name), \
+                tracing.start_span(f'{method} {path}', tracing.KIND_CLIENT, attributes) as span:
+            if span is None:
+                return self._request(method, path, idempotent, **kwargs)
+            # 下游服務以 traceparent 延續同一個 trace
+            kwargs['headers'] = tracing.inject(dict(kwargs.get('headers') or {}))
+            response = self._request(method, path, idempotent, **kwargs)
+            span.set_attribute('http.status_code', response.status_code)
+            return response
+
+    def _request(self, method: str, path: str, idempotent: bool, **kwargs) -> requests.Response:
+        if not self.breaker.allow_request():
+            self._count('rejected')
+            raise CircuitOpenError(f"斷路器開啟中，暫停呼叫 {self.base_url}")
+
+        self._count('calls')
+        self.retry_budget.deposit()
+        kwargs.setdefault('timeout', self.timeout)
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        # 請求的結果：True 成功、False 失敗；每個離開路徑都在 finally 中回報斷路器，
+        # 否則半開狀態的試探名額不會釋放，之後的請求全部被拒絕
+        succeeded = None
+
+        try:
+            while True:
+                error = None
+                response = None
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except requests.ConnectTimeout as e:
+                    error = e
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+                    if not idempotent:
+                        succeeded = False
+                        raise
+
+                if error is None and (response.status_code not in self.RETRY_STATUS_CODES or not idempotent):
+                    succeeded = response.status_code < 500
+                    return response
+
+                if attempt >= self.max_retries or not self.retry_budget.withdraw():
+                    succeeded = False
+                    if error is not None:
+                        raise error
+                    return response
+
+                attempt += 1
+                self._count('retries')
+                self._sleep_before_retry(attempt)
+        except Exception:
+            # 其他錯誤（回應解碼失敗、重新導向過多等）同樣代表這次呼叫失敗
+            if succeeded is None:
+                succeeded = False
+            raise
+        finally:
+            self._record(succeeded)
+
+    def _record(self, succeeded: Optional[bool]):
+        if succeeded is None:
+            self.breaker.release_probe()
+        elif succeeded:
+            self.breaker.record_success()
+        else:
+            self._count('failures')
+            self.breaker.record_failure()
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, idempotent=False, **kwargs)
+
+    def pool_stats(self) -> Dict:
+        """連線池統計 - connections_created 遠小於 requests 代表連線有被重用"""
+        requests_sent = connections_created = idle = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            connections_created += pool.num_connections
+            idle += pool.pool.qsize() if pool.pool is not None else 0
+        return {
+            'pool_size': self.pool_size,
+            'requests': requests_sent,
+            'connections_created': connections_created,
+            'idle_connections': idle,
+            'reuse_ratio': round(1 - connections_created / requests_sent, 4) if requests_sent else 0.0,
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'base_url': self.base_url,
+            'timeout': {'connect': self.timeout[0], 'read': self.timeout[1]},
+            'calls': counters,
+            'retry_budget_tokens': round(self.retry_budget.tokens, 2),
+            'circuit_breaker': self.breaker.stats(),
+            'pool': self.pool_stats(),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_product_client() -> ServiceClient:
+    """取得行程共用的商品服務客戶端；fork 後的子行程會建立自己的連線池"""
+    global _client, _client_pid
+    from django.conf import settings
+
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            _client = ServiceClient(
+                settings.PRODUCT_SERVICE_URL,
+                pool_size=settings.PRODUCT_SERVICE_POOL_SIZE,
+                connect_timeout=settings.PRODUCT_SERVICE_CONNECT_TIMEOUT,
+                read_timeout=settings.PRODUCT_SERVICE_READ_TIMEOUT,
+                max_retries=settings.PRODUCT_SERVICE_MAX_RETRIES,
+                backoff=settings.PRODUCT_SERVICE_RETRY_BACKOFF,
+                retry_budget=RetryBudget(ratio=settings.PRODUCT_SERVICE_RETRY_BUDGET_RATIO),
+                breaker=CircuitBreaker(
+                    failure_threshold=settings.PRODUCT_SERVICE_BREAKER_THRESHOLD,
+                    reset_timeout=settings.PRODUCT_SERVICE_BREAKER_RESET_TIMEOUT,
+                ),
+                name='product-service',
+            )
+            _client_pid = pid
+    return _client
@@ -0,0 +1,214 @@
+import csv
+import json
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import analytics
+from .models import Order, OrderItem
+from .serializers import OrderImportSerializer
+from .services import ProductService
+
+# CSV 欄位；items 格式為 "商品ID:數量[:單價];..."，例如 "1:2;5:1:39.99"
+CSV_FIELDS = ['order_number', 'customer_name', 'customer_email', 'customer_phone',
+              'shipping_address', 'notes', 'status', 'created_at', 'items']
+
+
+class RowError(Exception):
+    """單列解析錯誤"""
+
+
+def iter_lines(stream: Iterable) -> Iterator[str]:
+    """逐行解碼位元組串流，不把整個上傳內容讀進記憶體"""
+    for number, line in enumerate(stream):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if number == 0:
+            line = line.lstrip('﻿')
+        yield line
+
+
+def parse_ndjson(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    """每行一筆 JSON 訂單，回傳 (行號, 資料或 RowError)"""
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, RowError(f'JSON 格式錯誤: {e}')
+            continue
+        if not isinstance(row, dict):
+            yield line_no, RowError('每行必須是一個 JSON 物件')
+            continue
+        yield line_no, row
+
+
+def _parse_csv_items(value: str) -> List[Dict]:
+    items = []
+    for part in filter(None, (p.strip() for p in (value or '').split(';'))):
+        fields = part.split(':')
+        if len(fields) not in (2, 3):
+            raise RowError(f'items 格式錯誤: {part}（應為 商品ID:數量[:單價]）')
+        item = {'product_id': fields[0], 'quantity': fields[1]}
+        if len(fields) == 3:
+            item['unit_price'] = fields[2]
+        items.append(item)
+    return items
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    """第一行為標題列，欄位見 CSV_FIELDS，回傳 (行號, 資料或 RowError)"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        line_no = reader.line_num
+        # 空白欄位視為未提供，讓序列化器套用預設值
+        row = {key: value for key, value in row.items() if key and value not in (None, '')}
+        try:
+            row['items'] = _parse_csv_items(row.get('items'))
+        except RowError as e:
+            yield line_no, e
+            continue
+        yield line_no, row
+
+
+PARSERS = {
+    'ndjson': parse_ndjson,
+    'csv': parse_csv,
+}
+
+
+class OrderImporter:
+    """串流匯入訂單
+
+    逐列解析並驗證欄位，每累積 chunk_size 筆後以一次請求查詢整批商品，
+    再以 bulk_create 寫入訂單與項目。單列錯誤只記錄不中斷，記憶體用量只與 chunk_size 有關。
+    匯入的是歷史訂單，不會預留或扣除庫存。
+    """
+
+    def __init__(self, chunk_size: Optional[int] = None, max_errors: Optional[int] = None):
+        self.chunk_size = chunk_size or settings.ORDER_IMPORT_CHUNK_SIZE
+        self.max_errors = settings.ORDER_IMPORT_MAX_ERRORS if max_errors is None else max_errors
+        self.total = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def _error(self, line_no: int, message: str):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line_no, 'message': message})
+
+    def run(self, rows: Iterable[Tuple[int, object]]) -> Dict:
+        chunk = []
+        for line_no, row in rows:
+            self.total += 1
+            if isinstance(row, RowError):
+                self._error(line_no, str(row))
+                continue
+
+            serializer = OrderImportSerializer(data=row)
+            if not serializer.is_valid():
+                self._error(line_no, _first_error(serializer.errors))
+                continue
+
+            chunk.append((line_no, serializer.validated_data))
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk)
+                chunk = []
+
+        if chunk:
+            self._flush(chunk)
+        return self.summary()
+
+    def summary(self) -> Dict:
+        return {
+            'total': self.total,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+    def _flush(self, chunk):
+        product_ids = {item['product_id'] for _, data in chunk for item in data['items']}
+        products = ProductService.get_products_catalog(product_ids)
+        if products is None:
+            for line_no, _ in chunk:
+                self._error(line_no, '商品服務暫時無法使用，請稍後再試')
+            return
+
+        pending = []
+        for line_no, data in chunk:
+            try:
+                items = OrderImportSerializer.build_items(data['items'], products)
+            except Exception as e:
+                self._error(line_no, _first_error(getattr(e, 'detail', str(e))))
+                continue
+
+            order = Order(
+                order_number=data.get('order_number') or f"ORD-{uuid.uuid4().hex[:8].upper()}",
+                customer_name=data['customer_name'],
+                customer_email=data['customer_email'],
+                customer_phone=data['customer_phone'],
+                shipping_address=data['shipping_address'],
+                notes=data.get('notes', ''),
+                status=data.get('status', 'pending'),
+                total_amount=sum(item['subtotal'] for item in items),
+            )
+            pending.append((line_no, order, items, data.get('created_at')))
+
+        if not pending:
+            return
+        try:
+            with transaction.atomic():
+                self._insert(pending)
+            self.imported += len(pending)
+        except IntegrityError:
+            # 整批失敗（例如訂單編號重複）時逐筆寫入，找出有問題的列
+            for line_no, order, items, created_at in pending:
+                order.pk = None
+                try:
+                    with transaction.atomic():
+                        self._insert([(line_no, order, items, created_at)])
+                    self.imported += 1
+                except IntegrityError as e:
+                    self._error(line_no, f'訂單寫入失敗: {e}')
+
+    @staticmethod
+    def _insert(pending):
+        orders = Order.objects.bulk_create([order for _, order, _, _ in pending])
+        # created_at 為 auto_now_add，bulk_create 一律寫入現在時間；有指定建立時間的訂單再以一次 UPDATE 改回，
+        # 每日統計才會記在訂單原本的日期
+        backdated = []
+        for order, (_, _, _, created_at) in zip(orders, pending):
+            if created_at is not None:
+                order.created_at = created_at
+                backdated.append(order)
+        if backdated:
+            Order.objects.bulk_update(backdated, ['created_at'])
+        items = [
+            [OrderItem(order=order, **item) for item in order_items]
+            for order, (_, _, order_items, _) in zip(orders, pending)
+        ]
+        OrderItem.objects.bulk_create([item for order_items in items for item in order_items])
+        analytics.record_created(zip(orders, items))
+
+
+def _first_error(errors) -> str:
+    """提取第一個錯誤訊息（包含巢狀欄位）"""
+    if isinstance(errors, dict):
+        for field, messages in errors.items():
+            message = _first_error(messages)
+            if message:
+                return message if field in ('non_field_errors', 'items') else f'{field}: {message}'
+    elif isinstance(errors, (list, tuple)):
+        for messages in errors:
+            message = _first_error(messages)
+            if message:
+                return message
+    elif errors:
+        return str(errors)
+    return '資料驗證失敗'
@@ -0,0 +1,26 @@
+from shared_models.query_plans import BaseQueryPlanCommand
+
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+from orders.models import Order, OrderItem
+from orders.views import OrderDetailView, OrderListView
+
+
+class Command(BaseQueryPlanCommand):
+
+    def get_querysets(self):
+        order_ids = list(OrderListView.queryset.values_list('id', flat=True)[:21]) or [1]
+        product_id = OrderItem.objects.values_list('product_id', flat=True).first() or 1
+        email = Order.objects.values_list('customer_email', flat=True).first() or 'test@example.com'
+        return [
+            ('訂單列表', OrderListView.queryset.order_by('-created_at', '-id')[:21]),
+            ('訂單項目預先載入', OrderItem.objects.filter(order_id__in=order_ids)),
+            ('訂單詳情', OrderDetailView.queryset.filter(pk=order_ids[0])),
+            ('商品的訂單項目', OrderItem.objects.filter(product_id=product_id)),
+            ('客戶訂單歷史', Order.objects.alias(email_normalized=Lower('customer_email')).filter(
+                email_normalized=email.lower()
+            ).values('id', 'order_number', 'status', 'total_amount', 'created_at').annotate(
+                item_count=Count('items')
+            ).order_by('-created_at', '-id')[:21]),
+        ]
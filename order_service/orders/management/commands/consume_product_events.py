@@ -0,0 +1,55 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from orders.product_events import ProductEventConsumer
+
+
+class Command(BaseCommand):
+    help = "消費商品服務的事件串流，讓 ProductReference 與商品目錄保持同步"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='讀完目前所有事件後結束')
+        parser.add_argument('--limit', type=int, default=settings.PRODUCT_EVENT_BATCH_SIZE,
+                            help='每次讀取的事件數')
+        parser.add_argument('--wait', type=float, default=settings.PRODUCT_EVENT_WAIT,
+                            help='長輪詢等待秒數')
+        parser.add_argument('--reset', action='store_true', help='從頭重新消費所有保留中的事件')
+
+    def handle(self, *args, **options):
+        consumer = ProductEventConsumer(limit=options['limit'], wait=0 if options['once'] else options['wait'])
+        if options['reset']:
+            consumer.reset()
+        self.stdout.write(f'從事件 {consumer.offset.position} 之後開始消費')
+
+        self.stopping = False
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self._stop)
+
+        failures = 0
+        while not self.stopping:
+            close_old_connections()
+            result = consumer.poll()
+            if result is None:
+                if options['once']:
+                    raise CommandError('商品服務無法連線')
+                # 商品服務無法連線，退避後重試
+                failures += 1
+                time.sleep(min(2 ** failures, 30))
+                continue
+            failures = 0
+            if result['events']:
+                self.stdout.write(
+                    f"已套用 {result['events']} 筆事件（更新 {result['updated']}、移除 {result['removed']}），"
+                    f"位置 {consumer.offset.position}"
+                )
+            if options['once'] and not result['has_more']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'商品事件消費結束，位置 {consumer.offset.position}'))
+
+    def _stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.importer import PARSERS, OrderImporter, iter_lines
+
+
+class Command(BaseCommand):
+    help = "從 NDJSON 或 CSV 檔案批次匯入訂單（不預留庫存）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='檔案路徑，- 代表標準輸入')
+        parser.add_argument('--format', choices=sorted(PARSERS), default=None,
+                            help='檔案格式；未指定時依副檔名判斷，預設 ndjson')
+        parser.add_argument('--chunk-size', type=int, default=None, help='每批寫入筆數')
+        parser.add_argument('--max-errors', type=int, default=None, help='最多回報的錯誤列數')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        importer = OrderImporter(chunk_size=options['chunk_size'], max_errors=options['max_errors'])
+
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        except OSError as e:
+            raise CommandError(f'無法開啟檔案: {e}')
+        with stream:
+            summary = importer.run(PARSERS[import_format](iter_lines(stream)))
+
+        for error in summary['errors']:
+            self.stderr.write(f"第 {error['line']} 行: {error['message']}")
+        if summary['errors_truncated']:
+            self.stderr.write(f"（僅列出前 {len(summary['errors'])} 筆錯誤）")
+        style = self.style.SUCCESS if not summary['failed'] else self.style.WARNING
+        self.stdout.write(style(
+            f"匯入完成：共 {summary['total']} 筆，成功 {summary['imported']} 筆，失敗 {summary['failed']} 筆"
+        ))
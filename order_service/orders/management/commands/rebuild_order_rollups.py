@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_date
+
+from orders import analytics
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = "以訂單表重新計算每日統計（訂單數、營收、商品銷售），用於首次部署或修正誤差"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='開始日期 YYYY-MM-DD，預設為第一筆訂單的日期')
+        parser.add_argument('--end', help='結束日期 YYYY-MM-DD（包含），預設為最後一筆訂單的日期')
+        parser.add_argument('--chunk-days', type=int, default=31, help='每個交易處理的天數')
+
+    def handle(self, *args, **options):
+        bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        try:
+            start = self._date(options['start']) or (bounds['first'] and bounds['first'].date())
+            end = self._date(options['end']) or (bounds['last'] and bounds['last'].date())
+        except ValueError as e:
+            raise CommandError(str(e))
+        if start is None or end is None:
+            self.stdout.write('沒有訂單，不需重建')
+            return
+        if start > end:
+            raise CommandError('--start 不可晚於 --end')
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days 必須大於 0')
+
+        days = analytics.rebuild(start, end, options['chunk_days'])
+        self.stdout.write(self.style.SUCCESS(f'已重建 {start} 到 {end} 共 {days} 天的每日統計'))
+
+    @staticmethod
+    def _date(value):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(f'日期格式錯誤: {value}（應為 YYYY-MM-DD）')
+        return parsed
@@ -0,0 +1,52 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from orders import outbox
+from orders.models import OutboxMessage
+
+
+class Command(BaseCommand):
+    help = "處理訂單外寄匣訊息（非同步建立訂單的庫存預留），不需要外部訊息佇列"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='處理完目前可處理的訊息後結束')
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE,
+                            help='每次取出的訊息數')
+        parser.add_argument('--poll-interval', type=float, default=settings.OUTBOX_POLL_INTERVAL,
+                            help='沒有訊息時等待的秒數')
+        parser.add_argument('--requeue-failed', action='store_true',
+                            help='先將失敗的訊息重新排入佇列')
+
+    def handle(self, *args, **options):
+        if options['requeue_failed']:
+            requeued = OutboxMessage.objects.filter(status='failed').update(
+                status='pending', attempts=0, available_at=timezone.now(), updated_at=timezone.now()
+            )
+            self.stdout.write(f'重新排入 {requeued} 筆失敗的訊息')
+
+        self.stopping = False
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self._stop)
+
+        processed = 0
+        while not self.stopping:
+            # 長時間執行的行程需自行回收逾時或中斷的資料庫連線
+            close_old_connections()
+            claimed = outbox.process_batch(batch_size=options['batch_size'])
+            processed += claimed
+            if claimed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'外寄匣 worker 結束，共處理 {processed} 筆訊息'))
+
+    def _stop(self, signum, frame):
+        # 處理完目前這批再結束，避免訊息停在處理中直到租約過期
+        self.stopping = True
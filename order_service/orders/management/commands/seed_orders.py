@@ -0,0 +1,69 @@
+import random
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders import analytics
+from orders.models import Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = "以 bulk_create 快速建立大量訂單（壓測用，不呼叫商品服務也不扣庫存）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000, help='訂單數')
+        parser.add_argument('--products', type=int, default=10000,
+                            help='項目的商品 ID 範圍為 1..N')
+        parser.add_argument('--max-items', type=int, default=3, help='每筆訂單最多幾個項目')
+        parser.add_argument('--customers', type=int, default=1000, help='不同客戶 Email 的數量')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每次 INSERT 的訂單數')
+        parser.add_argument('--seed', type=int, default=42, help='亂數種子')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        statuses = [choice for choice, _ in Order.STATUS_CHOICES]
+        # 同一個商品使用固定的名稱與價格，與真實訂單的分佈較接近
+        prices = {}
+
+        created = 0
+        while created < options['orders']:
+            size = min(options['batch_size'], options['orders'] - created)
+            orders = []
+            items_per_order = []
+            for _ in range(size):
+                customer = rng.randrange(options['customers'])
+                items = []
+                for product_id in rng.sample(range(1, options['products'] + 1),
+                                             min(rng.randint(1, options['max_items']), options['products'])):
+                    if product_id not in prices:
+                        prices[product_id] = Decimal(rng.randint(100, 100000)) / 100
+                    items.append(OrderItem(
+                        product_id=product_id, product_name=f'商品 {product_id}',
+                        unit_price=prices[product_id], quantity=rng.randint(1, 5)
+                    ))
+                for item in items:
+                    item.calculate_subtotal()
+                orders.append(Order(
+                    order_number=f'SEED-{uuid.uuid4().hex[:12].upper()}',
+                    customer_name=f'客戶 {customer}',
+                    customer_email=f'customer{customer}@example.com',
+                    customer_phone=f'09{customer:08d}',
+                    shipping_address='台北市信義區',
+                    status=rng.choice(statuses),
+                    total_amount=sum(item.subtotal for item in items),
+                ))
+                items_per_order.append(items)
+
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(orders)
+                for order, items in zip(orders, items_per_order):
+                    for item in items:
+                        item.order = order
+                OrderItem.objects.bulk_create([item for items in items_per_order for item in items])
+                analytics.record_created(zip(orders, items_per_order))
+            created += size
+            self.stdout.write(f'已建立 {created}/{options["orders"]} 筆訂單')
+
+        self.stdout.write(self.style.SUCCESS(f'完成：{created} 筆訂單'))
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_event_offset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', '待處理'), ('confirmed', '已確認'), ('shipped', '已出貨'), ('delivered', '已送達'), ('cancelled', '已取消')], max_length=20)),
+                ('product_id', models.IntegerField()),
+                ('product_name', models.CharField(blank=True, max_length=200)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('date', 'status', 'product_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyOrderStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', '待處理'), ('confirmed', '已確認'), ('shipped', '已出貨'), ('delivered', '已送達'), ('cancelled', '已取消')], max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('date', 'status')},
+            },
+        ),
+    ]
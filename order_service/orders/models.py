@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 from shared_models.models import BaseModel
 
 class Order(BaseModel):
@@ -19,17 +21,114 @@ class Order(BaseModel):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     notes = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            # 訂單列表依 (created_at, id) 由新到舊分頁
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+            # 客戶訂單歷史：Email 以小寫比對（LOWER(customer_email) = ...），電話為完全比對，皆依建立時間分頁
+            models.Index(
+                Lower('customer_email'), models.F('created_at').desc(), models.F('id').desc(),
+                name='order_customer_email_idx'
+            ),
+            models.Index(fields=['customer_phone', '-created_at', '-id'], name='order_customer_phone_idx'),
+        ]
+    
     def __str__(self):
         return f"訂單 {self.order_number}"
 
+class OrderItemQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create 不會呼叫 save()，在這裡先計算小計
+        objs = list(objs)
+        for obj in objs:
+            obj.calculate_subtotal()
+        return super().bulk_create(objs, *args, **kwargs)
+
 class OrderItem(BaseModel):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
-    product_id = models.IntegerField()  # 商品服務的商品ID
+    product_id = models.IntegerField(db_index=True)  # 商品服務的商品ID
     product_name = models.CharField(max_length=200)  # 冗余存儲，避免服務依賴
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.IntegerField()
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
     
-    def save(self, *args, **kwargs):
+    objects = OrderItemQuerySet.as_manager()
+    
+    def calculate_subtotal(self):
         self.subtotal = self.unit_price * self.quantity
-        super().save(*args, **kwargs)
\ No newline at end of file
+    
+    def save(self, *args, **kwargs):
+        self.calculate_subtotal()
+        super().save(*args, **kwargs)
+
+
+class DailyOrderStats(models.Model):
+    """每日訂單統計 - 依 (建立日期, 狀態) 彙總訂單數與金額，隨訂單建立與狀態變更增量更新"""
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        # 唯一鍵以日期開頭，同時用於儀表板的日期區間查詢
+        unique_together = [('date', 'status')]
+    
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.order_count}"
+
+class DailyProductSales(models.Model):
+    """每日商品銷售統計 - 依 (建立日期, 訂單狀態, 商品) 彙總數量與金額"""
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    product_id = models.IntegerField()
+    product_name = models.CharField(max_length=200, blank=True)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = [('date', 'status', 'product_id')]
+    
+    def __str__(self):
+        return f"{self.date} {self.status} 商品 {self.product_id}: {self.quantity}"
+
+class OutboxMessage(BaseModel):
+    """交易外寄匣 - 與訂單在同一個交易中寫入，由背景 worker 取出處理
+
+    處理成功的訊息直接刪除，資料表只保留待處理與失敗的訊息。
+    """
+    STATUS_CHOICES = [
+        ('pending', '待處理'),
+        ('processing', '處理中'),
+        ('failed', '失敗'),
+    ]
+    
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # 下次可處理的時間，用於重試退避
+    available_at = models.DateTimeField(default=timezone.now)
+    # 處理中訊息的租約到期時間，worker 中斷後由其他 worker 接手
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        indexes = [
+            # worker 依 available_at 取出待處理訊息
+            models.Index(fields=['status', 'available_at'], name='outbox_ready_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.topic}#{self.id} ({self.status})"
+
+
+class EventOffset(models.Model):
+    """事件消費進度 - 記錄每個消費者已處理到的事件 id"""
+    consumer = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.consumer}: {self.position}"
@@ -0,0 +1,229 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List
+
+import httpx
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import analytics
+from .models import Order, OrderItem, OutboxMessage
+from .services import ProductService
+
+logger = logging.getLogger(__name__)
+
+TOPIC_RESERVE_ORDER = 'order.reserve'
+TOPIC_RELEASE_ORDER = 'order.release'
+
+HANDLERS: Dict[str, Callable[[Dict], None]] = {}
+FAILURE_HANDLERS: Dict[str, Callable[[Dict], None]] = {}
+
+
+class RetryableError(Exception):
+    """暫時性錯誤，訊息稍後重試"""
+
+
+# 只有暫時性錯誤與連線錯誤會重試，其他例外（資料錯誤、程式錯誤）重試也不會成功
+RETRYABLE_ERRORS = (RetryableError, requests.RequestException, httpx.TransportError)
+
+
+def handler(topic: str):
+    """註冊 topic 的處理函式；處理函式必須可重複執行（至少一次遞送）"""
+    def register(func):
+        HANDLERS[topic] = func
+        return func
+    return register
+
+
+def failure_handler(topic: str):
+    """註冊訊息標記為 failed 後的補償函式，例如把等待處理的業務資料改為失敗狀態"""
+    def register(func):
+        FAILURE_HANDLERS[topic] = func
+        return func
+    return register
+
+
+def enqueue(topic: str, payload: Dict) -> OutboxMessage:
+    """寫入外寄匣訊息；應與業務資料在同一個交易中呼叫"""
+    return OutboxMessage.objects.create(topic=topic, payload=payload)
+
+
+def claim_batch(batch_size: int, lease_seconds: float) -> List[OutboxMessage]:
+    """取出一批可處理的訊息並標記為處理中
+
+    PostgreSQL 使用 SELECT ... FOR UPDATE SKIP LOCKED，多個 worker 不會取到同一筆；
+    租約過期的處理中訊息（worker 中斷）會被重新取出。
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True).filter(
+                Q(status='pending', available_at__lte=now) | Q(status='processing', locked_until__lt=now)
+            ).order_by('available_at', 'id')[:batch_size]
+        )
+        if not messages:
+            return []
+        locked_until = now + timedelta(seconds=lease_seconds)
+        OutboxMessage.objects.filter(id__in=[message.id for message in messages]).update(
+            status='processing', locked_until=locked_until, attempts=F('attempts') + 1, updated_at=now
+        )
+    for message in messages:
+        message.status = 'processing'
+        message.locked_until = locked_until
+        message.attempts += 1
+    return messages
+
+
+def process_message(message: OutboxMessage, max_attempts: int, retry_backoff: float):
+    """執行訊息的處理函式；成功即刪除
+
+    暫時性錯誤依指數退避重試，其他錯誤或超過次數時標記為 failed 並執行 topic 的補償函式。
+    """
+    func = HANDLERS.get(message.topic)
+    try:
+        if func is None:
+            raise ValueError(f'未知的 topic: {message.topic}')
+        func(message.payload)
+    except Exception as e:
+        retryable = isinstance(e, RETRYABLE_ERRORS) and message.attempts < max_attempts
+        message.last_error = str(e)[:2000]
+        message.locked_until = None
+        if retryable:
+            message.status = 'pending'
+            delay = min(retry_backoff * (2 ** (message.attempts - 1)), 300)
+            message.available_at = timezone.now() + timedelta(seconds=delay)
+            logger.warning(f"外寄匣訊息 {message} 第 {message.attempts} 次處理失敗，{delay:.0f} 秒後重試: {e}")
+        else:
+            message.status = 'failed'
+            logger.error(f"外寄匣訊息 {message} 處理失敗，不再重試: {e}")
+        message.save(update_fields=['status', 'available_at', 'locked_until', 'last_error', 'updated_at'])
+        if message.status == 'failed' and message.topic in FAILURE_HANDLERS:
+            try:
+                FAILURE_HANDLERS[message.topic](message.payload)
+            except Exception:
+                logger.exception(f"外寄匣訊息 {message} 的補償處理失敗")
+        return False
+
+    OutboxMessage.objects.filter(id=message.id).delete()
+    return True
+
+
+def process_batch(batch_size: int = None, lease_seconds: float = None,
+                  max_attempts: int = None, retry_backoff: float = None) -> int:
+    """處理一批訊息，回傳取出的訊息數"""
+    messages = claim_batch(batch_size or settings.OUTBOX_BATCH_SIZE,
+                           lease_seconds or settings.OUTBOX_LEASE_SECONDS)
+    for message in messages:
+        process_message(message, max_attempts or settings.OUTBOX_MAX_ATTEMPTS,
+                        retry_backoff if retry_backoff is not None else settings.OUTBOX_RETRY_BACKOFF)
+    return len(messages)
+
+
+@handler(TOPIC_RESERVE_ORDER)
+def reserve_order(payload: Dict):
+    """非同步建立訂單：預留庫存後確認訂單；預留被拒絕時取消訂單
+
+    以訂單編號作為預留 reference，重試時商品服務不會重複扣庫存。
+    """
+    order = Order.objects.filter(id=payload['order_id']).first()
+    if order is None:
+        return
+    if order.status == 'cancelled':
+        # 處理期間被取消時可能已建立預留；釋放可重複執行
+        _release(order)
+        return
+    if order.status != 'pending':
+        return
+
+    items = list(order.items.all())
+    # 確認前的名稱與金額皆為空，每日統計以此狀態記錄
+    previous = analytics.contribution(order, items)
+    quantities = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    reservation = ProductService.reserve_stock(order.order_number, quantities)
+    if reservation is None:
+        raise RetryableError('商品服務暫時無法使用')
+    if not reservation.get('result'):
+        with transaction.atomic():
+            if Order.objects.filter(id=order.id, status='pending').update(
+                status='cancelled', updated_at=timezone.now()
+            ):
+                analytics.record_change(previous, analytics.with_status(previous, 'cancelled'))
+        logger.info(f"訂單 {order.order_number} 庫存預留失敗，已取消: {reservation.get('message')}")
+        return
+
+    # 以預留回應中的名稱與價格為準
+    reserved_items = reservation.get('data', {}).get('items', [])
+    reserved = {item['product_id']: item for item in reserved_items}
+    now = timezone.now()
+    for item in items:
+        current = reserved.get(item.product_id)
+        if current is not None:
+            item.product_name = current['name']
+            item.unit_price = Decimal(current['price'])
+        item.calculate_subtotal()
+        item.updated_at = now
+
+    with transaction.atomic():
+        # 條件式更新：處理期間訂單可能已被取消
+        confirmed = Order.objects.filter(id=order.id, status='pending').update(
+            status='confirmed', total_amount=sum(item.subtotal for item in items), updated_at=now
+        )
+        if confirmed:
+            OrderItem.objects.bulk_update(items, ['product_name', 'unit_price', 'subtotal', 'updated_at'])
+            order.status = 'confirmed'
+            order.total_amount = sum(item.subtotal for item in items)
+            analytics.record_change(previous, analytics.contribution(order, items))
+
+    if not confirmed:
+        # 重試時會走上方已取消的分支再次釋放
+        _release(order)
+        return
+
+    ProductService.refresh_products(reserved_items)
+    if ProductService.commit_stock(order.order_number) is None:
+        # 預留仍有效（庫存已扣除），僅確認狀態未同步
+        logger.warning(f"訂單 {order.order_number} 的庫存預留確認失敗")
+
+
+@failure_handler(TOPIC_RESERVE_ORDER)
+def reserve_order_failed(payload: Dict):
+    """預留訊息不再重試：取消仍在等待的訂單，並排入釋放庫存的訊息
+
+    先前的嘗試可能已在商品服務建立預留（例如回應逾時），取消後必須釋放，否則庫存會一直被佔用。
+    """
+    order = Order.objects.filter(id=payload['order_id']).first()
+    if order is None:
+        return
+    previous = analytics.order_snapshot(order)
+    with transaction.atomic():
+        if Order.objects.filter(id=order.id, status='pending').update(
+            status='cancelled', updated_at=timezone.now()
+        ):
+            analytics.record_change(previous, analytics.with_status(previous, 'cancelled'))
+            enqueue(TOPIC_RELEASE_ORDER, {'order_id': order.id})
+            logger.warning(f"訂單 {order.order_number} 無法預留庫存，已取消")
+
+
+@handler(TOPIC_RELEASE_ORDER)
+def release_order(payload: Dict):
+    """釋放已取消訂單的庫存預留；預留不存在（回應 404）同樣視為完成"""
+    order = Order.objects.filter(id=payload['order_id']).first()
+    if order is not None and order.status == 'cancelled':
+        _release(order)
+
+
+def _release(order: Order):
+    if ProductService.release_stock(order.order_number) is None:
+        raise RetryableError(f'訂單 {order.order_number} 已取消但無法釋放庫存預留')
+
+
+def has_pending_reservation(order_id: int) -> bool:
+    """訂單是否仍有尚未處理完成的預留訊息（包含可用 --requeue-failed 重新排入的失敗訊息）"""
+    return OutboxMessage.objects.filter(topic=TOPIC_RESERVE_ORDER, payload__order_id=order_id).exists()
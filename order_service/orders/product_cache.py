@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from shared_models.models import ProductReference
+
+
+class LRUCache:
+    """執行緒安全、具 TTL 的 LRU 快取"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ProductCatalogCache:
+    """商品目錄讀穿快取：行程內 LRU → ProductReference 資料表 → 商品服務 HTTP
+
+    只快取名稱與價格；庫存一律由商品服務即時判斷（預留時）。
+    reference_ttl 為 None 時 ProductReference 永不過期（由事件同步維護）。
+    """
+
+    def __init__(self, fetch_remote, maxsize: int = 10000, ttl: float = 60.0,
+                 reference_ttl: Optional[float] = 300.0):
+        self.fetch_remote = fetch_remote
+        self.lru = LRUCache(maxsize, ttl)
+        self.reference_ttl = reference_ttl
+        self._counters = {'lru_hits': 0, 'reference_hits': 0, 'remote_fetches': 0,
+                          'remote_failures': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str, amount: int = 1):
+        if amount:
+            with self._lock:
+                self._counters[key] += amount
+
+    @staticmethod
+    def _entry(product_id, name, price) -> Dict:
+        return {'id': product_id, 'name': name, 'price': str(price)}
+
+    def get_many(self, product_ids: Iterable[int]) -> Optional[Dict[int, Dict]]:
+        """回傳 {商品ID: {'id', 'name', 'price'}}；商品服務無法連線時回傳 None"""
+        products, missing = self._get_lru(product_ids)
+        if missing:
+            missing = self._get_references(missing, products)
+        if not missing:
+            return products
+        return self._merge_remote(products, missing, self.fetch_remote(missing))
+
+    async def aget_many(self, product_ids: Iterable[int], fetch_remote) -> Optional[Dict[int, Dict]]:
+        """get_many 的非同步版本；fetch_remote 為 coroutine function，資料庫存取在執行緒中進行"""
+        products, missing = self._get_lru(product_ids)
+        if missing:
+            missing = await sync_to_async(self._get_references)(missing, products)
+        if not missing:
+            return products
+        remote = await fetch_remote(missing)
+        return await sync_to_async(self._merge_remote)(products, missing, remote)
+
+    def _get_lru(self, product_ids: Iterable[int]):
+        products = {}
+        missing = []
+        for product_id in set(product_ids):
+            entry = self.lru.get(product_id)
+            if entry is None:
+                missing.append(product_id)
+            else:
+                products[product_id] = entry
+        self._count('lru_hits', len(products))
+        return products, missing
+
+    def _get_references(self, missing: List[int], products: Dict[int, Dict]) -> List[int]:
+        """從 ProductReference 補上 products，回傳仍缺少的商品"""
+        references = ProductReference.objects.filter(product_id__in=missing)
+        if self.reference_ttl is not None:
+            references = references.filter(updated_at__gte=timezone.now() - timedelta(seconds=self.reference_ttl))
+        found = 0
+        for product_id, name, price in references.values_list('product_id', 'name', 'price'):
+            entry = self._entry(product_id, name, price)
+            products[product_id] = entry
+            self.lru.set(product_id, entry)
+            found += 1
+        self._count('reference_hits', found)
+        return [product_id for product_id in missing if product_id not in products]
+
+    def _merge_remote(self, products: Dict[int, Dict], missing: List[int],
+                      remote: Optional[Dict[int, Dict]]) -> Optional[Dict[int, Dict]]:
+        self._count('remote_fetches')
+        if remote is None:
+            self._count('remote_failures')
+            return None
+        self._count('misses', len(missing))
+        for entry in self.store(remote.values()):
+            products[entry['id']] = entry
+        return products
+
+    def store(self, products: Iterable[Dict]) -> List[Dict]:
+        """寫入（或更新）快取，products 為含 id（或 product_id）、name、price 的商品資料"""
+        entries = []
+        for product in products:
+            product_id = product['id'] if 'id' in product else product['product_id']
+            entry = self._entry(product_id, product['name'], product['price'])
+            self.lru.set(product_id, entry)
+            entries.append(entry)
+        if entries:
+            ProductReference.objects.bulk_create(
+                [ProductReference(product_id=e['id'], name=e['name'], price=e['price']) for e in entries],
+                update_conflicts=True, unique_fields=['product_id'],
+                update_fields=['name', 'price', 'updated_at']
+            )
+        return entries
+
+    def invalidate(self, product_ids: Optional[Iterable[int]] = None):
+        """使快取失效；未指定商品時清除全部"""
+        if product_ids is None:
+            self.lru.clear()
+            ProductReference.objects.all().delete()
+            return
+        product_ids = list(product_ids)
+        for product_id in product_ids:
+            self.lru.delete(product_id)
+        ProductReference.objects.filter(product_id__in=product_ids).delete()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters['lru_hits'] + counters['reference_hits'] + counters['misses']
+        hits = counters['lru_hits'] + counters['reference_hits']
+        return {
+            **counters,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            'lru_size': len(self.lru),
+            'lru_ttl': self.lru.ttl,
+            'reference_ttl': self.reference_ttl,
+        }
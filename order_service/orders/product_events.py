@@ -0,0 +1,75 @@
+import logging
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+from shared_models.models import ProductReference
+
+from .models import EventOffset
+from .services import ProductService
+
+logger = logging.getLogger(__name__)
+
+CONSUMER_NAME = 'product-events'
+
+
+def apply_product_events(events: Iterable[Dict]) -> Dict[str, int]:
+    """將商品事件套用到 ProductReference
+
+    同一批中每個商品只保留最後狀態；下架或刪除的商品移除參考資料，之後查詢時回到商品服務確認。
+    StockChanged 不影響名稱與價格，略過。
+    """
+    latest: Dict[int, Optional[Dict]] = {}
+    for event in events:
+        if event['type'] == 'ProductChanged':
+            payload = event['payload']
+            latest[event['product_id']] = payload if payload.get('is_active', True) else None
+        elif event['type'] == 'ProductDeleted':
+            latest[event['product_id']] = None
+
+    upserts = [payload for payload in latest.values() if payload is not None]
+    removed = [product_id for product_id, payload in latest.items() if payload is None]
+    if upserts:
+        ProductReference.objects.bulk_create(
+            [ProductReference(product_id=p['id'], name=p['name'], price=p['price']) for p in upserts],
+            update_conflicts=True, unique_fields=['product_id'],
+            update_fields=['name', 'price', 'updated_at']
+        )
+    if removed:
+        ProductReference.objects.filter(product_id__in=removed).delete()
+    return {'updated': len(upserts), 'removed': len(removed)}
+
+
+class ProductEventConsumer:
+    """從商品服務事件串流同步 ProductReference，消費進度與資料變更在同一個交易寫入"""
+
+    def __init__(self, limit: int, wait: float):
+        self.limit = limit
+        self.wait = wait
+        self.offset, _ = EventOffset.objects.get_or_create(consumer=CONSUMER_NAME)
+
+    def reset(self, position: int = 0):
+        self.offset.position = position
+        self.offset.save(update_fields=['position', 'updated_at'])
+
+    def poll(self) -> Optional[Dict]:
+        """讀取並套用一批事件，回傳統計；商品服務無法連線時回傳 None"""
+        data = ProductService.get_product_events(self.offset.position, self.limit, self.wait)
+        if data is None:
+            return None
+
+        earliest = data.get('earliest_id')
+        if earliest is not None and self.offset.position < earliest - 1:
+            # 事件已超過保留期限被刪除，無法得知中間的變更：清除參考資料，之後查詢時重新取得
+            logger.warning(f"商品事件 {self.offset.position + 1}-{earliest - 1} 已不存在，重新同步商品參考資料")
+            with transaction.atomic():
+                ProductReference.objects.all().delete()
+                self.reset(earliest - 1)
+            return {'events': 0, 'updated': 0, 'removed': 0, 'has_more': True, 'resynced': True}
+
+        events = data.get('events', [])
+        with transaction.atomic():
+            result = apply_product_events(events)
+            if events:
+                self.offset.position = data['next_after']
+                self.offset.save(update_fields=['position', 'updated_at'])
+        return {'events': len(events), **result, 'has_more': data.get('has_more', False), 'resynced': False}
@@ -1,3 +1,5 @@
+from decimal import Decimal, InvalidOperation
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Order, OrderItem
 from .services import ProductService
@@ -17,6 +19,15 @@ class OrderSerializer(serializers.ModelSerializer):
                  'customer_phone', 'shipping_address', 'status', 'total_amount', 
                  'notes', 'items', 'created_at', 'updated_at']
 
+class OrderHistorySerializer(serializers.Serializer):
+    """客戶訂單歷史的精簡欄位，資料為 values() 查詢的 dict，不載入訂單項目"""
+    id = serializers.IntegerField()
+    order_number = serializers.CharField()
+    status = serializers.CharField()
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    item_count = serializers.IntegerField()
+    created_at = serializers.DateTimeField()
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     items = serializers.ListField(
         child=serializers.DictField(child=serializers.CharField()),
@@ -37,8 +48,22 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         }
     
     def validate_items(self, value):
-        """驗證訂單項目"""
-        validated_items = []
+        """驗證訂單項目 - 商品名稱與價格經由商品目錄快取取得，庫存於預留時由商品服務即時檢查"""
+        parsed_items = self.parse_items(value)
+        if not self.context.get('resolve_products', True):
+            # 非同步建立：商品由背景 worker 預留庫存時確認
+            return parsed_items
+        
+        products = ProductService.get_products_catalog(item['product_id'] for item in parsed_items)
+        if products is None:
+            raise serializers.ValidationError('商品服務暫時無法使用，請稍後再試')
+        
+        return self.build_items(parsed_items, products)
+    
+    @classmethod
+    def parse_items(cls, value):
+        """檢查項目格式，回傳 [{'product_id': ..., 'quantity': ...}]"""
+        parsed_items = []
         
         for i, item in enumerate(value):
             # 檢查必要欄位
@@ -48,36 +73,73 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             try:
                 product_id = int(item['product_id'])
                 quantity = int(item['quantity'])
-                
-                if quantity <= 0:
-                    raise serializers.ValidationError(f'第{i+1}個商品的數量必須大於 0')
-                
-                # 檢查商品是否存在
-                product_info = ProductService.get_product_info(product_id)
-                if not product_info or not product_info.get('result'):
-                    raise serializers.ValidationError(f'商品 ID {product_id} 不存在')
-                
-                product_data = product_info['data']
-                
-                # 檢查庫存
-                if not ProductService.check_stock_availability(product_id, quantity):
-                    raise serializers.ValidationError(f'商品 {product_data["name"]} 庫存不足')
-                
-                # 計算價格
-                unit_price = float(product_data['price'])
-                subtotal = unit_price * quantity
-                
-                validated_items.append({
-                    'product_id': product_id,
-                    'product_name': product_data['name'],
-                    'unit_price': unit_price,
-                    'quantity': quantity,
-                    'subtotal': subtotal
-                })
-                
             except ValueError:
                 raise serializers.ValidationError(f'第{i+1}個商品的 product_id 和 quantity 必須為數字')
-            except Exception as e:
-                raise serializers.ValidationError(f'第{i+1}個商品驗證失敗: {str(e)}')
+            
+            if quantity <= 0:
+                raise serializers.ValidationError(f'第{i+1}個商品的數量必須大於 0')
+            
+            parsed_items.append({'product_id': product_id, 'quantity': quantity})
         
-        return validated_items
\ No newline at end of file
+        return parsed_items
+    
+    @staticmethod
+    def build_items(parsed_items, products):
+        """以商品資料補上名稱與價格；項目已帶 unit_price 時沿用該價格"""
+        # 檢查商品是否存在
+        for item in parsed_items:
+            if item['product_id'] not in products:
+                raise serializers.ValidationError(f'商品 ID {item["product_id"]} 不存在')
+        
+        validated_items = []
+        for item in parsed_items:
+            product_data = products[item['product_id']]
+            
+            # 計算價格
+            # unit_price 為 0 是有效的成交價（贈品、促銷），只有未提供時才使用目前價格
+            unit_price = item['unit_price'] if item.get('unit_price') is not None else Decimal(product_data['price'])
+            subtotal = unit_price * item['quantity']
+            
+            validated_items.append({
+                'product_id': item['product_id'],
+                'product_name': product_data['name'],
+                'unit_price': unit_price,
+                'quantity': item['quantity'],
+                'subtotal': subtotal
+            })
+        
+        return validated_items
+
+class OrderImportSerializer(OrderCreateSerializer):
+    """匯入訂單的單列驗證 - 商品由匯入器整批查詢，不在此逐列呼叫商品服務"""
+    # 明確宣告以略過逐列查詢資料庫的唯一性檢查，重複編號於寫入時回報
+    order_number = serializers.CharField(max_length=50, required=False)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False, default='pending',
+                                     error_messages={'invalid_choice': '無效的訂單狀態'})
+    # 歷史訂單的建立時間；未提供時為匯入的時間
+    created_at = serializers.DateTimeField(required=False)
+    
+    class Meta(OrderCreateSerializer.Meta):
+        fields = OrderCreateSerializer.Meta.fields + ['order_number', 'status', 'created_at']
+    
+    def validate_items(self, value):
+        return self.parse_items(value)
+    
+    def validate_created_at(self, value):
+        if value > timezone.now():
+            raise serializers.ValidationError('created_at 不可晚於現在')
+        return value
+    
+    @classmethod
+    def parse_items(cls, value):
+        """匯入的歷史訂單可以帶 unit_price，保留當時的成交價"""
+        parsed_items = super().parse_items(value)
+        for i, (item, parsed) in enumerate(zip(value, parsed_items)):
+            if item.get('unit_price') not in (None, ''):
+                try:
+                    parsed['unit_price'] = Decimal(str(item['unit_price']))
+                except InvalidOperation:
+                    raise serializers.ValidationError(f'第{i+1}個商品的 unit_price 必須為數字')
+                if parsed['unit_price'] < 0:
+                    raise serializers.ValidationError(f'第{i+1}個商品的 unit_price 不能為負數')
+        return parsed_items
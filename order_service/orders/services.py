@@ -1,19 +1,42 @@
+import asyncio
 import requests
-from django.conf import settings
-from typing import Dict, Optional
+import httpx
+from typing import Dict, Iterable, List, Optional
 import logging
 
+from django.conf import settings
+
+from .async_client import get_async_product_client
+from .http_client import get_product_client
+from .product_cache import ProductCatalogCache
+
 logger = logging.getLogger(__name__)
 
+_catalog_cache = None
+
+def get_catalog_cache() -> ProductCatalogCache:
+    """行程共用的商品目錄快取"""
+    global _catalog_cache
+    if _catalog_cache is None:
+        _catalog_cache = ProductCatalogCache(
+            ProductService.get_products_info,
+            maxsize=settings.PRODUCT_CACHE_SIZE,
+            ttl=settings.PRODUCT_CACHE_TTL,
+            reference_ttl=None if settings.PRODUCT_CATALOG_REPLICATED else settings.PRODUCT_REFERENCE_TTL,
+        )
+    return _catalog_cache
+
 class ProductService:
     """商品服務客戶端"""
     
+    # 與商品服務批次查詢端點的上限一致
+    BATCH_SIZE = 100
+    
     @staticmethod
     def get_product_info(product_id: int) -> Optional[Dict]:
         """獲取商品資訊"""
         try:
-            url = f"{settings.PRODUCT_SERVICE_URL}/api/products/{product_id}/stock/"
-            response = requests.get(url, timeout=5)
+            response = get_product_client().get(f"/api/products/{product_id}/stock/")
             if response.status_code == 200:
                 return response.json()
         except requests.RequestException as e:
@@ -22,6 +45,53 @@ class ProductService:
             logger.error(f"獲取商品 {product_id} 資訊時發生未預期錯誤: {str(e)}")
         return None
     
+    @staticmethod
+    def get_products_info(product_ids: Iterable[int]) -> Optional[Dict[int, Dict]]:
+        """批次獲取商品資訊，回傳 {商品ID: 商品資料}，不存在的商品不會出現在結果中"""
+        product_ids = sorted(set(product_ids))
+        products = {}
+        client = get_product_client()
+        
+        for start in range(0, len(product_ids), ProductService.BATCH_SIZE):
+            chunk = product_ids[start:start + ProductService.BATCH_SIZE]
+            try:
+                response = client.get('/api/products/stock/', params={'ids': ','.join(map(str, chunk))})
+                if response.status_code != 200:
+                    logger.error(f"批次查詢商品 {chunk} 失敗: HTTP {response.status_code}")
+                    return None
+                payload = response.json()
+            except requests.RequestException as e:
+                logger.error(f"批次請求商品 {chunk} 時發生錯誤: {str(e)}")
+                return None
+            except Exception as e:
+                logger.error(f"批次獲取商品 {chunk} 資訊時發生未預期錯誤: {str(e)}")
+                return None
+            
+            for product in payload.get('data', {}).get('products', []):
+                products[product['id']] = product
+        
+        return products
+    
+    @staticmethod
+    def get_products_catalog(product_ids: Iterable[int]) -> Optional[Dict[int, Dict]]:
+        """取得商品名稱與價格（經由快取），不含庫存；商品服務無法連線時回傳 None"""
+        return get_catalog_cache().get_many(product_ids)
+    
+    @staticmethod
+    def refresh_products(products: Iterable[Dict]):
+        """以商品服務回傳的最新資料更新快取"""
+        get_catalog_cache().store(products)
+    
+    @staticmethod
+    def invalidate_products(product_ids: Optional[Iterable[int]] = None):
+        """使商品快取失效；未指定時清除全部"""
+        get_catalog_cache().invalidate(product_ids)
+    
+    @staticmethod
+    def get_cache_stats() -> Dict:
+        """商品快取命中統計"""
+        return get_catalog_cache().stats()
+    
     @staticmethod
     def check_stock_availability(product_id: int, quantity: int) -> bool:
         """檢查庫存是否足夠"""
@@ -29,4 +99,130 @@ class ProductService:
         if product_info and product_info.get('result'):
             data = product_info.get('data', {})
             return data.get('stock_quantity', 0) >= quantity
-        return False
\ No newline at end of file
+        return False
+    
+    @staticmethod
+    def _post(path: str, payload: Optional[Dict] = None) -> Optional[Dict]:
+        """送出 POST 請求，回傳商品服務的回應內容；無法連線或 5xx 時回傳 None"""
+        try:
+            # 預留相關端點以 reference 去重，重送是安全的
+            response = get_product_client().request('POST', path, idempotent=True, json=payload or {})
+            if response.status_code < 500:
+                return response.json()
+            logger.error(f"呼叫 {path} 失敗: HTTP {response.status_code}")
+        except requests.RequestException as e:
+            logger.error(f"呼叫 {path} 時發生錯誤: {str(e)}")
+        except Exception as e:
+            logger.error(f"呼叫 {path} 時發生未預期錯誤: {str(e)}")
+        return None
+    
+    @staticmethod
+    def reserve_stock(reference: str, items: Dict[int, int]) -> Optional[Dict]:
+        """預留庫存 {商品ID: 數量}；同一 reference 重送不會重複扣庫存"""
+        return ProductService._post('/api/products/stock/reservations/', {
+            'reference': reference,
+            'items': [{'product_id': pid, 'quantity': qty} for pid, qty in items.items()]
+        })
+    
+    @staticmethod
+    def commit_stock(reference: str) -> Optional[Dict]:
+        """確認庫存預留"""
+        return ProductService._post(f'/api/products/stock/reservations/{reference}/commit/')
+    
+    @staticmethod
+    def release_stock(reference: str) -> Optional[Dict]:
+        """釋放庫存預留並歸還庫存"""
+        return ProductService._post(f'/api/products/stock/reservations/{reference}/release/')
+    
+    @staticmethod
+    def get_product_events(after: int, limit: int, wait: float = 0) -> Optional[Dict]:
+        """讀取商品事件串流（長輪詢），回傳 data 內容；無法連線時回傳 None"""
+        client = get_product_client()
+        try:
+            response = client.get('/api/products/events/', params={'after': after, 'limit': limit, 'wait': wait},
+                                  timeout=(client.timeout[0], client.timeout[1] + wait))
+            if response.status_code == 200:
+                return response.json().get('data')
+            logger.error(f"讀取商品事件失敗: HTTP {response.status_code}")
+        except requests.RequestException as e:
+            logger.error(f"讀取商品事件時發生錯誤: {str(e)}")
+        except Exception as e:
+            logger.error(f"讀取商品事件時發生未預期錯誤: {str(e)}")
+        return None
+    
+    @staticmethod
+    def get_client_stats() -> Dict:
+        """商品服務客戶端狀態：斷路器、重試預算與連線池統計"""
+        return get_product_client().stats()
+
+
+class AsyncProductService:
+    """商品服務非同步客戶端 - 供 ASGI 下的 async view 使用，等待商品服務時不佔用執行緒"""
+    
+    @staticmethod
+    async def _get_products_chunk(chunk: List[int], semaphore: asyncio.Semaphore) -> Optional[List[Dict]]:
+        async with semaphore:
+            try:
+                response = await get_async_product_client().get(
+                    '/api/products/stock/', params={'ids': ','.join(map(str, chunk))}
+                )
+                if response.status_code != 200:
+                    logger.error(f"批次查詢商品 {chunk} 失敗: HTTP {response.status_code}")
+                    return None
+                return response.json().get('data', {}).get('products', [])
+            except httpx.HTTPError as e:
+                logger.error(f"批次請求商品 {chunk} 時發生錯誤: {str(e)}")
+            except Exception as e:
+                logger.error(f"批次獲取商品 {chunk} 資訊時發生未預期錯誤: {str(e)}")
+            return None
+    
+    @staticmethod
+    async def get_products_info(product_ids: Iterable[int]) -> Optional[Dict[int, Dict]]:
+        """批次獲取商品資訊；超過批次上限時各批同時送出，並以 semaphore 限制同時進行的請求數"""
+        product_ids = sorted(set(product_ids))
+        semaphore = asyncio.Semaphore(settings.PRODUCT_SERVICE_ASYNC_CONCURRENCY)
+        results = await asyncio.gather(*(
+            AsyncProductService._get_products_chunk(product_ids[start:start + ProductService.BATCH_SIZE], semaphore)
+            for start in range(0, len(product_ids), ProductService.BATCH_SIZE)
+        ))
+        if any(result is None for result in results):
+            return None
+        return {product['id']: product for result in results for product in result}
+    
+    @staticmethod
+    async def get_products_catalog(product_ids: Iterable[int]) -> Optional[Dict[int, Dict]]:
+        """取得商品名稱與價格（經由快取）；商品服務無法連線時回傳 None"""
+        return await get_catalog_cache().aget_many(product_ids, AsyncProductService.get_products_info)
+    
+    @staticmethod
+    async def _post(path: str, payload: Optional[Dict] = None) -> Optional[Dict]:
+        """送出 POST 請求，回傳商品服務的回應內容；無法連線或 5xx 時回傳 None"""
+        try:
+            # 預留相關端點以 reference 去重，重送是安全的
+            response = await get_async_product_client().request('POST', path, idempotent=True, json=payload or {})
+            if response.status_code < 500:
+                return response.json()
+            logger.error(f"呼叫 {path} 失敗: HTTP {response.status_code}")
+        except httpx.HTTPError as e:
+            logger.error(f"呼叫 {path} 時發生錯誤: {str(e)}")
+        except Exception as e:
+            logger.error(f"呼叫 {path} 時發生未預期錯誤: {str(e)}")
+        return None
+    
+    @staticmethod
+    async def reserve_stock(reference: str, items: Dict[int, int]) -> Optional[Dict]:
+        """預留庫存 {商品ID: 數量}；同一 reference 重送不會重複扣庫存"""
+        return await AsyncProductService._post('/api/products/stock/reservations/', {
+            'reference': reference,
+            'items': [{'product_id': pid, 'quantity': qty} for pid, qty in items.items()]
+        })
+    
+    @staticmethod
+    async def commit_stock(reference: str) -> Optional[Dict]:
+        """確認庫存預留"""
+        return await AsyncProductService._post(f'/api/products/stock/reservations/{reference}/commit/')
+    
+    @staticmethod
+    async def release_stock(reference: str) -> Optional[Dict]:
+        """釋放庫存預留並歸還庫存"""
+        return await AsyncProductService._post(f'/api/products/stock/reservations/{reference}/release/')
@@ -1,3 +1,781 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from shared_models.models import ProductReference
+from shared_models.query_plans import find_seq_scans
+from shared_models.testing import QueryCountAssertionsMixin
+
+from . import analytics, async_client, async_views, http_client, outbox, product_cache, services, views
+from .http_client import CircuitBreaker, RetryBudget, ServiceClient
+from .importer import OrderImporter, RowError, parse_csv, parse_ndjson
+from .management.commands import check_query_plans
+from .models import DailyOrderStats, DailyProductSales, Order, OrderItem, OutboxMessage
+from .product_cache import LRUCache, ProductCatalogCache
+from .serializers import OrderSerializer
+from .services import ProductService
+from .views import apply_reserved_prices, save_order
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    """測試用的商品服務：/bad-gzip 回傳無法解壓縮的內容，/slow 延遲一秒後回應，POST 的路徑記錄在 server.posted"""
+
+    def do_GET(self):
+        if self.path.startswith('/slow'):
+            time.sleep(1)
+        body = b'not gzip' if self.path.startswith('/bad-gzip') else b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if self.path.startswith('/bad-gzip'):
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.posted.append(self.path)
+        body = b'{"result": true, "data": {}}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UpstreamServerMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), UpstreamHandler)
+        cls.server.daemon_threads = True
+        cls.server.posted = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def half_open_breaker(self):
+        """已開啟且冷卻時間已過的斷路器：下一個請求是試探請求"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        return breaker
+
+
+class CircuitBreakerTests(UpstreamServerMixin, SimpleTestCase):
+    """半開狀態的試探請求以任何方式結束都會釋放名額"""
+
+    def test_non_timeout_error_during_probe(self):
+        breaker = self.half_open_breaker()
+        client = ServiceClient(self.base_url, breaker=breaker, max_retries=0)
+
+        with self.assertRaises(requests.exceptions.ContentDecodingError):
+            client.get('/bad-gzip')
+        # 解碼失敗計為失敗，斷路器重新開啟；冷卻時間過後可以再次試探
+        self.assertEqual(client.stats()['calls']['failures'], 1)
+        self.assertEqual(client.get('/ok').status_code, 200)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def service_client(self, breaker):
+        return async_client.AsyncServiceClient(
+            self.base_url, pool_size=2, connect_timeout=1, read_timeout=3, max_retries=0, backoff=0.1,
+            backoff_cap=1, retry_budget=RetryBudget(), breaker=breaker,
+        )
+
+    def test_async_decoding_error_during_probe(self):
+        breaker = self.half_open_breaker()
+
+        async def run():
+            client = self.service_client(breaker)
+            try:
+                with self.assertRaises(httpx.DecodingError):
+                    await client.get('/bad-gzip')
+                self.assertEqual(client.stats()['calls']['failures'], 1)
+                self.assertEqual((await client.get('/ok')).status_code, 200)
+            finally:
+                await client.client.aclose()
+
+        asyncio.run(run())
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_async_probe_cancelled(self):
+        breaker = self.half_open_breaker()
+
+        async def run():
+            client = self.service_client(breaker)
+            try:
+                # 用戶端中斷連線時 view 的 task 被取消
+                task = asyncio.ensure_future(client.get('/slow'))
+                await asyncio.sleep(0.2)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+            finally:
+                await client.client.aclose()
+
+        asyncio.run(run())
+        # 取消不計入失敗，斷路器維持半開並允許下一個試探請求
+        self.assertEqual(breaker.stats()['consecutive_failures'], 1)
+        self.assertTrue(breaker.allow_request())
+
+
+class AsyncClientLifetimeTests(UpstreamServerMixin, SimpleTestCase):
+    """WSGI 下每個請求有自己的事件迴圈，請求結束後關閉該迴圈的客戶端"""
+
+    def test_client_closed_after_wsgi_request(self):
+        async def run():
+            client = async_client.get_async_product_client()
+            response = await async_views.check_stock(RequestFactory().get('/api/async/stock/?items=1:1'))
+            return client, response
+
+        with override_settings(PRODUCT_SERVICE_URL=self.base_url):
+            client, response = asyncio.run(run())
+        # 測試伺服器沒有 data.products，查詢結果為空：商品不存在
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(client.client.is_closed)
+        self.assertEqual(len(async_client._clients), 0)
+
+
+class ProductCatalogCacheTests(TestCase):
+    """商品目錄快取依序查詢行程內 LRU、ProductReference 與商品服務，只有前兩層都缺少的商品才送出請求"""
+
+    def setUp(self):
+        self.requested = []
+        self.remote = {2: {'id': 2, 'name': '商品 2', 'price': '20.00', 'stock_quantity': 5}}
+        ProductReference.objects.create(product_id=1, name='商品 1', price=Decimal('10.00'))
+
+    def fetch_remote(self, product_ids):
+        self.requested.append(sorted(product_ids))
+        if self.remote is None:
+            return None
+        return {product_id: self.remote[product_id] for product_id in product_ids if product_id in self.remote}
+
+    def catalog(self, **options):
+        return ProductCatalogCache(self.fetch_remote, **options)
+
+    def test_lru_eviction_and_ttl(self):
+        with mock.patch.object(product_cache.time, 'monotonic', return_value=100.0) as monotonic:
+            lru = LRUCache(maxsize=2, ttl=10)
+            lru.set('a', 1)
+            lru.set('b', 2)
+            lru.get('a')
+            lru.set('c', 3)
+            # b 最久未使用，超過容量時先被移除
+            self.assertEqual([lru.get(key) for key in 'abc'], [1, None, 3])
+            monotonic.return_value = 111.0
+            self.assertIsNone(lru.get('a'))
+            self.assertEqual(len(lru), 1)
+
+    def test_read_through_tiers(self):
+        catalog = self.catalog()
+        expected = {1: {'id': 1, 'name': '商品 1', 'price': '10.00'}, 2: {'id': 2, 'name': '商品 2', 'price': '20.00'}}
+        self.assertEqual(catalog.get_many([1, 2]), expected)
+        self.assertEqual(self.requested, [[2]])
+        # 商品服務的結果寫入 ProductReference，其他 worker 不需要再次請求
+        self.assertEqual(ProductReference.objects.get(product_id=2).name, '商品 2')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog.get_many([1, 2]), expected)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.catalog().get_many([2]), {2: expected[2]})
+        self.assertEqual(self.requested, [[2]])
+        self.assertEqual(
+            {key: catalog.stats()[key] for key in ('lru_hits', 'reference_hits', 'misses', 'hit_ratio')},
+            {'lru_hits': 2, 'reference_hits': 1, 'misses': 1, 'hit_ratio': 0.75}
+        )
+
+    def test_stale_reference_and_remote_failure(self):
+        ProductReference.objects.filter(product_id=1).update(updated_at=timezone.now() - timedelta(minutes=10))
+        self.remote = None
+        catalog = self.catalog(reference_ttl=300)
+        self.assertIsNone(catalog.get_many([1]))
+        self.assertEqual(self.requested, [[1]])
+        self.assertEqual(catalog.stats()['remote_failures'], 1)
+        # 由事件同步維護時 ProductReference 不會過期
+        self.assertEqual(self.catalog(reference_ttl=None).get_many([1])[1]['name'], '商品 1')
+
+    def test_invalidate(self):
+        catalog = self.catalog()
+        catalog.get_many([1, 2])
+        catalog.invalidate([2])
+        self.assertFalse(ProductReference.objects.filter(product_id=2).exists())
+        self.remote[2]['price'] = '25.00'
+        self.assertEqual(catalog.get_many([1, 2])[2]['price'], '25.00')
+        self.assertEqual(self.requested, [[2], [2]])
+
+
+class ListQueryCountTests(QueryCountAssertionsMixin, TestCase):
+    """列表端點的查詢數不應隨筆數成長"""
+
+    def create_orders(self, total):
+        for i in range(Order.objects.count(), total):
+            order = Order.objects.create(
+                order_number=f'ORD-TEST{i:04d}', customer_name='測試客戶', customer_email='test@example.com',
+                customer_phone='0912345678', shipping_address='台北市', total_amount=Decimal('200.00')
+            )
+            for product_id in (1, 2):
+                OrderItem.objects.create(
+                    order=order, product_id=product_id, product_name=f'商品 {product_id}',
+                    unit_price=Decimal('100.00'), quantity=1
+                )
+
+    def test_order_list(self):
+        self.assertQueriesDoNotScale(self.create_orders, lambda: self.client.get('/api/orders/'))
+
+    def test_order_export(self):
+        def export():
+            response = self.client.get('/api/orders/export/?file_format=csv')
+            # 串流回應在讀取內容時才查詢資料庫
+            self.assertEqual(len(b''.join(response.streaming_content).splitlines()), Order.objects.count() + 1)
+            return response
+
+        self.assertQueriesDoNotScale(self.create_orders, export)
+
+
+class QueryPlanTests(TestCase):
+    """check_query_plans：端點的查詢都使用索引，未使用索引的查詢會被回報"""
+
+    def run_command(self, **options):
+        stdout = io.StringIO()
+        call_command('check_query_plans', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_endpoint_queries_use_indexes(self):
+        # min_rows=0：空資料表也視為大型資料表，任何循序掃描都會失敗
+        output = self.run_command(min_rows=0)
+        self.assertNotIn('[SEQ SCAN]', output)
+        self.assertIn('[OK] 客戶訂單歷史', output)
+
+    def test_reports_seq_scan(self):
+        unindexed = [('備註搜尋', Order.objects.filter(notes='急件'))]
+        self.assertEqual(find_seq_scans(unindexed[0][1])[1], ['orders_order'])
+        with mock.patch.object(check_query_plans.Command, 'get_querysets', return_value=unindexed):
+            # 小型資料表的循序掃描不回報
+            self.assertIn('[OK] 備註搜尋', self.run_command())
+            with self.assertRaises(CommandError):
+                self.run_command(min_rows=0)
+
+
+class OrderCreateTests(TestCase):
+    """訂單項目以一次 INSERT 寫入，建立後直接以記憶體中的項目序列化"""
+
+    def validated_data(self, count):
+        return {
+            'customer_name': '測試客戶', 'customer_email': 'test@example.com', 'customer_phone': '0912345678',
+            'shipping_address': '台北市',
+            'items': [{'product_id': i, 'product_name': f'商品 {i}', 'unit_price': Decimal('12.50'), 'quantity': 2,
+                       'subtotal': Decimal('25.00')} for i in range(1, count + 1)],
+        }
+
+    def test_save_order_inserts_items_once(self):
+        with CaptureQueriesContext(connection) as context:
+            order = save_order('ORD-BULK', self.validated_data(50))
+        inserts = [query['sql'] for query in context.captured_queries
+                   if query['sql'].startswith('INSERT INTO "orders_orderitem"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 50)
+
+        with self.assertNumQueries(0):
+            data = OrderSerializer(order).data
+        self.assertEqual(data, OrderSerializer(Order.objects.prefetch_related('items').get(pk=order.pk)).data)
+        self.assertEqual(data['total_amount'], '1250.00')
+
+    def test_bulk_create_calculates_subtotal(self):
+        order = save_order('ORD-SUB', self.validated_data(1))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=9, product_name='商品 9', unit_price=Decimal('3.30'), quantity=3)
+        ])
+        self.assertEqual(OrderItem.objects.get(order=order, product_id=9).subtotal, Decimal('9.90'))
+
+    def test_apply_reserved_prices(self):
+        items = self.validated_data(2)['items']
+        changed = apply_reserved_prices(items, [
+            {'product_id': 1, 'name': '商品 1', 'price': '12.50'},
+            {'product_id': 2, 'name': '新名稱', 'price': '15.00'},
+        ])
+        # 只有名稱或價格不同的商品需要更新快取
+        self.assertEqual([product['product_id'] for product in changed], [2])
+        self.assertEqual((items[1]['product_name'], items[1]['subtotal']), ('新名稱', Decimal('30.00')))
+        self.assertEqual(items[0]['subtotal'], Decimal('25.00'))
+
+
+class OrderCreateViewTests(TestCase):
+    """同步建立訂單：預留庫存、寫入訂單後才確認預留；寫入失敗時釋放預留"""
+
+    PRODUCT = {'product_id': 1, 'id': 1, 'name': '商品 1', 'price': '100.00'}
+
+    def setUp(self):
+        self.service = mock.Mock()
+        self.service.get_products_catalog.return_value = {1: self.PRODUCT}
+        self.service.reserve_stock.return_value = {'result': True, 'data': {'items': [self.PRODUCT]}}
+        self.service.release_stock.return_value = {'result': True}
+        # 記錄確認預留當下訂單是否已寫入
+        self.saved_before_commit = []
+        self.service.commit_stock.side_effect = lambda reference: self.saved_before_commit.append(
+            Order.objects.filter(order_number=reference).exists()
+        ) or {'result': True}
+        for name in ('get_products_catalog', 'reserve_stock', 'commit_stock', 'release_stock', 'refresh_products'):
+            self.enterContext(mock.patch.object(ProductService, name, getattr(self.service, name)))
+
+    def create_order(self):
+        return self.client.post('/api/orders/', {
+            'customer_name': '測試客戶', 'customer_email': 'test@example.com',
+            'customer_phone': '0912345678', 'shipping_address': '台北市',
+            'items': [{'product_id': '1', 'quantity': '2'}],
+        }, content_type='application/json')
+
+    def calls(self):
+        return [name for name, _, _ in self.service.mock_calls]
+
+    def test_reserve_save_commit(self):
+        response = self.create_order()
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, Decimal('200.00'))
+        self.assertEqual(self.calls(), ['get_products_catalog', 'reserve_stock', 'commit_stock'])
+        self.service.reserve_stock.assert_called_once_with(order.order_number, {1: 2})
+        self.service.commit_stock.assert_called_once_with(order.order_number)
+        self.assertEqual(self.saved_before_commit, [True])
+
+    def test_release_when_save_fails(self):
+        with mock.patch.object(views, 'save_order', side_effect=DatabaseError('disk full')):
+            response = self.create_order()
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()['errorCode'], 'ORDER_CREATION_FAILED')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.calls(), ['get_products_catalog', 'reserve_stock', 'release_stock'])
+        reference = self.service.reserve_stock.call_args.args[0]
+        self.service.release_stock.assert_called_once_with(reference)
+
+    def test_rejected_reservation_writes_nothing(self):
+        self.service.reserve_stock.return_value = {'result': False, 'message': '庫存不足',
+                                                   'errorCode': 'INSUFFICIENT_STOCK'}
+        response = self.create_order()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['errorCode'], 'INSUFFICIENT_STOCK')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.calls(), ['get_products_catalog', 'reserve_stock'])
+
+
+class AsyncOrderCreateViewTests(TestCase):
+    """POST /api/async/orders/：以 httpx.MockTransport 取代商品服務，預留成功才寫入訂單並確認預留"""
+
+    def setUp(self):
+        self.upstream = []
+        self.reservation = httpx.Response(200, json={'result': True, 'data': {'items': [
+            {'product_id': 1, 'name': '商品 1', 'price': '100.00'},
+        ]}})
+        transport = httpx.MockTransport(self.product_service)
+        client_class = httpx.AsyncClient
+        self.enterContext(mock.patch.object(
+            httpx, 'AsyncClient', lambda **kwargs: client_class(transport=transport, **kwargs)
+        ))
+        # 不使用其他測試留下的商品快取與斷路器
+        self.enterContext(mock.patch.object(services, '_catalog_cache', None))
+        self.enterContext(mock.patch.object(http_client, '_client', None))
+
+    def product_service(self, request):
+        self.upstream.append((request.method, request.url.path))
+        if request.method == 'GET':
+            return httpx.Response(200, json={'result': True, 'data': {'products': [
+                {'id': 1, 'name': '商品 1', 'price': '100.00', 'stock_quantity': 5},
+            ]}})
+        if request.url.path == '/api/products/stock/reservations/':
+            self.reserved = json.loads(request.content)
+            return self.reservation
+        return httpx.Response(200, json={'result': True, 'data': {}})
+
+    async def create_order(self):
+        try:
+            return await self.async_client.post('/api/async/orders/', {
+                'customer_name': '測試客戶', 'customer_email': 'test@example.com',
+                'customer_phone': '0912345678', 'shipping_address': '台北市',
+                'items': [{'product_id': '1', 'quantity': '2'}],
+            }, content_type='application/json')
+        finally:
+            # ASGI 請求不會在結束時關閉客戶端，測試的事件迴圈結束前自行關閉
+            await async_client.close_async_product_client()
+
+    async def test_reserve_save_commit(self):
+        response = await self.create_order()
+
+        self.assertEqual(response.status_code, 201)
+        order = await Order.objects.aget()
+        self.assertEqual(response.json()['data']['order_number'], order.order_number)
+        self.assertEqual(order.total_amount, Decimal('200.00'))
+        self.assertEqual(self.reserved, {'reference': order.order_number,
+                                         'items': [{'product_id': 1, 'quantity': 2}]})
+        self.assertEqual(self.upstream, [
+            ('GET', '/api/products/stock/'),
+            ('POST', '/api/products/stock/reservations/'),
+            ('POST', f'/api/products/stock/reservations/{order.order_number}/commit/'),
+        ])
+
+    async def test_rejected_reservation(self):
+        self.reservation = httpx.Response(409, json={'result': False, 'errorCode': 'INSUFFICIENT_STOCK',
+                                                     'message': '商品 1 庫存不足'})
+        response = await self.create_order()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['errorCode'], 'INSUFFICIENT_STOCK')
+        self.assertFalse(await Order.objects.aexists())
+        self.assertEqual([method for method, _ in self.upstream], ['GET', 'POST'])
+
+
+class ImportParserTests(TestCase):
+    """匯入檔案解析：格式錯誤的列回傳 RowError，不中斷其他列"""
+
+    def test_parse_csv(self):
+        lines = [
+            'order_number,customer_name,items,notes\n',
+            'IMP-1,王小明,1:2;5:1:39.99,\n',
+            'IMP-2,王小明,1,\n',
+        ]
+        rows = list(parse_csv(lines))
+        self.assertEqual(rows[0], (2, {
+            'order_number': 'IMP-1', 'customer_name': '王小明',
+            'items': [{'product_id': '1', 'quantity': '2'},
+                      {'product_id': '5', 'quantity': '1', 'unit_price': '39.99'}],
+        }))
+        self.assertIsInstance(rows[1][1], RowError)
+
+    def test_parse_ndjson(self):
+        rows = list(parse_ndjson(['{"customer_name": "A"}\n', '\n', '{bad\n', '[1]\n']))
+        self.assertEqual(rows[0], (1, {'customer_name': 'A'}))
+        self.assertEqual([line_no for line_no, _ in rows[1:]], [3, 4])
+        self.assertTrue(all(isinstance(row, RowError) for _, row in rows[1:]))
+
+
+class OrderImporterTests(TestCase):
+    """匯入的成交價與建立時間照原樣寫入，每日統計記在原本的日期"""
+
+    def test_keeps_zero_price_and_created_at(self):
+        # 參考資料未過期時不需要呼叫商品服務
+        ProductReference.objects.create(product_id=1, name='商品 1', price=Decimal('100.00'))
+        rows = parse_ndjson([json.dumps({
+            'customer_name': '測試客戶', 'customer_email': 'test@example.com', 'customer_phone': '0912345678',
+            'shipping_address': '台北市', 'created_at': '2024-03-01T10:00:00',
+            'items': [{'product_id': 1, 'quantity': 1, 'unit_price': 0}, {'product_id': 1, 'quantity': 2}],
+        })])
+        with self.captureOnCommitCallbacks(execute=True):
+            summary = OrderImporter(chunk_size=10).run(rows)
+
+        self.assertEqual(summary['imported'], 1, summary['errors'])
+        order = Order.objects.get()
+        self.assertEqual(order.created_at, datetime(2024, 3, 1, 10, 0))
+        self.assertEqual(sorted(order.items.values_list('unit_price', flat=True)),
+                         [Decimal('0.00'), Decimal('100.00')])
+        self.assertEqual(order.total_amount, Decimal('200.00'))
+        self.assertEqual(list(DailyOrderStats.objects.values_list('date', 'order_count')), [(date(2024, 3, 1), 1)])
+
+    def test_rejects_future_created_at(self):
+        rows = parse_ndjson([json.dumps({
+            'customer_name': '測試客戶', 'customer_email': 'test@example.com', 'customer_phone': '0912345678',
+            'shipping_address': '台北市', 'created_at': '2999-01-01T00:00:00',
+            'items': [{'product_id': 1, 'quantity': 1}],
+        })])
+        summary = OrderImporter().run(rows)
+        self.assertEqual((summary['imported'], summary['failed']), (0, 1))
+        self.assertIn('created_at', summary['errors'][0]['message'])
+
+
+@override_settings(ORDER_ASYNC_CREATE=True)
+class AsyncOrderCreateTests(TestCase):
+    """非同步模式：建立訂單時不呼叫商品服務，只寫入訂單與外寄匣訊息"""
+
+    def test_create_enqueues_reservation(self):
+        response = self.client.post('/api/orders/', {
+            'customer_name': '測試客戶', 'customer_email': 'test@example.com',
+            'customer_phone': '0912345678', 'shipping_address': '台北市',
+            'items': [{'product_id': '1', 'quantity': '2'}],
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 202)
+        order = Order.objects.get()
+        self.assertEqual(order.status, 'pending')
+        self.assertEqual(order.items.get().quantity, 2)
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.topic, message.payload), ('order.reserve', {'order_id': order.id}))
+
+
+@override_settings(ORDER_ASYNC_CREATE=True)
+class OutboxReservationTests(TestCase):
+    """預留訊息只重試暫時性錯誤；不再重試時取消訂單並釋放庫存，預留完成前訂單只能取消"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/orders/', {
+                'customer_name': '測試客戶', 'customer_email': 'test@example.com',
+                'customer_phone': '0912345678', 'shipping_address': '台北市',
+                'items': [{'product_id': '1', 'quantity': '2'}],
+            }, content_type='application/json')
+        self.order = Order.objects.get()
+        self.message = OutboxMessage.objects.get()
+        self.message.attempts = 1
+
+    def process(self, **reserve_stock):
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch.object(ProductService, 'reserve_stock', **reserve_stock):
+            return outbox.process_message(self.message, max_attempts=3, retry_backoff=0)
+
+    def test_only_transient_errors_are_retried(self):
+        for reserve_stock in ({'return_value': None}, {'side_effect': requests.ConnectionError('refused')}):
+            self.assertFalse(self.process(**reserve_stock))
+            self.assertEqual(self.message.status, 'pending')
+
+        self.assertFalse(self.process(side_effect=KeyError('items')))
+        self.assertEqual(self.message.status, 'failed')
+        self.assertEqual(self.message.attempts, 1)
+
+    def test_failed_reservation_cancels_order_and_releases_stock(self):
+        self.message.attempts = 3
+        self.process(return_value=None)
+        self.assertEqual(self.message.status, 'failed')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+        today = self.order.created_at.date()
+        self.assertEqual(daily_rollups()[0], [(today, 'cancelled', 1, Decimal('0.00'))])
+
+        # 先前的嘗試可能已建立預留，由另一則訊息釋放
+        with mock.patch.object(ProductService, 'release_stock', return_value={'result': True}) as release_stock:
+            self.assertEqual(outbox.process_batch(retry_backoff=0), 1)
+        release_stock.assert_called_once_with(self.order.order_number)
+        self.assertEqual(list(OutboxMessage.objects.values_list('topic', 'status')), [('order.reserve', 'failed')])
+
+    def test_status_change_waits_for_reservation(self):
+        response = self.client.patch(f'/api/orders/{self.order.id}/status/', {'status': 'confirmed'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['errorCode'], 'ORDER_RESERVATION_PENDING')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+
+        reservation = {'result': True, 'data': {'items': [{'product_id': 1, 'name': '商品 1', 'price': '100.00'}]}}
+        with mock.patch.object(ProductService, 'refresh_products'), \
+                mock.patch.object(ProductService, 'commit_stock', return_value={'result': True}):
+            self.assertTrue(self.process(return_value=reservation))
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.total_amount), ('confirmed', Decimal('200.00')))
+        response = self.client.patch(f'/api/orders/{self.order.id}/status/', {'status': 'shipped'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+
+def daily_rollups():
+    return (
+        list(DailyOrderStats.objects.order_by('date', 'status').values_list('date', 'status', 'order_count',
+                                                                            'revenue')),
+        list(DailyProductSales.objects.order_by('date', 'status', 'product_id').values_list(
+            'date', 'status', 'product_id', 'quantity', 'revenue')),
+    )
+
+
+class OrderAnalyticsTests(TestCase):
+    """每日統計隨訂單建立與狀態變更增量更新，結果應與完整重建相同"""
+
+    def create_order(self, *items):
+        return save_order(f'ORD-{Order.objects.count():04d}', {
+            'customer_name': '測試客戶', 'customer_email': 'test@example.com', 'customer_phone': '0912345678',
+            'shipping_address': '台北市',
+            'items': [{'product_id': product_id, 'product_name': f'商品 {product_id}', 'unit_price': Decimal(price),
+                       'quantity': quantity, 'subtotal': Decimal(price) * quantity}
+                      for product_id, price, quantity in items],
+        })
+
+    def rollups(self):
+        return daily_rollups()
+
+    def test_rollups_written_after_commit(self):
+        # 建立訂單的交易中不更新熱門統計列，提交後才累加
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.create_order((1, '100.00', 2))
+            self.assertEqual(daily_rollups(), ([], []))
+
+        for callback in callbacks:
+            callback()
+        today = Order.objects.get().created_at.date()
+        self.assertEqual(daily_rollups(), ([(today, 'pending', 1, Decimal('200.00'))],
+                                           [(today, 'pending', 1, 2, Decimal('200.00'))]))
+
+    def test_incremental_rollups_match_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_order((1, '100.00', 2), (2, '50.00', 1))
+            self.create_order((1, '100.00', 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/orders/{first.id}/status/', {'status': 'shipped'},
+                                         content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        with override_settings(ORDER_ASYNC_CREATE=True), self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/orders/', {
+                'customer_name': '測試客戶', 'customer_email': 'test@example.com',
+                'customer_phone': '0912345678', 'shipping_address': '台北市',
+                'items': [{'product_id': '3', 'quantity': '1'}],
+            }, content_type='application/json')
+
+        incremental = self.rollups()
+        today = first.created_at.date()
+        analytics.rebuild(today, today)
+        self.assertEqual(incremental, self.rollups())
+
+        data = self.client.get('/api/orders/analytics/').json()['data']
+        self.assertEqual(data['daily'][-1], {'date': today.isoformat(), 'order_count': 3, 'revenue': '350.00'})
+        self.assertEqual(
+            [(row['status'], row['order_count']) for row in data['by_status'] if row['order_count']],
+            [('pending', 2), ('shipped', 1)]
+        )
+        self.assertEqual([(row['product_id'], row['quantity'], row['revenue']) for row in data['top_products']],
+                         [(1, 3, '300.00'), (2, 1, '50.00'), (3, 1, '0.00')])
+
+    def test_invalid_parameters(self):
+        for query in ('start=2024-13-01', 'start=2024-02-01&end=2024-01-01', 'status=unknown', 'top=0',
+                      'start=2020-01-01&end=2024-01-01'):
+            response = self.client.get(f'/api/orders/analytics/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertEqual(response.json()['errorCode'], 'VALIDATION_ERROR')
+
+
+class OrderStatusTests(UpstreamServerMixin, TestCase):
+    """取消訂單時歸還庫存；已取消的訂單不可改回其他狀態，否則庫存不會重新預留"""
+
+    def setUp(self):
+        self.server.posted.clear()
+        # 以測試伺服器作為商品服務，並建立新的共用客戶端
+        self.enterContext(override_settings(PRODUCT_SERVICE_URL=self.base_url))
+        self.enterContext(mock.patch.object(http_client, '_client', None))
+        self.order = save_order('ORD-CANCEL', {
+            'customer_name': '測試客戶', 'customer_email': 'test@example.com', 'customer_phone': '0912345678',
+            'shipping_address': '台北市',
+            'items': [{'product_id': 1, 'product_name': '商品 1', 'unit_price': Decimal('100.00'), 'quantity': 2,
+                       'subtotal': Decimal('200.00')}],
+        })
+
+    def patch_status(self, new_status):
+        return self.client.patch(f'/api/orders/{self.order.id}/status/', {'status': new_status},
+                                 content_type='application/json')
+
+    def test_cancel_releases_stock(self):
+        response = self.patch_status('cancelled')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.posted, ['/api/products/stock/reservations/ORD-CANCEL/release/'])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+
+    def test_cancelled_order_cannot_change_status(self):
+        self.assertEqual(self.patch_status('cancelled').status_code, 200)
+
+        response = self.patch_status('confirmed')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['errorCode'], 'ORDER_CANCELLED')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+        # 重複取消不會再次歸還庫存
+        self.assertEqual(self.patch_status('cancelled').status_code, 200)
+        self.assertEqual(len(self.server.posted), 1)
+
+
+class SeedOrdersTests(TestCase):
+    """seed_orders 批次建立的訂單金額與每日統計和逐筆建立時一致"""
+
+    def test_seed_orders(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('seed_orders', orders=30, products=5, max_items=3, customers=4, batch_size=8,
+                         stdout=io.StringIO())
+        self.assertEqual(Order.objects.count(), 30)
+        for order in Order.objects.annotate(items_total=Sum('items__subtotal')):
+            self.assertEqual(order.total_amount, order.items_total.quantize(Decimal('0.01')))
+        self.assertEqual(Order.objects.values('customer_email').distinct().count(), 4)
+
+        rollups = daily_rollups()
+        today = Order.objects.first().created_at.date()
+        analytics.rebuild(today, today)
+        self.assertEqual(rollups, daily_rollups())
+
+
+class CustomerOrderHistoryTests(TestCase):
+    """客戶訂單歷史：Email 不分大小寫，keyset 分頁，單一查詢取得項目數"""
+
+    def setUp(self):
+        for i, email in enumerate(['Alice@Example.com', 'alice@example.com', 'ALICE@example.com', 'bob@example.com']):
+            order = Order.objects.create(
+                order_number=f'ORD-HIST{i}', customer_name='測試客戶', customer_email=email,
+                customer_phone=f'09{i:08d}', shipping_address='台北市', total_amount=Decimal('10.00')
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=product_id, product_name='商品', unit_price=Decimal('5.00'),
+                          quantity=1)
+                for product_id in range(i + 1)
+            ])
+
+    def test_history_by_email(self):
+        with self.assertNumQueries(1):
+            first = self.client.get('/api/orders/customer-history/?email= alice@EXAMPLE.com&page_size=2').json()
+        self.assertEqual(
+            [(row['order_number'], row['item_count'], row['total_amount']) for row in first['data']['results']],
+            [('ORD-HIST2', 3, '10.00'), ('ORD-HIST1', 2, '10.00')]
+        )
+        second = self.client.get(first['data']['next']).json()['data']
+        self.assertEqual([row['order_number'] for row in second['results']], ['ORD-HIST0'])
+        self.assertIsNone(second['next'])
+
+        by_phone = self.client.get('/api/orders/customer-history/?phone=0900000003').json()['data']['results']
+        self.assertEqual([row['order_number'] for row in by_phone], ['ORD-HIST3'])
+
+    def test_requires_valid_filter(self):
+        for query in ('', 'email=not-an-email'):
+            response = self.client.get(f'/api/orders/customer-history/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+
+class OrderProjectionTests(TestCase):
+    """訂單列表以 values() 產生的輸出需與 OrderSerializer 完全相同"""
+
+    def setUp(self):
+        for i in range(3):
+            order = Order.objects.create(
+                order_number=f'ORD-PROJ{i}', customer_name='測試客戶', customer_email='test@example.com',
+                customer_phone='0912345678', shipping_address='台北市', status='confirmed',
+                total_amount=Decimal('10.50') * i, notes='' if i else '備註'
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=product_id, product_name=f'商品 {product_id}',
+                          unit_price=Decimal('5.25'), quantity=product_id)
+                for product_id in range(1, i + 1)
+            ])
+
+    def test_matches_serializer(self):
+        expected = OrderSerializer(Order.objects.prefetch_related('items').order_by('-created_at', '-id'),
+                                   many=True).data
+        response = self.client.get('/api/orders/')
+        self.assertEqual(response.content.decode().count('"items"'), 3)
+        self.assertEqual(response.json()['data']['results'], json.loads(json.dumps(expected)))
+
+    def test_sparse_fields_skip_items(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/?fields=status,order_number')
+        self.assertEqual(response.json()['data']['results'][0], {'order_number': 'ORD-PROJ2', 'status': 'confirmed'})
@@ -1,8 +1,18 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('orders/', views.OrderListView.as_view(), name='orders'),
+    path('orders/import/', views.import_orders, name='order-import'),
+    path('orders/export/', views.export_orders, name='order-export'),
+    path('orders/analytics/', views.order_analytics, name='order-analytics'),
+    path('orders/customer-history/', views.CustomerOrderHistoryView.as_view(), name='order-customer-history'),
     path('orders/<int:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
     path('orders/<int:pk>/status/', views.update_order_status, name='order-status-update'),
+    # 非同步版本，建議以 ASGI 伺服器（uvicorn）執行
+    path('async/orders/', async_views.create_order, name='order-create-async'),
+    path('async/stock/', async_views.check_stock, name='stock-check-async'),
+    path('internal/product-service/stats/', views.product_service_stats, name='product-service-stats'),
+    path('internal/product-cache/stats/', views.product_cache_stats, name='product-cache-stats'),
+    path('internal/product-cache/invalidate/', views.product_cache_invalidate, name='product-cache-invalidate'),
 ]
\ No newline at end of file
@@ -1,26 +1,69 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
 from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import Lower
 from .models import Order, OrderItem
-from .serializers import OrderSerializer, OrderCreateSerializer
+from .serializers import OrderCreateSerializer, OrderHistorySerializer, OrderItemSerializer, OrderSerializer
 from .services import ProductService
+from . import analytics, outbox
+from .importer import CSV_FIELDS, PARSERS, OrderImporter, iter_lines
+from shared_models import metrics, tracing
+from shared_models.projections import Projection, parse_fields_param
+from shared_models.exports import EXPORT_CONTENT_TYPES, parse_datetime_param, streaming_export
 from shared_models.serializers import BaseResponseSerializer
+from django.conf import settings
+from decimal import Decimal
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
+
+# 列表與 OrderSerializer 輸出相同，但直接由 values() 的 dict 產生；items 另以一次查詢取得
+ORDER_PROJECTION = Projection(OrderSerializer, external=['items'])
+ORDER_ITEM_PROJECTION = Projection(OrderItemSerializer)
+ORDER_HISTORY_PROJECTION = Projection(OrderHistorySerializer)
+
 class OrderListView(generics.ListCreateAPIView):
-    queryset = Order.objects.all().order_by('-created_at')
+    queryset = Order.objects.prefetch_related('items').order_by('-created_at', '-id')
     serializer_class = OrderSerializer
     
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return BaseResponseSerializer.success(data=serializer.data, message="訂單列表查詢成功")
+        """訂單列表（keyset 分頁）；fields 可只取部分欄位，未包含 items 時不查詢訂單項目"""
+        try:
+            fields = parse_fields_param(request.query_params.get('fields'), ORDER_PROJECTION.names)
+        except ValueError as e:
+            return BaseResponseSerializer.fail(message=str(e), error_code="VALIDATION_ERROR")
+        projection = ORDER_PROJECTION.only(fields) if fields else ORDER_PROJECTION
+        
+        page = self.paginate_queryset(
+            Order.objects.values(*dict.fromkeys([*projection.columns, 'id', 'created_at']))
+        )
+        with metrics.timer('serialize'):
+            items = {}
+            if 'items' in projection and page:
+                for item in OrderItem.objects.filter(order_id__in=[row['id'] for row in page]).order_by('id').values(
+                    'order_id', *ORDER_ITEM_PROJECTION.columns
+                ):
+                    items.setdefault(item['order_id'], []).append(ORDER_ITEM_PROJECTION.row(item))
+            data = [projection.row(row, {'items': items.get(row['id'], [])}) for row in page]
+        return BaseResponseSerializer.success(
+            data=self.paginator.get_paginated_data(data),
+            message="訂單列表查詢成功"
+        )
     
     def create(self, request, *args, **kwargs):
         """建立新訂單"""
-        serializer = OrderCreateSerializer(data=request.data)
-        if not serializer.is_valid():
+        serializer = OrderCreateSerializer(
+            data=request.data, context={'resolve_products': not settings.ORDER_ASYNC_CREATE}
+        )
+        # 驗證包含向商品服務查詢商品目錄，獨立一個 span 方便區分耗時
+        with tracing.start_span('validate_items'):
+            valid = serializer.is_valid()
+        if not valid:
             error_message = self._extract_error_message(serializer.errors)
             return BaseResponseSerializer.fail(
                 message=error_message,
@@ -29,38 +72,84 @@ class OrderListView(generics.ListCreateAPIView):
             )
         
         validated_data = serializer.validated_data
+        order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+        if settings.ORDER_ASYNC_CREATE:
+            return self._create_async(order_number, validated_data)
+        
+        # 先向商品服務預留庫存（條件式扣庫存），再寫入訂單；不在 HTTP 呼叫期間持有本地交易
+        quantities = {}
+        for item in validated_data['items']:
+            quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+        
+        reservation = ProductService.reserve_stock(order_number, quantities)
+        if reservation is None:
+            return BaseResponseSerializer.fail(
+                message="商品服務暫時無法使用，請稍後再試",
+                error_code="PRODUCT_SERVICE_UNAVAILABLE",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        if not reservation.get('result'):
+            return BaseResponseSerializer.fail(
+                message=reservation.get('message', '庫存預留失敗'),
+                error_code=reservation.get('errorCode') or "STOCK_RESERVATION_FAILED",
+                status_code=status.HTTP_409_CONFLICT
+            )
+        
+        # 以預留當下商品服務回傳的名稱與價格為準，並更新本地快取
+        reserved_items = reservation.get('data', {}).get('items', [])
+        changed = apply_reserved_prices(validated_data['items'], reserved_items)
+        if changed:
+            ProductService.refresh_products(changed)
         
         try:
-            with transaction.atomic():
-                # 計算總金額
-                total_amount = sum(item['subtotal'] for item in validated_data['items'])
-                
-                # 建立訂單
-                order = Order.objects.create(
-                    order_number=f"ORD-{uuid.uuid4().hex[:8].upper()}",
-                    customer_name=validated_data['customer_name'],
-                    customer_email=validated_data['customer_email'],
-                    customer_phone=validated_data['customer_phone'],
-                    shipping_address=validated_data['shipping_address'],
-                    notes=validated_data.get('notes', ''),
-                    total_amount=total_amount
-                )
-                
-                # 建立訂單項目
-                for item_data in validated_data['items']:
-                    OrderItem.objects.create(order=order, **item_data)
-                
-                return BaseResponseSerializer.created(
-                    data=OrderSerializer(order).data,
-                    message="訂單建立成功"
-                )
-                
+            order = save_order(order_number, validated_data)
         except Exception as e:
+            # 訂單未寫入，歸還預留的庫存
+            if ProductService.release_stock(order_number) is None:
+                logger.error(f"訂單 {order_number} 建立失敗且無法釋放庫存預留")
             return BaseResponseSerializer.fail(
                 message=f'訂單建立失敗: {str(e)}',
                 error_code="ORDER_CREATION_FAILED",
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        
+        if ProductService.commit_stock(order_number) is None:
+            # 預留仍有效（庫存已扣除），僅確認狀態未同步
+            logger.warning(f"訂單 {order_number} 的庫存預留確認失敗")
+        
+        return BaseResponseSerializer.created(
+            data=OrderSerializer(order).data,
+            message="訂單建立成功"
+        )
+    
+    def _create_async(self, order_number, validated_data):
+        """非同步建立：訂單與外寄匣訊息在同一個交易寫入，立即回傳 202
+
+        商品名稱與價格在 worker 預留庫存後才填入，訂單確認前金額為 0。
+        """
+        with transaction.atomic():
+            order = Order.objects.create(
+                order_number=order_number,
+                customer_name=validated_data['customer_name'],
+                customer_email=validated_data['customer_email'],
+                customer_phone=validated_data['customer_phone'],
+                shipping_address=validated_data['shipping_address'],
+                notes=validated_data.get('notes', ''),
+                total_amount=Decimal('0')
+            )
+            items = OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=item['product_id'], product_name='',
+                          unit_price=Decimal('0'), quantity=item['quantity'])
+                for item in validated_data['items']
+            ])
+            outbox.enqueue(outbox.TOPIC_RESERVE_ORDER, {'order_id': order.id})
+            analytics.record_created([(order, items)])
+        
+        order._prefetched_objects_cache = {'items': items}
+        return BaseResponseSerializer.accepted(
+            data=OrderSerializer(order).data,
+            message="訂單已受理，確認庫存後狀態會更新為 confirmed 或 cancelled"
+        )
     
     def _extract_error_message(self, errors):
         """提取第一個錯誤訊息"""
@@ -76,8 +165,142 @@ class OrderListView(generics.ListCreateAPIView):
             return errors[0]
         return "資料驗證失敗"
 
+def save_order(order_number, validated_data):
+    """在單一交易中寫入訂單與項目；項目以記憶體中的資料預先載入，序列化時不再查詢"""
+    with tracing.start_span('save_order'), transaction.atomic():
+        order = Order.objects.create(
+            order_number=order_number,
+            customer_name=validated_data['customer_name'],
+            customer_email=validated_data['customer_email'],
+            customer_phone=validated_data['customer_phone'],
+            shipping_address=validated_data['shipping_address'],
+            notes=validated_data.get('notes', ''),
+            total_amount=sum(item['subtotal'] for item in validated_data['items'])
+        )
+        
+        # 一次 INSERT 建立所有訂單項目
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, **item_data) for item_data in validated_data['items']
+        ])
+        analytics.record_created([(order, items)])
+    
+    order._prefetched_objects_cache = {'items': items}
+    return order
+
+def apply_reserved_prices(items, reserved_items):
+    """快取中的價格可能已過期，改用預留回應中的最新名稱與價格，回傳有變動的商品"""
+    reserved = {item['product_id']: item for item in reserved_items}
+    changed = {}
+    for item in items:
+        current = reserved.get(item['product_id'])
+        if current is None:
+            continue
+        unit_price = Decimal(current['price'])
+        if item['product_name'] == current['name'] and item['unit_price'] == unit_price:
+            continue
+        item['product_name'] = current['name']
+        item['unit_price'] = unit_price
+        item['subtotal'] = unit_price * item['quantity']
+        changed[item['product_id']] = current
+    return list(changed.values())
+
+@api_view(['POST'])
+def import_orders(request):
+    """批次匯入訂單 - 逐行讀取 NDJSON 或 CSV 上傳內容，不將整個檔案載入記憶體"""
+    # 不使用 ?format=，該參數保留給 DRF 選擇 renderer
+    import_format = request.query_params.get('file_format')
+    if not import_format:
+        import_format = 'csv' if 'csv' in request.content_type else 'ndjson'
+    if import_format not in PARSERS:
+        return BaseResponseSerializer.fail(
+            message=f"不支援的格式: {import_format}（可用: {', '.join(PARSERS)}）",
+            error_code="VALIDATION_ERROR"
+        )
+    
+    chunk_size = request.query_params.get('chunk_size')
+    if chunk_size is not None:
+        if not chunk_size.isdigit() or not 0 < int(chunk_size) <= 5000:
+            return BaseResponseSerializer.fail(
+                message="chunk_size 必須是 1 到 5000 之間的整數",
+                error_code="VALIDATION_ERROR"
+            )
+        chunk_size = int(chunk_size)
+    
+    # 直接讀取原始請求串流，避免 DRF 解析器把整個內容讀進記憶體
+    stream = request.stream
+    if stream is None:
+        return BaseResponseSerializer.fail(
+            message="請提供要匯入的訂單資料",
+            error_code="VALIDATION_ERROR"
+        )
+    
+    summary = OrderImporter(chunk_size=chunk_size).run(PARSERS[import_format](iter_lines(stream)))
+    return BaseResponseSerializer.success(
+        data=summary,
+        message=f"訂單匯入完成：成功 {summary['imported']} 筆，失敗 {summary['failed']} 筆"
+    )
+
+ORDER_EXPORT_FIELDS = ('id', 'order_number', 'customer_name', 'customer_email', 'customer_phone',
+                       'shipping_address', 'status', 'total_amount', 'notes', 'created_at', 'updated_at')
+ORDER_ITEM_EXPORT_FIELDS = ('product_id', 'product_name', 'unit_price', 'quantity', 'subtotal')
+# CSV 欄位與匯入格式相容，可直接重新匯入
+ORDER_CSV_FIELDS = ['id'] + CSV_FIELDS + ['total_amount', 'created_at', 'updated_at']
+
+def _order_export_rows(queryset, chunk_size):
+    """逐筆產生訂單資料；iterator(chunk_size) 使用伺服器端游標，並對每一批預先載入項目"""
+    for order in queryset.iterator(chunk_size=chunk_size):
+        row = {field: getattr(order, field) for field in ORDER_EXPORT_FIELDS}
+        row['items'] = [
+            {field: getattr(item, field) for field in ORDER_ITEM_EXPORT_FIELDS}
+            for item in order.items.all()
+        ]
+        yield row
+
+def _order_csv_row(row):
+    """項目攤平成匯入格式「商品ID:數量:單價」，以分號分隔"""
+    return dict(row, items=';'.join(
+        f"{item['product_id']}:{item['quantity']}:{item['unit_price']}" for item in row['items']
+    ))
+
+@api_view(['GET'])
+def export_orders(request):
+    """串流匯出訂單 (NDJSON / CSV)，可依建立時間與狀態篩選"""
+    export_format = request.query_params.get('file_format', 'ndjson')
+    if export_format not in EXPORT_CONTENT_TYPES:
+        return BaseResponseSerializer.fail(
+            message=f"不支援的格式: {export_format}（可用: {', '.join(EXPORT_CONTENT_TYPES)}）",
+            error_code="VALIDATION_ERROR"
+        )
+    
+    queryset = Order.objects.prefetch_related('items').order_by('id')
+    try:
+        created_after = parse_datetime_param(request.query_params.get('created_after'))
+        created_before = parse_datetime_param(request.query_params.get('created_before'), end=True)
+    except ValueError as e:
+        return BaseResponseSerializer.fail(message=str(e), error_code="VALIDATION_ERROR")
+    if created_after:
+        queryset = queryset.filter(created_at__gte=created_after)
+    if created_before:
+        queryset = queryset.filter(created_at__lt=created_before)
+    
+    statuses = [s for s in request.query_params.get('status', '').split(',') if s]
+    if statuses:
+        valid_statuses = dict(Order.STATUS_CHOICES)
+        invalid = [s for s in statuses if s not in valid_statuses]
+        if invalid:
+            return BaseResponseSerializer.fail(
+                message=f"無效的訂單狀態: {', '.join(invalid)}",
+                error_code="INVALID_STATUS"
+            )
+        queryset = queryset.filter(status__in=statuses)
+    
+    return streaming_export(
+        _order_export_rows(queryset, settings.EXPORT_CHUNK_SIZE), export_format, 'orders',
+        csv_fields=ORDER_CSV_FIELDS, csv_row=_order_csv_row
+    )
+
 class OrderDetailView(generics.RetrieveAPIView):
-    queryset = Order.objects.all()
+    queryset = Order.objects.prefetch_related('items')
     serializer_class = OrderSerializer
     
     def retrieve(self, request, *args, **kwargs):
@@ -90,6 +313,49 @@ class OrderDetailView(generics.RetrieveAPIView):
         except Order.DoesNotExist:
             return BaseResponseSerializer.not_found(message="訂單不存在")
 
+class CustomerOrderHistoryView(generics.ListAPIView):
+    """客戶訂單歷史：依 Email（不分大小寫）或電話查詢，keyset 分頁
+
+    只回傳訂單編號、狀態、金額與項目數，項目數以 COUNT 彙總，不載入訂單項目。
+    """
+    serializer_class = OrderHistorySerializer
+    
+    def list(self, request, *args, **kwargs):
+        email = request.query_params.get('email', '').strip().lower()
+        phone = request.query_params.get('phone', '').strip()
+        if not email and not phone:
+            return BaseResponseSerializer.fail(message="請指定 email 或 phone", error_code="VALIDATION_ERROR")
+        if email:
+            try:
+                validate_email(email)
+            except ValidationError:
+                return BaseResponseSerializer.fail(message="Email格式不正確", error_code="VALIDATION_ERROR")
+        
+        queryset = Order.objects.all()
+        if email:
+            # 與索引 order_customer_email_idx 相同的運算式，iexact 產生的 UPPER(...) LIKE 無法使用索引
+            queryset = queryset.alias(email_normalized=Lower('customer_email')).filter(email_normalized=email)
+        if phone:
+            queryset = queryset.filter(customer_phone=phone)
+        queryset = queryset.values('id', 'order_number', 'status', 'total_amount', 'created_at').annotate(
+            item_count=Count('items')
+        )
+        
+        page = self.paginate_queryset(queryset)
+        with metrics.timer('serialize'):
+            data = ORDER_HISTORY_PROJECTION.rows(page)
+        return BaseResponseSerializer.success(
+            data=self.paginator.get_paginated_data(data),
+            message="客戶訂單查詢成功"
+        )
+
+def _cancelled_order_response():
+    return BaseResponseSerializer.fail(
+        message="訂單已取消，無法變更狀態",
+        error_code="ORDER_CANCELLED",
+        status_code=status.HTTP_409_CONFLICT
+    )
+
 @api_view(['PATCH'])
 def update_order_status(request, pk):
     """更新訂單狀態"""
@@ -105,10 +371,85 @@ def update_order_status(request, pk):
             error_code="INVALID_STATUS"
         )
     
-    order.status = new_status
-    order.save()
+    # 取消時庫存已歸還，改回其他狀態不會重新預留，因此已取消的訂單不可再變更
+    if order.status == 'cancelled' and new_status != 'cancelled':
+        return _cancelled_order_response()
+    
+    # 非同步建立的訂單在預留完成前只能取消；改成其他狀態後 worker 不會預留庫存也不會填入價格
+    if new_status not in ('cancelled', order.status) and outbox.has_pending_reservation(order.id):
+        return BaseResponseSerializer.fail(
+            message="訂單仍在等待庫存預留，只能取消",
+            error_code="ORDER_RESERVATION_PENDING",
+            status_code=status.HTTP_409_CONFLICT
+        )
+    
+    # 取消訂單時歸還庫存；釋放失敗則不變更狀態，讓呼叫端重試
+    if new_status == 'cancelled' and order.status != 'cancelled':
+        released = ProductService.release_stock(order.order_number)
+        if released is None:
+            return BaseResponseSerializer.fail(
+                message="商品服務暫時無法使用，無法歸還庫存",
+                error_code="PRODUCT_SERVICE_UNAVAILABLE",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+    
+    with transaction.atomic():
+        # 鎖定訂單列，並行的狀態變更不會重複搬移每日統計
+        order = Order.objects.select_for_update().get(pk=pk)
+        if order.status == 'cancelled' and new_status != 'cancelled':
+            # 並行的取消請求已先提交
+            return _cancelled_order_response()
+        previous = analytics.order_snapshot(order)
+        order.status = new_status
+        order.save(update_fields=['status', 'updated_at'])
+        analytics.record_change(previous, analytics.with_status(previous, new_status))
     
     return BaseResponseSerializer.success(
         data=OrderSerializer(order).data,
         message="訂單狀態更新成功"
-    )
\ No newline at end of file
+    )
+
+@api_view(['GET'])
+def order_analytics(request):
+    """訂單儀表板：每日營收、各狀態訂單數與熱銷商品，由每日統計表提供"""
+    try:
+        params = analytics.parse_summary_params(request.query_params)
+    except ValueError as e:
+        return BaseResponseSerializer.fail(message=str(e), error_code="VALIDATION_ERROR")
+    
+    return BaseResponseSerializer.success(
+        data=analytics.summarize(**params),
+        message="訂單統計查詢成功"
+    )
+
+@api_view(['GET'])
+def product_service_stats(request):
+    """商品服務客戶端狀態 - 觀察斷路器與連線重用情況"""
+    return BaseResponseSerializer.success(
+        data=ProductService.get_client_stats(),
+        message="商品服務客戶端狀態查詢成功"
+    )
+
+@api_view(['GET'])
+def product_cache_stats(request):
+    """商品目錄快取命中統計"""
+    return BaseResponseSerializer.success(
+        data=ProductService.get_cache_stats(),
+        message="商品快取狀態查詢成功"
+    )
+
+@api_view(['POST'])
+def product_cache_invalidate(request):
+    """使商品目錄快取失效；未指定 product_ids 時清除全部"""
+    product_ids = request.data.get('product_ids')
+    if product_ids is not None:
+        try:
+            product_ids = [int(product_id) for product_id in product_ids]
+        except (TypeError, ValueError):
+            return BaseResponseSerializer.fail(
+                message="product_ids 必須為數字陣列",
+                error_code="VALIDATION_ERROR"
+            )
+    
+    ProductService.invalidate_products(product_ids)
+    return BaseResponseSerializer.success(message="商品快取已清除")
\ No newline at end of file
@@ -6,7 +6,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key')
 DEBUG = os.environ.get('DEBUG', 'True') == 'True'
 
-ALLOWED_HOSTS = ['*']
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '*').split(',')
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -39,7 +39,10 @@ TEMPLATES = [
 
 
 MIDDLEWARE = [
+    'shared_models.middleware.TracingMiddleware',
+    'shared_models.middleware.PerformanceMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'shared_models.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,18 +62,81 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', 'password'),
         'HOST': os.environ.get('DB_HOST', 'product-db'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # 持久連線：同一個 worker 執行緒重用連線，取用前先檢查連線是否仍可用。
+        # 在 ASGI worker 下每個請求在不同執行緒執行，應設為 0 或改用 PgBouncer
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        # 經由 PgBouncer transaction pooling 連線時必須停用伺服器端游標
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True',
     }
 }
 
+# 以 orjson 輸出 JSON 回應（內容與 DRF JSONRenderer 相同）；未安裝 orjson 時記錄警告並改用 JSONRenderer
+FAST_JSON_RENDERER = os.environ.get('FAST_JSON_RENDERER', 'False') == 'True'
+
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'shared_models.pagination.KeysetPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'shared_models.renderers.ORJSONRenderer' if FAST_JSON_RENDERER else 'rest_framework.renderers.JSONRenderer',
     ],
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+# 快取後端：預設為行程內 locmem；設定 REDIS_URL 時改用 Redis（需安裝 redis 套件），多個 worker 才能共用快取與目錄版本
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'product-service',
+        }
+    }
+
+# 商品目錄回應快取：使用的快取別名與存活秒數。目錄版本存放在快取中，所有 worker 必須共用同一個快取，
+# 因此預設只在設定 REDIS_URL 時啟用；快取別名為行程內 locmem 時啟動會失敗
+CATALOG_CACHE_ENABLED = os.environ.get('CATALOG_CACHE_ENABLED', str(bool(os.environ.get('REDIS_URL')))) == 'True'
+CATALOG_CACHE_ALIAS = os.environ.get('CATALOG_CACHE_ALIAS', 'default')
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', '300'))
+
+# 分片庫存的總量快取秒數；分片寫入後會主動失效，因此預設快取為行程內 locmem 時不快取，0 表示停用
+STOCK_SHARD_CACHE_TIMEOUT = int(os.environ.get('STOCK_SHARD_CACHE_TIMEOUT', '5'))
+
+# 串流匯出：每次從資料庫游標讀取（並預先載入關聯資料）的筆數
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
+
+# 商品事件串流：長輪詢最長等待秒數、輪詢資料庫的間隔與事件保留天數
+PRODUCT_EVENT_MAX_WAIT = float(os.environ.get('PRODUCT_EVENT_MAX_WAIT', '30'))
+PRODUCT_EVENT_POLL_INTERVAL = float(os.environ.get('PRODUCT_EVENT_POLL_INTERVAL', '0.5'))
+PRODUCT_EVENT_RETENTION_DAYS = int(os.environ.get('PRODUCT_EVENT_RETENTION_DAYS', '7'))
+
+# 壓測時在回應加上 X-DB-Query-Count 標頭（scripts/benchmark.py 會讀取）
+QUERY_COUNT_HEADER = os.environ.get('QUERY_COUNT_HEADER', 'False') == 'True'
+
+# 效能指標：依比例取樣（0~1）記錄各階段耗時，/metrics 提供 Prometheus 文字格式的直方圖；
+# Server-Timing 標頭會揭露內部耗時，對外服務可關閉
+PERF_METRICS_ENABLED = os.environ.get('PERF_METRICS_ENABLED', 'True') == 'True'
+PERF_METRICS_SAMPLE_RATE = float(os.environ.get('PERF_METRICS_SAMPLE_RATE', '1.0'))
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', 'True') == 'True'
+# 多個 worker 行程時各自的累計值寫入此目錄，/metrics 回傳所有 worker 的加總；gunicorn.conf.py 在多 worker 時自動設定
+PERF_METRICS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR', '')
+
+# 分散式追蹤：traceparent 標頭在服務間傳遞；span 匯出到檔案（每行一批 OTLP JSON）
+# 或 OTLP/HTTP collector（TRACING_EXPORTER=otlp）
+TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'False') == 'True'
+TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', '1.0'))
+TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME', 'product-service')
+TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'file')
+TRACING_FILE = os.environ.get('TRACING_FILE', 'traces.jsonl')
+TRACING_OTLP_ENDPOINT = os.environ.get('TRACING_OTLP_ENDPOINT', 'http://otel-collector:4318/v1/traces')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # 靜態文件設定
@@ -0,0 +1,130 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from shared_models.serializers import BaseResponseSerializer
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# 只存在於單一行程的快取：各 worker 各有一份目錄版本，遞增只會讓處理寫入的 worker 失效
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def get_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def check_catalog_cache():
+    """啟用目錄快取時，快取別名必須是各 worker 共用的後端（Redis、Memcached 等）"""
+    if not settings.CATALOG_CACHE_ENABLED:
+        return
+    backend = settings.CACHES.get(settings.CATALOG_CACHE_ALIAS, {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_BACKENDS:
+        raise ImproperlyConfigured(
+            f"CATALOG_CACHE_ENABLED 需要共用的快取後端，快取 '{settings.CATALOG_CACHE_ALIAS}' 為 {backend}；"
+            "請設定 REDIS_URL，或設定 CATALOG_CACHE_ENABLED=False"
+        )
+
+
+def get_catalog_version() -> int:
+    """目前的目錄版本（毫秒時間戳）；任何商品或類別變更都會讓版本遞增，未啟用目錄快取時為 0"""
+    if not settings.CATALOG_CACHE_ENABLED:
+        return 0
+    cache = get_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(CATALOG_VERSION_KEY, version, timeout=None):
+            version = cache.get(CATALOG_VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    """遞增目錄版本，舊版本的快取回應自然失效；在交易提交後執行"""
+    if not settings.CATALOG_CACHE_ENABLED:
+        return
+
+    def bump():
+        cache = get_cache()
+        now = int(time.time() * 1000)
+        try:
+            version = cache.incr(CATALOG_VERSION_KEY)
+        except ValueError:
+            version = None
+        # 版本同時代表最後變更時間，落後於現在時間時直接校正
+        if version is None or version < now:
+            cache.set(CATALOG_VERSION_KEY, now, timeout=None)
+    transaction.on_commit(bump)
+
+
+def _epoch(value) -> int:
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.get_default_timezone())
+    return int(value.timestamp())
+
+
+def latest_update(rows, version: int) -> int:
+    """回應的最後修改時間（epoch 秒）：資料列（模型或 values() 的 dict）的 updated_at 與目錄版本取較新者"""
+    epochs = [_epoch(row['updated_at'] if isinstance(row, dict) else row.updated_at) for row in rows]
+    return max(epochs + [version // 1000])
+
+
+class CatalogCacheMixin:
+    """目錄端點的回應快取與條件式 GET
+
+    快取鍵包含目錄版本與完整網址，因此商品或類別變更後舊快取不會再被讀到。
+    ETag 由同一個鍵產生，If-None-Match 相符時不查資料庫也不序列化，直接回傳 304。
+    未啟用目錄快取時每次都重新產生回應，不附上 ETag 與 Last-Modified。
+    """
+
+    def cached_response(self, request, build):
+        """build() 回傳 (data, message, 最後修改時間 epoch 秒)"""
+        if not settings.CATALOG_CACHE_ENABLED:
+            data, message, _ = build()
+            return BaseResponseSerializer.success(data=data, message=message)
+
+        version = get_catalog_version()
+        digest = hashlib.md5(
+            f'{request.get_host()}{request.get_full_path()}'.encode()
+        ).hexdigest()
+        etag = f'"{version}-{digest[:16]}"'
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return self._not_modified(etag)
+
+        cache = get_cache()
+        key = f'catalog:{version}:{digest}'
+        entry = cache.get(key)
+        if entry is None:
+            data, message, last_modified = build()
+            entry = {'data': data, 'message': message, 'last_modified': last_modified}
+            cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+
+        if not if_none_match:
+            if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            if if_modified_since is not None and entry['last_modified'] <= if_modified_since:
+                return self._not_modified(etag, entry['last_modified'])
+
+        response = BaseResponseSerializer.success(data=entry['data'], message=entry['message'])
+        return self._with_validators(response, etag, entry['last_modified'])
+
+    def _not_modified(self, etag, last_modified=None):
+        return self._with_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+
+    @staticmethod
+    def _with_validators(response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # 允許快取但每次都要向伺服器驗證
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,172 @@
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import Category, CategoryStats, Product, StockShard
+
+# 商品對類別統計的貢獻：(類別ID, 價格, 庫存)；未上架或沒有類別時為 None
+Contribution = Optional[Tuple[int, Decimal, int]]
+
+STATE_FIELDS = ('category_id', 'is_active', 'price', 'shard_count', 'stock_quantity')
+
+
+def load_state(product_id: int) -> Optional[Dict]:
+    """讀取商品寫入前的狀態並鎖定商品列，直到本次交易結束"""
+    return Product.objects.select_for_update().filter(id=product_id).values(*STATE_FIELDS).first()
+
+
+def _shard_total(product_id: int) -> int:
+    return StockShard.objects.filter(product_id=product_id).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def _price(value) -> Decimal:
+    # 尚未從資料庫重新讀取時 price 可能是 int、float 或字串
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def apply_product_saved(product: Product, previous: Optional[Dict], stock_written: bool):
+    """Product.save() 後依寫入前後的差異更新類別統計，與商品變更在同一個交易中提交
+
+    分片商品的庫存只會由 inventory 模組變更（重新分配分片時總量不變），
+    因此商品本身的儲存只在未分片商品寫入 stock_quantity 時改變庫存。
+    """
+    current_in = product.is_active and product.category_id is not None
+    previous_in = previous is not None and previous['is_active'] and previous['category_id'] is not None
+    if not current_in and not previous_in:
+        return
+
+    if previous is None:
+        old_stock = 0
+    elif previous['shard_count']:
+        # 只有商品移出或移入類別時才需要分片加總
+        old_stock = None
+    else:
+        old_stock = previous['stock_quantity']
+
+    if previous is None:
+        new_stock = 0 if product.shard_count else product.stock_quantity
+    elif stock_written and not product.shard_count and not previous['shard_count']:
+        new_stock = product.stock_quantity
+    else:
+        new_stock = old_stock
+
+    if old_stock is None:
+        moved = previous_in != current_in or previous['category_id'] != product.category_id
+        old_stock = new_stock = _shard_total(product.id) if moved else 0
+
+    old = (previous['category_id'], _price(previous['price']), old_stock) if previous_in else None
+    new = (product.category_id, _price(product.price), new_stock) if current_in else None
+    apply_change(old, new)
+
+
+def deleted_contribution(product_id: int) -> Contribution:
+    """商品刪除前取得其貢獻（分片會隨商品一併刪除，需在刪除前加總）"""
+    previous = load_state(product_id)
+    if previous is None or not previous['is_active'] or previous['category_id'] is None:
+        return None
+    stock = _shard_total(product_id) if previous['shard_count'] else previous['stock_quantity']
+    return previous['category_id'], _price(previous['price']), stock
+
+
+def apply_change(old: Contribution, new: Contribution):
+    """將商品的貢獻從 old 改為 new；在商品表寫入後呼叫，只鎖定受影響的類別統計列"""
+    if old == new:
+        return
+    for category_id in sorted({c[0] for c in (old, new) if c is not None}):
+        stats = CategoryStats.objects.select_for_update().filter(category_id=category_id).first()
+        if stats is None:
+            # 統計列不存在（例如尚未重建），直接以商品表計算，已包含本次變更
+            rebuild([category_id])
+            continue
+
+        recompute = False
+        if old is not None and old[0] == category_id:
+            stats.product_count -= 1
+            stats.price_sum -= old[1]
+            stats.stock_total -= old[2]
+            # 移除的是最低或最高價時，無法從統計列得知下一個值
+            recompute = old[1] in (stats.min_price, stats.max_price)
+        if new is not None and new[0] == category_id:
+            stats.product_count += 1
+            stats.price_sum += new[1]
+            stats.stock_total += new[2]
+            if not recompute:
+                stats.min_price = new[1] if stats.min_price is None else min(stats.min_price, new[1])
+                stats.max_price = new[1] if stats.max_price is None else max(stats.max_price, new[1])
+
+        if recompute:
+            bounds = Product.objects.filter(category_id=category_id, is_active=True).aggregate(
+                low=Min('price'), high=Max('price')
+            )
+            stats.min_price, stats.max_price = bounds['low'], bounds['high']
+        stats.save()
+
+
+def record_stock_deltas(deltas: Dict[int, int]):
+    """預留、釋放或直接設定庫存造成的增減 {商品ID: 增減量}，在交易提交後加到類別庫存總量
+
+    預留是熱門路徑，不在預留交易中鎖定類別統計列，以免同類別的下單互相等待；
+    提交後才以單一 UPDATE ... SET stock_total = stock_total + n 累加。
+    程序在提交與累加之間中斷會造成少量誤差，可用 rebuild_category_stats 修正。
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: _apply_stock_deltas(deltas))
+
+
+def _apply_stock_deltas(deltas: Dict[int, int]):
+    by_category: Dict[int, int] = {}
+    for product_id, category_id in Product.objects.filter(
+        id__in=deltas, is_active=True, category__isnull=False
+    ).values_list('id', 'category_id'):
+        by_category[category_id] = by_category.get(category_id, 0) + deltas[product_id]
+    for category_id, delta in sorted(by_category.items()):
+        if delta and not CategoryStats.objects.filter(category_id=category_id).update(
+            stock_total=F('stock_total') + delta, updated_at=timezone.now()
+        ):
+            rebuild([category_id])
+
+
+def rebuild(category_ids: Optional[Iterable[int]] = None) -> int:
+    """以商品表與分片重新計算類別統計，未指定時重建所有類別；回傳寫入的類別數"""
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(id__in=list(category_ids))
+    category_ids = list(categories.values_list('id', flat=True))
+    if not category_ids:
+        return 0
+
+    products = Product.objects.filter(is_active=True, category_id__in=category_ids)
+    totals = {
+        row['category_id']: row for row in products.values('category_id').annotate(
+            count=Count('id'), price_sum=Sum('price'), low=Min('price'), high=Max('price'),
+            stock=Sum('stock_quantity', filter=Q(shard_count=0)),
+        )
+    }
+    shard_totals = dict(
+        StockShard.objects.filter(
+            product__is_active=True, product__shard_count__gt=0, product__category_id__in=category_ids
+        ).values('product__category_id').annotate(total=Sum('quantity')).values_list('product__category_id', 'total')
+    )
+
+    now = timezone.now()
+    rows = []
+    for category_id in category_ids:
+        row = totals.get(category_id, {})
+        rows.append(CategoryStats(
+            category_id=category_id,
+            product_count=row.get('count', 0),
+            price_sum=row.get('price_sum') or 0,
+            min_price=row.get('low'),
+            max_price=row.get('high'),
+            stock_total=(row.get('stock') or 0) + (shard_totals.get(category_id) or 0),
+            updated_at=now,
+        ))
+    CategoryStats.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['category'],
+        update_fields=['product_count', 'price_sum', 'min_price', 'max_price', 'stock_total', 'updated_at'],
+    )
+    return len(rows)
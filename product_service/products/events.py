@@ -0,0 +1,110 @@
+import time
+from decimal import Decimal
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import connections, router
+
+from .models import Product, ProductEvent
+
+
+def _insert(events: List[ProductEvent]):
+    """寫入事件；事件應在交易的最後寫入，寫入到提交之間的時間越短，讀取端等待越少"""
+    if events:
+        ProductEvent.objects.bulk_create(events)
+
+
+def _contiguous(events: List[ProductEvent], after: int) -> int:
+    """從 after + 1 開始連續的事件筆數"""
+    for index, event in enumerate(events):
+        if event.id != after + 1 + index:
+            return index
+    return len(events)
+
+
+def committed_events(after: int, count: int, timeout: float) -> List[ProductEvent]:
+    """id 大於 after 的事件（最多 count 筆），只回傳之後不會再出現更小 id 的部分
+
+    id 在寫入時配發，並行交易可能以不同的順序提交：id 較小的交易較晚提交時，
+    若先回傳較大的 id，消費端的 after 會越過它，較小的事件就永遠不會被讀到。
+    寫入端不加鎖，由讀取端處理：事件 id 連續時直接回傳；中間有空號時，持有空號的交易
+    若尚未結束，必定在讀取後取得的快照的進行中交易（pg_snapshot_xip）之中
+    （事件在商品或庫存寫入之後才寫入，配發 id 時交易已取得 xid），
+    等這些交易都結束後重新讀取，空號之前已讀到的範圍即為最終結果（空號可能是回滾的交易）。
+    等待超過 timeout 時只回傳空號之前的事件。
+    SQLite 同一時間只有一個寫入交易，id 的順序即提交順序。
+    """
+    events = list(ProductEvent.objects.filter(id__gt=after).order_by('id')[:count])
+    prefix = _contiguous(events, after)
+    connection = connections[router.db_for_read(ProductEvent)]
+    if prefix == len(events) or connection.vendor != 'postgresql':
+        return events
+
+    last_id = events[-1].id
+    deadline = time.monotonic() + timeout
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_current_snapshot()::text')
+        snapshot = cursor.fetchone()[0]
+        while True:
+            cursor.execute(
+                "SELECT COUNT(*) FROM unnest(pg_snapshot_xip(%s::pg_snapshot)) AS xid "
+                "WHERE pg_xact_status(xid) = 'in progress'",
+                [snapshot]
+            )
+            if not cursor.fetchone()[0]:
+                break
+            if time.monotonic() >= deadline:
+                return events[:prefix]
+            time.sleep(min(settings.PRODUCT_EVENT_POLL_INTERVAL, max(deadline - time.monotonic(), 0.01)))
+    return list(ProductEvent.objects.filter(id__gt=after, id__lte=last_id).order_by('id')[:count])
+
+
+def product_snapshot(product: Product) -> Dict:
+    """ProductChanged 事件內容：目錄欄位的完整快照，消費端可直接覆寫"""
+    return {
+        'id': product.id,
+        'name': product.name,
+        # 尚未從資料庫重新讀取時 price 可能是 int 或 float，統一成兩位小數
+        'price': str(Decimal(str(product.price)).quantize(Decimal('0.01'))),
+        'category_id': product.category_id,
+        'is_active': product.is_active,
+    }
+
+
+def record_product_changed(product: Product, stock_written: bool = False):
+    """記錄商品變更；本次寫入了庫存欄位時一併記錄絕對庫存量"""
+    events = [ProductEvent(event_type='ProductChanged', product_id=product.id,
+                           payload=product_snapshot(product))]
+    if stock_written and not product.shard_count:
+        events.append(ProductEvent(event_type='StockChanged', product_id=product.id,
+                                   payload={'product_id': product.id, 'stock_quantity': product.stock_quantity}))
+    _insert(events)
+
+
+def record_product_deleted(product_id: int):
+    _insert([ProductEvent(event_type='ProductDeleted', product_id=product_id, payload={'id': product_id})])
+
+
+def record_stock_deltas(deltas: Dict[int, int]):
+    """記錄預留或釋放造成的庫存增減 {商品ID: 增減量}，不另外讀取目前庫存"""
+    _insert([
+        ProductEvent(event_type='StockChanged', product_id=product_id,
+                     payload={'product_id': product_id, 'delta': delta})
+        for product_id, delta in sorted(deltas.items()) if delta
+    ])
+
+
+def record_stock_level(product_id: int, quantity: int):
+    """記錄直接設定的絕對庫存量"""
+    _insert([ProductEvent(event_type='StockChanged', product_id=product_id,
+                          payload={'product_id': product_id, 'stock_quantity': quantity})])
+
+
+def serialize_event(event: ProductEvent) -> Dict:
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'product_id': event.product_id,
+        'payload': event.payload,
+        'created_at': event.created_at,
+    }
@@ -0,0 +1,88 @@
+from decimal import Decimal, InvalidOperation
+from typing import Dict
+
+from django.db.models import Exists, OuterRef, Q
+
+from .models import StockShard
+
+# ordering 參數對應的 keyset 排序，最後一個欄位為唯一的 id
+ORDERINGS = {
+    'created_at': ('created_at', 'id'),
+    '-created_at': ('-created_at', '-id'),
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+    'name': ('name', 'id'),
+    '-name': ('-name', '-id'),
+}
+DEFAULT_ORDERING = '-created_at'
+MAX_SEARCH_LENGTH = 100
+
+
+def _decimal(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'{name} 必須為數字')
+    if not number.is_finite() or number < 0:
+        raise ValueError(f'{name} 必須為大於或等於 0 的數字')
+    return number
+
+
+def parse_product_filters(params) -> Dict:
+    """驗證商品列表的查詢參數，格式錯誤時拋出 ValueError
+
+    category=1,2 類別；min_price、max_price 價格區間；in_stock=true 只列出有庫存的商品；
+    search 比對名稱與描述；ordering 為 created_at、price、name，加上 - 表示遞減。
+    """
+    filters = {}
+
+    category = params.get('category', '')
+    if category:
+        ids = [part.strip() for part in category.split(',') if part.strip()]
+        if not ids or not all(part.isdigit() for part in ids):
+            raise ValueError('category 必須為類別 ID，以逗號分隔')
+        filters['category'] = sorted({int(part) for part in ids})
+
+    filters['min_price'] = _decimal(params, 'min_price')
+    filters['max_price'] = _decimal(params, 'max_price')
+    if filters['min_price'] is not None and filters['max_price'] is not None \
+            and filters['min_price'] > filters['max_price']:
+        raise ValueError('min_price 不可大於 max_price')
+
+    in_stock = params.get('in_stock')
+    filters['in_stock'] = in_stock is not None and in_stock.lower() in ('true', '1')
+
+    search = params.get('search', '').strip()
+    if len(search) > MAX_SEARCH_LENGTH:
+        raise ValueError(f'search 不可超過 {MAX_SEARCH_LENGTH} 個字元')
+    filters['search'] = search
+
+    ordering = params.get('ordering') or DEFAULT_ORDERING
+    if ordering not in ORDERINGS:
+        raise ValueError(f'ordering 必須為 {"、".join(ORDERINGS)} 其中之一')
+    filters['ordering'] = ORDERINGS[ordering]
+    return filters
+
+
+def apply_product_filters(queryset, filters: Dict):
+    """套用 parse_product_filters 的結果；排序由 keyset 分頁處理"""
+    if filters.get('category'):
+        queryset = queryset.filter(category_id__in=filters['category'])
+    if filters.get('min_price') is not None:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if filters.get('max_price') is not None:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+    if filters.get('in_stock'):
+        # 分片商品的 stock_quantity 只是快取，以分片是否還有庫存為準
+        queryset = queryset.filter(
+            Q(shard_count=0, stock_quantity__gt=0)
+            | Q(Exists(StockShard.objects.filter(product=OuterRef('pk'), quantity__gt=0)), shard_count__gt=0)
+        )
+    if filters.get('search'):
+        # PostgreSQL 上由 pg_trgm GIN 索引支援（遷移 0006），其他資料庫為一般的 LIKE 比對
+        search = filters['search']
+        queryset = queryset.filter(Q(name__icontains=search) | Q(description__icontains=search))
+    return queryset
@@ -0,0 +1,273 @@
+import random
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import category_stats, events
+from .caching import PROCESS_LOCAL_BACKENDS, bump_catalog_version
+from .models import Product, StockReservation, StockShard
+
+
+class InventoryError(Exception):
+    """庫存操作失敗"""
+    error_code = "INVENTORY_ERROR"
+
+    def __init__(self, message, product_id=None):
+        super().__init__(message)
+        self.message = message
+        self.product_id = product_id
+
+
+class ProductUnavailable(InventoryError):
+    error_code = "PRODUCT_NOT_FOUND"
+
+
+class InsufficientStock(InventoryError):
+    error_code = "INSUFFICIENT_STOCK"
+
+
+class ReservationReleased(InventoryError):
+    error_code = "RESERVATION_RELEASED"
+
+
+def _stock_cache_key(product_id: int) -> str:
+    return f"stock_total:{product_id}"
+
+
+def _stock_cache_enabled() -> bool:
+    """分片加總只在各 worker 共用的快取中保存；行程內快取的失效無法通知其他 worker，改為每次加總分片"""
+    return (settings.STOCK_SHARD_CACHE_TIMEOUT > 0
+            and settings.CACHES.get('default', {}).get('BACKEND') not in PROCESS_LOCAL_BACKENDS)
+
+
+def _invalidate_stock_cache(product_id: int):
+    if _stock_cache_enabled():
+        transaction.on_commit(lambda: cache.delete(_stock_cache_key(product_id)))
+
+
+def _decrement(product_id: int, quantity: int) -> bool:
+    """條件式扣庫存：UPDATE ... SET stock_quantity = stock_quantity - n WHERE stock_quantity >= n
+
+    未分片商品只需這一句 UPDATE；條件不成立時才讀取商品判斷是否為分片模式。
+    """
+    if Product.objects.filter(
+        id=product_id, is_active=True, shard_count=0, stock_quantity__gte=quantity
+    ).update(
+        stock_quantity=F('stock_quantity') - quantity,
+        updated_at=timezone.now()
+    ) == 1:
+        return True
+
+    shard_count = Product.objects.filter(id=product_id, is_active=True).values_list(
+        'shard_count', flat=True
+    ).first()
+    if not shard_count:
+        return False
+    return _decrement_sharded(product_id, quantity, shard_count)
+
+
+def _decrement_sharded(product_id: int, quantity: int, shard_count: int) -> bool:
+    """從隨機分片開始嘗試條件式扣除，單一分片不足時才鎖定所有分片合併扣除"""
+    start = random.randrange(shard_count)
+    for offset in range(shard_count):
+        if StockShard.objects.filter(
+            product_id=product_id, index=(start + offset) % shard_count, quantity__gte=quantity
+        ).update(quantity=F('quantity') - quantity) == 1:
+            _invalidate_stock_cache(product_id)
+            return True
+
+    shards = list(StockShard.objects.select_for_update().filter(
+        product_id=product_id, quantity__gt=0
+    ).order_by('index'))
+    if sum(shard.quantity for shard in shards) < quantity:
+        return False
+
+    remaining = quantity
+    for shard in shards:
+        take = min(shard.quantity, remaining)
+        StockShard.objects.filter(id=shard.id).update(quantity=F('quantity') - take)
+        remaining -= take
+        if not remaining:
+            break
+    _invalidate_stock_cache(product_id)
+    return True
+
+
+def _increment(product_id: int, quantity: int):
+    shard_count = Product.objects.filter(id=product_id).values_list('shard_count', flat=True).first()
+    if shard_count:
+        StockShard.objects.filter(
+            product_id=product_id, index=random.randrange(shard_count)
+        ).update(quantity=F('quantity') + quantity)
+        _invalidate_stock_cache(product_id)
+        return
+    Product.objects.filter(id=product_id).update(
+        stock_quantity=F('stock_quantity') + quantity,
+        updated_at=timezone.now()
+    )
+
+
+def _stock_fields(product):
+    """(商品ID, 分片數, stock_quantity)；product 可以是 Product 或 values() 查詢的 dict"""
+    if isinstance(product, dict):
+        return product['id'], product['shard_count'], product['stock_quantity']
+    return product.id, product.shard_count, product.stock_quantity
+
+
+def get_stock_levels(products: Iterable) -> Dict[int, int]:
+    """取得商品庫存 {商品ID: 數量}；分片商品使用共用快取中的分片加總，未命中或沒有共用快取時以單一查詢加總"""
+    levels = {}
+    sharded = []
+    for product in products:
+        product_id, shard_count, stock_quantity = _stock_fields(product)
+        if shard_count:
+            sharded.append(product_id)
+        else:
+            levels[product_id] = stock_quantity
+    if not sharded:
+        return levels
+
+    enabled = _stock_cache_enabled()
+    cached = cache.get_many([_stock_cache_key(pid) for pid in sharded]) if enabled else {}
+    missing = []
+    for pid in sharded:
+        key = _stock_cache_key(pid)
+        if key in cached:
+            levels[pid] = cached[key]
+        else:
+            missing.append(pid)
+
+    if missing:
+        totals = dict.fromkeys(missing, 0)
+        totals.update(
+            StockShard.objects.filter(product_id__in=missing).values('product_id').annotate(
+                total=Sum('quantity')
+            ).values_list('product_id', 'total')
+        )
+        if enabled:
+            cache.set_many(
+                {_stock_cache_key(pid): total for pid, total in totals.items()},
+                settings.STOCK_SHARD_CACHE_TIMEOUT
+            )
+        levels.update(totals)
+    return levels
+
+
+def get_stock_level(product) -> int:
+    return get_stock_levels([product])[_stock_fields(product)[0]]
+
+
+def _distribute(total: int, shard_count: int) -> List[int]:
+    base, extra = divmod(total, shard_count)
+    return [base + (1 if i < extra else 0) for i in range(shard_count)]
+
+
+def rebalance(product_id: int, shard_count: Optional[int] = None) -> Product:
+    """平均分配商品庫存到各分片；指定 shard_count 可開啟、調整或關閉（0）分片模式"""
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(id=product_id)
+        shards = list(StockShard.objects.select_for_update().filter(product=product).order_by('index'))
+        total = sum(shard.quantity for shard in shards) if product.shard_count else product.stock_quantity
+        if shard_count is None:
+            shard_count = product.shard_count
+
+        StockShard.objects.filter(product=product).delete()
+        if shard_count:
+            StockShard.objects.bulk_create([
+                StockShard(product=product, index=i, quantity=quantity)
+                for i, quantity in enumerate(_distribute(total, shard_count))
+            ])
+
+        product.shard_count = shard_count
+        product.stock_quantity = total
+        product.save(update_fields=['shard_count', 'stock_quantity', 'updated_at'])
+        _invalidate_stock_cache(product.id)
+    return product
+
+
+def set_stock(product: Product, quantity: int):
+    """直接設定分片商品的總庫存（例如後台更新），重新平均分配到各分片"""
+    with transaction.atomic():
+        Product.objects.filter(id=product.id).update(stock_quantity=quantity, updated_at=timezone.now())
+        previous = StockShard.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+        StockShard.objects.filter(product=product).delete()
+        StockShard.objects.bulk_create([
+            StockShard(product=product, index=i, quantity=q)
+            for i, q in enumerate(_distribute(quantity, product.shard_count))
+        ])
+        _invalidate_stock_cache(product.id)
+        events.record_stock_level(product.id, quantity)
+        category_stats.record_stock_deltas({product.id: quantity - previous})
+        bump_catalog_version()
+    product.stock_quantity = quantity
+
+
+def reserve_items(reference: str, items: Dict[int, int]) -> List[StockReservation]:
+    """在單一交易中為多個商品扣庫存並建立預留紀錄
+
+    同一 reference 重複呼叫會直接回傳既有預留，方便呼叫端安全重試。
+    商品依 ID 排序後逐一更新，讓並行交易以相同順序取得列鎖，避免死結。
+    """
+    existing = list(StockReservation.objects.filter(reference=reference))
+    if existing:
+        if any(r.status == 'released' for r in existing):
+            raise ReservationReleased(f"預留 {reference} 已釋放")
+        return existing
+
+    try:
+        with transaction.atomic():
+            for product_id in sorted(items):
+                quantity = items[product_id]
+                if not _decrement(product_id, quantity):
+                    # 只有失敗時才多查一次，區分商品不存在與庫存不足
+                    if not Product.objects.filter(id=product_id, is_active=True).exists():
+                        raise ProductUnavailable(f"商品 ID {product_id} 不存在", product_id)
+                    raise InsufficientStock(f"商品 ID {product_id} 庫存不足", product_id)
+
+            reservations = StockReservation.objects.bulk_create([
+                StockReservation(reference=reference, product_id=product_id, quantity=quantity)
+                for product_id, quantity in sorted(items.items())
+            ])
+            deltas = {product_id: -quantity for product_id, quantity in items.items()}
+            events.record_stock_deltas(deltas)
+            category_stats.record_stock_deltas(deltas)
+            # 庫存變動會反映在商品列表與詳情中
+            bump_catalog_version()
+            return reservations
+    except IntegrityError:
+        # 並行的相同 reference 已先完成預留，本交易的扣庫存已整筆回滾
+        return list(StockReservation.objects.filter(reference=reference))
+
+
+def commit_reservation(reference: str) -> int:
+    """確認預留，回傳確認的筆數"""
+    return StockReservation.objects.filter(reference=reference, status='reserved').update(
+        status='committed', updated_at=timezone.now()
+    )
+
+
+def release_reservation(reference: str) -> int:
+    """釋放預留並歸還庫存，回傳釋放的筆數
+
+    每筆預留先以條件式 UPDATE 將狀態改為 released，成功的那一方才歸還庫存，
+    因此重複或並行的釋放不會多加庫存。
+    """
+    released = {}
+    with transaction.atomic():
+        for reservation in StockReservation.objects.filter(
+            reference=reference, status__in=['reserved', 'committed']
+        ).order_by('product_id'):
+            if StockReservation.objects.filter(
+                id=reservation.id, status__in=['reserved', 'committed']
+            ).update(status='released', updated_at=timezone.now()):
+                _increment(reservation.product_id, reservation.quantity)
+                released[reservation.product_id] = reservation.quantity
+        if released:
+            events.record_stock_deltas(released)
+            category_stats.record_stock_deltas(released)
+            bump_catalog_version()
+    return len(released)
@@ -0,0 +1,29 @@
+from shared_models.query_plans import BaseQueryPlanCommand
+
+from products.filters import apply_product_filters
+from products.models import Category, Product, StockReservation, StockShard
+from products.views import CategoryListView, ProductDetailView, ProductListView
+
+
+class Command(BaseQueryPlanCommand):
+
+    def get_querysets(self):
+        product_id = Product.objects.values_list('id', flat=True).first() or 1
+        name = Product.objects.values_list('name', flat=True).first() or ''
+        return [
+            ('商品列表', ProductListView.queryset.order_by('-created_at', '-id')[:21]),
+            ('商品詳情', ProductDetailView.queryset.filter(pk=product_id)),
+            ('庫存查詢', Product.objects.filter(id=product_id, is_active=True)),
+            ('批次庫存查詢', Product.objects.filter(id__in=[product_id, product_id + 1], is_active=True)),
+            ('商品依類別篩選', apply_product_filters(ProductListView.queryset, {'category': [1]})
+                .order_by('-created_at', '-id')[:21]),
+            ('商品依價格排序', ProductListView.queryset.order_by('price', 'id')[:21]),
+            # PostgreSQL 上應為 product_name_trgm_idx 與 product_description_trgm_idx 的 Bitmap Index Scan
+            ('商品搜尋', apply_product_filters(ProductListView.queryset, {'search': name[:10] or '商品'})
+                .order_by('-created_at', '-id')[:21]),
+            ('商品名稱重複檢查', Product.objects.filter(name=name, is_active=True)[:1]),
+            ('分片庫存加總', StockShard.objects.filter(product_id=product_id)),
+            ('庫存預留查詢', StockReservation.objects.filter(reference='ORD-00000000')),
+            ('類別列表', CategoryListView.queryset.order_by('-created_at', '-id')[:21]),
+            ('類別檢查', Category.objects.filter(id=1)),
+        ]
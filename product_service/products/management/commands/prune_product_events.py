@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.models import ProductEvent
+
+
+class Command(BaseCommand):
+    help = "刪除超過保留天數的商品事件"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.PRODUCT_EVENT_RETENTION_DAYS,
+                            help='保留天數（預設 PRODUCT_EVENT_RETENTION_DAYS）')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = ProductEvent.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'已刪除 {deleted} 筆 {options["days"]} 天前的商品事件'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products import inventory
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "平均分配分片庫存；可用 --shards 為商品開啟、調整或關閉（0）分片模式"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', dest='product_ids',
+                            help='商品ID，可重複指定；未指定時處理所有分片商品')
+        parser.add_argument('--shards', type=int, help='分片數量，0 表示關閉分片模式')
+
+    def handle(self, *args, **options):
+        shards = options['shards']
+        if shards is not None and shards < 0:
+            raise CommandError('--shards 不能為負數')
+
+        product_ids = options['product_ids']
+        if not product_ids:
+            if shards is not None:
+                raise CommandError('指定 --shards 時必須同時指定 --product')
+            product_ids = list(Product.objects.filter(shard_count__gt=0).values_list('id', flat=True))
+
+        for product_id in product_ids:
+            try:
+                product = inventory.rebalance(product_id, shards)
+            except Product.DoesNotExist:
+                raise CommandError(f'商品 ID {product_id} 不存在')
+            self.stdout.write(
+                f'商品 {product.id}: {product.shard_count} 個分片，總庫存 {product.stock_quantity}'
+            )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products import category_stats
+from products.caching import bump_catalog_version
+
+
+class Command(BaseCommand):
+    help = "以商品表重新計算類別統計（商品數、價格區間、庫存總量），修正增量更新累積的誤差"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', type=int, action='append', dest='category_ids',
+                            help='類別ID，可重複指定；未指定時重建所有類別')
+
+    def handle(self, *args, **options):
+        count = category_stats.rebuild(options['category_ids'])
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'已重建 {count} 個類別的統計'))
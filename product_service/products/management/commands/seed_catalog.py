@@ -0,0 +1,58 @@
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products import category_stats
+from products.caching import bump_catalog_version
+from products.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = "以 bulk_create 快速建立大量類別與商品（壓測用）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=20, help='類別數')
+        parser.add_argument('--products', type=int, default=10000, help='商品數')
+        parser.add_argument('--stock', type=int, default=100000, help='每個商品的庫存')
+        parser.add_argument('--batch-size', type=int, default=2000, help='每次 INSERT 的筆數')
+        parser.add_argument('--prefix', default='bench', help='名稱前綴，同一前綴不可重複建立')
+        parser.add_argument('--seed', type=int, default=42, help='亂數種子，固定後每次產生相同資料')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if Category.objects.filter(name__startswith=f'{prefix}-').exists():
+            raise CommandError(f'前綴 {prefix} 的資料已存在，請改用其他 --prefix')
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        # bulk_create 不會觸發 post_save，類別統計與目錄版本在最後一次處理
+        with transaction.atomic():
+            categories = Category.objects.bulk_create([
+                Category(name=f'{prefix}-category-{i}', description=f'{prefix} 類別 {i}')
+                for i in range(options['categories'])
+            ], batch_size=batch_size)
+            category_ids = [category.id for category in categories]
+
+            created = 0
+            while created < options['products']:
+                size = min(batch_size, options['products'] - created)
+                Product.objects.bulk_create([
+                    Product(
+                        name=f'{prefix}-product-{created + i}',
+                        description=f'{prefix} 測試商品 {created + i}',
+                        price=Decimal(rng.randint(100, 100000)) / 100,
+                        stock_quantity=options['stock'],
+                        category_id=rng.choice(category_ids) if category_ids else None,
+                    )
+                    for i in range(size)
+                ])
+                created += size
+                self.stdout.write(f'已建立 {created}/{options["products"]} 個商品')
+            category_stats.rebuild(category_ids)
+            bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'完成：{len(category_ids)} 個類別、{created} 個商品（未寫入商品事件，訂單服務會在查詢時向商品服務取得）'
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('reference', models.CharField(max_length=64)),
+                ('quantity', models.IntegerField()),
+                ('status', models.CharField(choices=[('reserved', '已預留'), ('committed', '已確認'), ('released', '已釋放')], default='reserved', max_length=20)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='products.product')),
+            ],
+            options={
+                'unique_together': {('reference', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:23
+
+from django.db import migrations, models
+
+# 商品搜尋以 icontains 查詢，PostgreSQL 產生的條件為 UPPER(欄位::text) LIKE UPPER('%關鍵字%')，
+# 以相同運算式建立 pg_trgm GIN 索引才能避免全表掃描。其他資料庫（測試用的 SQLite）不建立。
+TRIGRAM_INDEXES = (
+    ('product_name_trgm_idx', 'UPPER(name::text)'),
+    ('product_description_trgm_idx', 'UPPER(description)'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # 需要有建立擴充套件的權限（docker-compose 的 postgres 使用者為超級使用者）
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, expression in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON products_product '
+            f'USING gin ({expression} gin_trgm_ops) WHERE is_active'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_events'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-created_at', '-id'], name='product_active_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['price', 'id'], name='product_active_price_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+
+def build_category_stats(apps, schema_editor):
+    """為既有類別計算初始統計，與 rebuild_category_stats 相同"""
+    Category = apps.get_model('products', 'Category')
+    CategoryStats = apps.get_model('products', 'CategoryStats')
+    Product = apps.get_model('products', 'Product')
+    StockShard = apps.get_model('products', 'StockShard')
+
+    totals = {
+        row['category_id']: row for row in Product.objects.filter(is_active=True, category__isnull=False)
+        .values('category_id').annotate(
+            count=Count('id'), price_sum=Sum('price'), low=Min('price'), high=Max('price'),
+            stock=Sum('stock_quantity', filter=Q(shard_count=0)),
+        )
+    }
+    shard_totals = dict(
+        StockShard.objects.filter(product__is_active=True, product__shard_count__gt=0)
+        .values('product__category_id').annotate(total=Sum('quantity')).values_list('product__category_id', 'total')
+    )
+    now = timezone.now()
+    CategoryStats.objects.bulk_create([
+        CategoryStats(
+            category_id=category_id,
+            product_count=totals.get(category_id, {}).get('count', 0),
+            price_sum=totals.get(category_id, {}).get('price_sum') or 0,
+            min_price=totals.get(category_id, {}).get('low'),
+            max_price=totals.get(category_id, {}).get('high'),
+            stock_total=(totals.get(category_id, {}).get('stock') or 0) + (shard_totals.get(category_id) or 0),
+            updated_at=now,
+        )
+        for category_id in Category.objects.values_list('id', flat=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='products.category')),
+                ('product_count', models.IntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('stock_total', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_category_stats, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 from shared_models.models import BaseModel
 
@@ -6,6 +6,12 @@ class Category(BaseModel):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            # 類別列表的 keyset 分頁排序
+            models.Index(fields=['-created_at', '-id'], name='category_created_idx'),
+        ]
+    
     def __str__(self):
         return self.name
 
@@ -13,9 +19,103 @@ class Product(BaseModel):
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # 分片模式下此欄位只是快取的總量，實際庫存以 StockShard 加總為準
     stock_quantity = models.IntegerField(default=0)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     is_active = models.BooleanField(default=True)
+    # 0 表示不分片；大於 0 時庫存拆成多筆 StockShard 以分散熱門商品的寫入競爭
+    shard_count = models.PositiveSmallIntegerField(default=0)
+    
+    class Meta:
+        indexes = [
+            # 商品列表只查詢上架商品，並依 (created_at, id) 分頁
+            models.Index(
+                fields=['-created_at', '-id'], name='product_active_created_idx',
+                condition=models.Q(is_active=True)
+            ),
+            # ProductCreateSerializer.validate_name 的重複名稱檢查，也用於依名稱排序
+            models.Index(fields=['name'], name='product_active_name_idx', condition=models.Q(is_active=True)),
+            # 商品列表依類別篩選，以及依價格排序的 keyset 分頁
+            models.Index(
+                fields=['category', '-created_at', '-id'], name='product_active_category_idx',
+                condition=models.Q(is_active=True)
+            ),
+            models.Index(fields=['price', 'id'], name='product_active_price_idx', condition=models.Q(is_active=True)),
+            # 文字搜尋的 pg_trgm GIN 索引只在 PostgreSQL 建立，見遷移 0006_product_search_indexes
+        ]
+    
+    def __str__(self):
+        return self.name
+    
+    # 商品事件由 post_save / post_delete 訊號寫入，包在同一個交易中確保資料與事件一起提交
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+class CategoryStats(models.Model):
+    """類別統計 - 上架商品數、價格區間與庫存總量，隨商品變更增量更新，避免每次 GROUP BY 商品表"""
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    product_count = models.IntegerField(default=0)
+    # 平均價格由 price_sum / product_count 計算，增量更新時不需重新讀取所有價格
+    price_sum = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    stock_total = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.category_id}: {self.product_count} 個商品"
+
+class StockShard(models.Model):
+    """分片庫存計數 - 熱門商品的庫存分散在多筆計數列"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_shards')
+    index = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = [('product', 'index')]
+    
+    def __str__(self):
+        return f"{self.product_id}#{self.index}: {self.quantity}"
+
+class StockReservation(BaseModel):
+    """庫存預留 - 以 reference（例如訂單編號）分組，一個商品一筆"""
+    STATUS_CHOICES = [
+        ('reserved', '已預留'),
+        ('committed', '已確認'),
+        ('released', '已釋放'),
+    ]
+    
+    reference = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='reserved')
+    
+    class Meta:
+        unique_together = [('reference', 'product')]
+    
+    def __str__(self):
+        return f"{self.reference} - {self.product_id} x {self.quantity}"
+
+
+class ProductEvent(models.Model):
+    """商品事件外寄匣 - 與商品或庫存變更在同一個交易中寫入，id 即事件串流的 offset"""
+    EVENT_TYPES = [
+        ('ProductChanged', '商品變更'),
+        ('ProductDeleted', '商品刪除'),
+        ('StockChanged', '庫存變更'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPES)
+    # 不使用外鍵：商品刪除後事件仍需保留
+    product_id = models.IntegerField()
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f"{self.event_type}#{self.id} (商品 {self.product_id})"
@@ -1,11 +1,37 @@
+from decimal import Decimal
+
+from django.db import models
 from rest_framework import serializers
-from .models import Product, Category
+from . import inventory
+from .models import Product, Category, CategoryStats, StockReservation
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
+class CategorySummarySerializer(serializers.ModelSerializer):
+    """類別摘要 - 由 CategoryStats 提供，不需查詢商品表"""
+    id = serializers.IntegerField(source='category_id')
+    name = serializers.CharField(source='category.name')
+    avg_price = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = CategoryStats
+        fields = ['id', 'name', 'product_count', 'min_price', 'max_price', 'avg_price', 'stock_total', 'updated_at']
+    
+    def get_avg_price(self, obj):
+        if not obj.product_count:
+            return None
+        return str((obj.price_sum / obj.product_count).quantize(Decimal('0.01')))
+
+class ProductListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # 一次取得整頁的庫存（分片商品只需一次加總查詢）
+        products = list(data.all() if isinstance(data, models.Manager) else data)
+        self._context['stock_levels'] = inventory.get_stock_levels(products)
+        return super().to_representation(products)
+
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     
@@ -13,7 +39,29 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = ['id', 'name', 'description', 'price', 'stock_quantity', 
                  'category', 'category_name', 'is_active', 'created_at', 'updated_at']
+        list_serializer_class = ProductListSerializer
     # 包含顯示時需要的所有欄位（包含唯讀欄位）
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.shard_count:
+            stock_levels = self.context.get('stock_levels') or {}
+            if instance.id in stock_levels:
+                data['stock_quantity'] = stock_levels[instance.id]
+            else:
+                data['stock_quantity'] = inventory.get_stock_level(instance)
+        return data
+    
+    def update(self, instance, validated_data):
+        # 分片商品的庫存寫入各分片，而不是商品列
+        if instance.shard_count and 'stock_quantity' in validated_data:
+            inventory.set_stock(instance, validated_data.pop('stock_quantity'))
+        
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # 只寫入請求中的欄位，避免以讀取時的 stock_quantity 覆蓋並行預留的扣減
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
         
 class ProductCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -103,4 +151,30 @@ class ProductCreateSerializer(serializers.ModelSerializer):
         # - 記錄操作日誌
         # - 更新相關統計資料
         
-        return product
\ No newline at end of file
+        return product
+
+class ReservationItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1, error_messages={'required': '商品ID為必填欄位'})
+    quantity = serializers.IntegerField(min_value=1, error_messages={
+        'required': '數量為必填欄位',
+        'min_value': '數量必須大於 0'
+    })
+
+class StockReservationCreateSerializer(serializers.Serializer):
+    reference = serializers.CharField(max_length=64, error_messages={'required': '預留編號為必填欄位'})
+    items = ReservationItemSerializer(many=True, allow_empty=False)
+    
+    def validate_items(self, value):
+        """合併相同商品的數量，回傳 {商品ID: 數量}"""
+        items = {}
+        for item in value:
+            items[item['product_id']] = items.get(item['product_id'], 0) + item['quantity']
+        return items
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='product.name', read_only=True)
+    price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only=True)
+    
+    class Meta:
+        model = StockReservation
+        fields = ['product_id', 'name', 'price', 'quantity', 'status']
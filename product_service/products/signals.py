@@ -0,0 +1,66 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import category_stats, events
+from .caching import bump_catalog_version
+from .models import Category, CategoryStats, Product
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """商品或類別變更時遞增目錄版本，讓快取的回應失效"""
+    bump_catalog_version()
+
+
+def _stock_written(created, update_fields):
+    return created or update_fields is None or 'stock_quantity' in update_fields
+
+
+@receiver(pre_save, sender=Product)
+def capture_category_stats_state(sender, instance, raw=False, **kwargs):
+    """記錄寫入前的商品狀態，post_save 時以差異更新類別統計"""
+    if raw:
+        return
+    instance._category_stats_previous = (
+        None if instance._state.adding or instance.pk is None else category_stats.load_state(instance.pk)
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_category_stats(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance.__dict__.pop('_category_stats_previous', None)
+    category_stats.apply_product_saved(instance, previous, _stock_written(created, update_fields))
+
+
+@receiver(pre_delete, sender=Product)
+def capture_category_stats_deleted(sender, instance, **kwargs):
+    instance._category_stats_previous = category_stats.deleted_contribution(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_category_stats(sender, instance, **kwargs):
+    category_stats.apply_change(instance.__dict__.pop('_category_stats_previous', None), None)
+
+
+@receiver(post_save, sender=Category)
+def create_category_stats(sender, instance, created, raw=False, **kwargs):
+    """新類別建立空的統計列"""
+    if created and not raw:
+        CategoryStats.objects.get_or_create(category=instance)
+
+
+@receiver(post_save, sender=Product)
+def record_product_changed(sender, instance, created, update_fields=None, **kwargs):
+    """寫入商品事件；Product.save() 以交易包住，事件與商品變更一起提交
+
+    事件在交易的最後寫入可縮短事件串流讀取端的等待（見 events.committed_events），因此註冊在其他 post_save 接收者之後。
+    """
+    events.record_product_changed(instance, stock_written=_stock_written(created, update_fields))
+
+
+@receiver(post_delete, sender=Product)
+def record_product_deleted(sender, instance, **kwargs):
+    events.record_product_deleted(instance.id)
@@ -1,3 +1,724 @@
-from django.test import TestCase
+import base64
+import glob
+import importlib.util
+import io
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from shared_models import metrics, renderers, tracing
+from shared_models.renderers import ORJSONRenderer
+from shared_models.testing import QueryCountAssertionsMixin
+
+from . import caching, category_stats, events, inventory
+from .models import Category, CategoryStats, Product, ProductEvent, StockReservation, StockShard
+from .serializers import ProductSerializer
+
+
+# 停用回應快取，量測的是實際產生回應所需的查詢
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class ListQueryCountTests(QueryCountAssertionsMixin, TestCase):
+    """列表端點的查詢數不應隨筆數成長"""
+
+    def create_products(self, total, shard_count=0):
+        for i in range(Product.objects.count(), total):
+            category = Category.objects.create(name=f'類別 {i}')
+            product = Product.objects.create(
+                name=f'商品 {i}', description='測試商品', price=100, stock_quantity=10, category=category
+            )
+            if shard_count:
+                inventory.rebalance(product.id, shard_count)
+
+    def test_product_list(self):
+        self.assertQueriesDoNotScale(self.create_products, lambda: self.client.get('/api/products/'))
+
+    def test_product_list_with_sharded_stock(self):
+        self.assertQueriesDoNotScale(
+            lambda total: self.create_products(total, shard_count=4),
+            lambda: self.client.get('/api/products/')
+        )
+
+    def test_category_list(self):
+        self.assertQueriesDoNotScale(self.create_products, lambda: self.client.get('/api/categories/'))
+
+    def test_stock_batch(self):
+        def request():
+            ids = ','.join(str(pk) for pk in Product.objects.values_list('id', flat=True))
+            return self.client.get(f'/api/products/stock/?ids={ids}')
+        self.assertQueriesDoNotScale(lambda total: self.create_products(total, shard_count=2), request)
+
+
+class StockBatchTests(TestCase):
+    """批次庫存查詢：單一查詢回傳所有商品，不存在或未上架的商品列在 missing"""
+
+    def setUp(self):
+        self.products = [
+            Product.objects.create(name=f'商品 {i}', description='測試商品', price=100, stock_quantity=i)
+            for i in range(3)
+        ]
+        Product.objects.filter(id=self.products[2].id).update(is_active=False)
+
+    def test_batch_lookup(self):
+        ids = [product.id for product in self.products] + [self.products[-1].id + 100]
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/products/stock/?ids={",".join(map(str, ids))}')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(sorted((item['id'], item['stock_quantity'], item['available']) for item in data['products']),
+                         [(self.products[0].id, 0, False), (self.products[1].id, 1, True)])
+        self.assertEqual(data['missing'], sorted(ids[2:]))
+
+    def test_invalid_ids(self):
+        for query, error_code in (('', 'INVALID_IDS'), ('ids=1,a', 'INVALID_IDS'),
+                                  (f'ids={",".join(map(str, range(1, 102)))}', 'BATCH_TOO_LARGE')):
+            response = self.client.get(f'/api/products/stock/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertEqual(response.json()['errorCode'], error_code)
+        # 上限以不重複的 ID 計算
+        ids = ','.join(map(str, list(range(1, 101)) * 2))
+        self.assertEqual(self.client.get(f'/api/products/stock/?ids={ids}').status_code, 200)
+
+
+class ProductEventTests(TestCase):
+    """商品與庫存變更會寫入事件，事件串流依 id 遞增回傳"""
+
+    def test_changes_are_recorded_in_order(self):
+        product = Product.objects.create(name='商品', description='測試商品', price=100, stock_quantity=10)
+        product_id = product.id
+        inventory.reserve_items('ORD-1', {product_id: 3})
+        inventory.release_reservation('ORD-1')
+        product.delete()
+
+        data = self.client.get('/api/products/events/?after=0').json()['data']
+        self.assertEqual(
+            [(event['type'], event['payload']) for event in data['events']],
+            [
+                ('ProductChanged', {'id': product_id, 'name': '商品', 'price': '100.00', 'category_id': None,
+                                    'is_active': True}),
+                ('StockChanged', {'product_id': product_id, 'stock_quantity': 10}),
+                ('StockChanged', {'product_id': product_id, 'delta': -3}),
+                ('StockChanged', {'product_id': product_id, 'delta': 3}),
+                ('ProductDeleted', {'id': product_id}),
+            ]
+        )
+        self.assertEqual(data['next_after'], ProductEvent.objects.latest('id').id)
+        self.assertFalse(data['has_more'])
+
+    def test_rolled_back_ids_do_not_stall_the_feed(self):
+        product = Product.objects.create(name='商品', description='測試商品', price=100, stock_quantity=10)
+        events.record_stock_level(product.id, 5)
+        events.record_stock_level(product.id, 6)
+        # 回滾的交易留下永久的空號
+        ProductEvent.objects.filter(payload__stock_quantity=5).delete()
+
+        data = self.client.get('/api/products/events/?after=0').json()['data']
+        self.assertEqual([(event['type'], event['payload'].get('stock_quantity')) for event in data['events']],
+                         [('ProductChanged', None), ('StockChanged', 10), ('StockChanged', 6)])
+
+
+class ProductEventOrderingTests(TransactionTestCase):
+    """先寫入事件的交易較晚提交時，消費端仍會讀到它"""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('記憶體 SQLite 的並行寫入會直接失敗，需以檔案或 PostgreSQL 執行')
+
+    def poll(self, after):
+        data = self.client.get(f'/api/products/events/?after={after}').json()['data']
+        return [event['id'] for event in data['events']], data['next_after']
+
+    def test_interleaved_transactions(self):
+        product = Product.objects.create(name='商品', description='測試商品', price=100, stock_quantity=10)
+        delivered, after = self.poll(0)
+        first_written = threading.Event()
+        finish_first = threading.Event()
+
+        def writer(quantity, wait_for=None):
+            try:
+                with transaction.atomic():
+                    events.record_stock_level(product.id, quantity)
+                    if wait_for is not None:
+                        first_written.set()
+                        wait_for.wait(10)
+            finally:
+                connection.close()
+
+        # 第一個交易寫入事件後暫停；第二個交易在它之後開始，若不等待就會先提交
+        first = threading.Thread(target=writer, args=(1, finish_first))
+        first.start()
+        self.assertTrue(first_written.wait(10))
+        second = threading.Thread(target=writer, args=(2,))
+        second.start()
+        second.join(0.5)
+        if connection.vendor == 'postgresql':
+            # 寫入事件不加鎖，第二個交易不需等待第一個交易提交
+            self.assertFalse(second.is_alive())
+
+        ids, after = self.poll(after)
+        delivered += ids
+        finish_first.set()
+        first.join(10)
+        second.join(10)
+        ids, after = self.poll(after)
+        delivered += ids
+
+        self.assertEqual(delivered, list(ProductEvent.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(
+            [event.payload['stock_quantity'] for event in ProductEvent.objects.filter(
+                event_type='StockChanged').order_by('id')][-2:],
+            [1, 2]
+        )
+
+
+class InventoryTests(TestCase):
+    """預留以條件式 UPDATE 扣庫存，任一商品失敗時整筆回滾；釋放可重複呼叫"""
+
+    def create_product(self, stock, **fields):
+        return Product.objects.create(name='商品', description='測試商品', price=100, stock_quantity=stock, **fields)
+
+    def stock(self, *products):
+        return [Product.objects.get(id=product.id).stock_quantity for product in products]
+
+    def test_reserve_decrements_stock(self):
+        first, second = self.create_product(10), self.create_product(5)
+        reservations = inventory.reserve_items('ORD-1', {first.id: 3, second.id: 5})
+        self.assertEqual([(r.product_id, r.quantity, r.status) for r in reservations],
+                         [(first.id, 3, 'reserved'), (second.id, 5, 'reserved')])
+        self.assertEqual(self.stock(first, second), [7, 0])
+
+        # 相同 reference 重送回傳既有預留，不會再扣一次
+        again = inventory.reserve_items('ORD-1', {first.id: 3, second.id: 5})
+        self.assertEqual(sorted(r.id for r in again), sorted(r.id for r in reservations))
+        self.assertEqual(self.stock(first, second), [7, 0])
+
+    def test_failure_rolls_back_every_item(self):
+        first, second = self.create_product(10), self.create_product(1)
+        inactive = self.create_product(10, is_active=False)
+
+        with self.assertRaises(inventory.InsufficientStock) as raised:
+            inventory.reserve_items('ORD-2', {first.id: 3, second.id: 2})
+        self.assertEqual(raised.exception.product_id, second.id)
+        # 第一個商品已扣除的庫存隨交易回滾
+        self.assertEqual(self.stock(first, second), [10, 1])
+        self.assertFalse(StockReservation.objects.filter(reference='ORD-2').exists())
+
+        for product_id in (inactive.id, inactive.id + 1000):
+            with self.assertRaises(inventory.ProductUnavailable):
+                inventory.reserve_items('ORD-3', {first.id: 1, product_id: 1})
+        self.assertEqual(self.stock(first, inactive), [10, 10])
+
+    def test_release_is_idempotent(self):
+        product = self.create_product(10)
+        inventory.reserve_items('ORD-4', {product.id: 4})
+        inventory.reserve_items('ORD-5', {product.id: 2})
+        self.assertEqual(inventory.commit_reservation('ORD-5'), 1)
+        self.assertEqual(self.stock(product), [4])
+
+        self.assertEqual(inventory.release_reservation('ORD-4'), 1)
+        self.assertEqual(inventory.release_reservation('ORD-4'), 0)
+        # 已確認的預留也可以釋放（訂單確認後取消）
+        self.assertEqual(inventory.release_reservation('ORD-5'), 1)
+        self.assertEqual(self.stock(product), [10])
+        self.assertEqual(inventory.commit_reservation('ORD-4'), 0)
+
+        # 已釋放的 reference 不可重新預留，避免重送的建立請求在取消後又扣庫存
+        with self.assertRaises(inventory.ReservationReleased):
+            inventory.reserve_items('ORD-4', {product.id: 4})
+        self.assertEqual(self.stock(product), [10])
+
+    def test_reservation_endpoints(self):
+        product = self.create_product(2)
+        response = self.client.post('/api/products/stock/reservations/', {
+            'reference': 'ORD-6', 'items': [{'product_id': product.id, 'quantity': 3}]
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['errorCode'], 'INSUFFICIENT_STOCK')
+
+        response = self.client.post('/api/products/stock/reservations/', {
+            'reference': 'ORD-6', 'items': [{'product_id': product.id, 'quantity': 2}]
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        for _ in range(2):
+            response = self.client.post('/api/products/stock/reservations/ORD-6/release/')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(product), [2])
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    """並行預留同一商品時，成功的預留總量不會超過庫存"""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('記憶體 SQLite 的並行寫入會直接失敗，需以檔案或 PostgreSQL 執行')
+
+    def test_concurrent_reserve(self):
+        product = Product.objects.create(name='商品', description='測試商品', price=100, stock_quantity=5)
+        start = threading.Barrier(8)
+        results = []
+
+        def reserve(index):
+            try:
+                start.wait(10)
+                inventory.reserve_items(f'ORD-{index}', {product.id: 1})
+                results.append('reserved')
+            except inventory.InsufficientStock:
+                results.append('insufficient')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=reserve, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        self.assertEqual(sorted(results), ['insufficient'] * 3 + ['reserved'] * 5)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 0)
+        self.assertEqual(StockReservation.objects.filter(product=product).count(), 5)
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'catalog-tests'}}
+
+
+class ShardedStockTests(QueryCountAssertionsMixin, TestCase):
+    """分片庫存：從隨機分片扣除，單一分片不足時鎖定所有分片合併扣除，總量與快取保持一致"""
+
+    def setUp(self):
+        # 分片加總只使用各行程共用的快取，以檔案快取代替 Redis；每個測試一個目錄，商品 ID 重複也不會命中
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}))
+        self.product = Product.objects.create(name='商品', description='測試商品', price=100, stock_quantity=10)
+        self.references = itertools.count(1)
+
+    def shards(self):
+        return list(StockShard.objects.filter(product=self.product).order_by('index').values_list(
+            'quantity', flat=True))
+
+    def reserve(self, quantity):
+        reference = f'ORD-{next(self.references)}'
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.reserve_items(reference, {self.product.id: quantity})
+        return reference
+
+    def release(self, reference):
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.release_reservation(reference)
+
+    def stock(self):
+        return self.client.get(f'/api/products/{self.product.id}/stock/').json()['data']['stock_quantity']
+
+    def test_reserve_takes_from_random_shard(self):
+        inventory.rebalance(self.product.id, 4)
+        self.assertEqual(self.shards(), [3, 3, 2, 2])
+        with mock.patch.object(inventory.random, 'randrange', return_value=2):
+            self.reserve(2)
+            self.assertEqual(self.shards(), [3, 3, 0, 2])
+            # 選中的分片不足時改試下一個分片
+            self.reserve(1)
+        self.assertEqual(self.shards(), [3, 3, 0, 1])
+
+    def test_reserve_queries_do_not_scale_with_shard_count(self):
+        def request():
+            return self.client.post('/api/products/stock/reservations/', {
+                'reference': f'ORD-{next(self.references)}', 'items': [{'product_id': self.product.id, 'quantity': 1}]
+            }, content_type='application/json')
+
+        # 固定選中第一個分片，量測的是單一分片足夠時的路徑
+        with mock.patch.object(inventory.random, 'randrange', return_value=0):
+            self.assertQueriesDoNotScale(lambda total: inventory.rebalance(self.product.id, total), request)
+
+    def test_fallback_when_every_shard_is_short(self):
+        inventory.rebalance(self.product.id, 4)
+        context, _ = self.count_queries(lambda: self.reserve(5))
+        shard_queries = [query['sql'] for query in context.captured_queries if 'products_stockshard' in query['sql']]
+        # 每個分片各嘗試一次條件式 UPDATE，失敗後才讀取所有分片並依序扣除
+        self.assertEqual([sql.split()[0] for sql in shard_queries], ['UPDATE'] * 4 + ['SELECT'] + ['UPDATE'] * 2)
+        self.assertEqual(self.shards(), [0, 1, 2, 2])
+
+        with self.assertRaises(inventory.InsufficientStock):
+            self.reserve(6)
+        self.assertEqual(self.shards(), [0, 1, 2, 2])
+
+    def test_total_consistent_after_partial_updates(self):
+        self.product = inventory.rebalance(self.product.id, 3)
+        self.assertEqual(self.stock(), 10)
+        # 快取命中時只查詢商品列
+        context, _ = self.count_queries(self.stock)
+        self.assertEqual(len(context), 1)
+
+        first = self.reserve(4)
+        self.assertEqual((self.stock(), sum(self.shards())), (6, 6))
+        second = self.reserve(3)
+        self.release(first)
+        self.assertEqual((self.stock(), sum(self.shards())), (7, 7))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.set_stock(self.product, 8)
+        self.assertEqual(self.shards(), [3, 3, 2])
+        self.reserve(7)
+        self.release(second)
+        self.assertEqual((self.stock(), sum(self.shards())), (4, 4))
+        self.assertEqual(inventory.rebalance(self.product.id, 0).stock_quantity, 4)
+        self.assertEqual(self.stock(), 4)
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_process_local_cache_not_used(self):
+        self.product = inventory.rebalance(self.product.id, 2)
+        self.assertEqual(self.stock(), 10)
+        # 其他 worker 的寫入無法讓這個行程的 locmem 失效，因此每次都加總分片
+        StockShard.objects.filter(product=self.product, index=0).update(quantity=0)
+        context, stock = self.count_queries(self.stock)
+        self.assertEqual((stock, len(context)), (5, 2))
+        self.assertIsNone(cache.get(inventory._stock_cache_key(self.product.id)))
+
+
+@override_settings(CATALOG_CACHE_ENABLED=True, CACHES=LOCMEM_CACHE)
+class CatalogCacheTests(TestCase):
+    """目錄快取以 ETag 回傳 304，商品變更提交後版本遞增"""
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.product = Product.objects.create(name='商品', description='測試商品', price=100, stock_quantity=10)
+
+    def test_not_modified_until_product_changes(self):
+        etag = self.client.get('/api/products/')['ETag']
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 120
+            self.product.save()
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['data']['results'][0]['price'], '120.00')
+
+    @override_settings(CATALOG_CACHE_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_requires_shared_cache(self):
+        # 行程內快取無法讓其他 worker 看到版本遞增
+        with self.assertRaises(ImproperlyConfigured):
+            caching.check_catalog_cache()
+        with override_settings(CATALOG_CACHE_ENABLED=False):
+            caching.check_catalog_cache()
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                                   'LOCATION': 'redis://localhost:6379'}}):
+            caching.check_catalog_cache()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class PerformanceMetricsTests(TestCase):
+    """取樣請求附上 Server-Timing，耗時彙整在 /metrics"""
+
+    def setUp(self):
+        metrics.reset()
+        Product.objects.create(name='商品', description='測試商品', price=100, stock_quantity=10,
+                               category=Category.objects.create(name='類別'))
+
+    def test_sampled_request(self):
+        response = self.client.get('/api/products/')
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+".*total;dur=')
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_requests_total{view="api/products/",method="GET",status="200"} 1', body)
+        self.assertIn('http_request_db_queries_count{view="api/products/"} 1', body)
+
+    @override_settings(PERF_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        response = self.client.get('/api/products/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_requests_total{view="api/products/",method="GET",status="200"} 1', body)
+        self.assertNotIn('http_request_duration_seconds_count{view="api/products/"', body)
+
+    def test_multiprocess_totals(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(PERF_METRICS_MULTIPROC_DIR=directory):
+            self.client.get('/api/products/')
+            metrics.flush(force=True)
+            # 另一個 worker 寫入的累計值（同樣的請求數與直方圖）
+            [path] = glob.glob(os.path.join(directory, '*.json'))
+            shutil.copy(path, os.path.join(directory, 'other-worker.json'))
+
+            body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_requests_total{view="api/products/",method="GET",status="200"} 2', body)
+        self.assertIn('http_request_db_queries_count{view="api/products/"} 2', body)
+        self.assertIn('http_request_db_queries_bucket{view="api/products/",le="+Inf"} 2', body)
+
+
+@override_settings(TRACING_ENABLED=True, CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class TracingTests(TestCase):
+    """沿用上游的 traceparent，view 與查詢的 span 屬於同一個 trace"""
+
+    def setUp(self):
+        self.exporter = tracing.MemoryExporter()
+        self.addCleanup(tracing.set_exporter, tracing.set_exporter(self.exporter))
+
+    def test_continues_upstream_trace(self):
+        traceparent = '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'
+        response = self.client.get('/api/products/', HTTP_TRACEPARENT=traceparent)
+        self.assertEqual(response['X-Trace-Id'], '4bf92f3577b34da6a3ce929d0e0e4736')
+
+        server = next(span for span in self.exporter.spans if span.kind == tracing.KIND_SERVER)
+        self.assertEqual(server.name, 'GET api/products/')
+        self.assertEqual(server.parent_id, '00f067aa0ba902b7')
+        queries = [span for span in self.exporter.spans if span.name == 'db.query']
+        self.assertTrue(queries)
+        self.assertTrue(all(span.parent_id == server.span_id for span in queries))
+
+    def test_unsampled_trace_is_not_exported(self):
+        traceparent = '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00'
+        response = self.client.get('/api/products/', HTTP_TRACEPARENT=traceparent)
+        self.assertEqual(response['X-Trace-Id'], '4bf92f3577b34da6a3ce929d0e0e4736')
+        self.assertEqual(self.exporter.spans, [])
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """ORJSONRenderer 的輸出必須與 JSONRenderer 完全相同"""
+
+    @skipUnless(importlib.util.find_spec('orjson'), '需要安裝 orjson')
+    def test_output_matches_json_renderer(self):
+        data = {
+            'result': True, 'errorCode': '', 'message': '商品列表\u2028查詢成功',
+            'data': {
+                'price': Decimal('19.99'), 'ids': (1, 2), 'stock': {1: 10},
+                'created_at': datetime(2024, 1, 2, 3, 4, 5, 678),
+                'updated_at': datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc),
+                'big': 2 ** 70,
+            },
+        }
+        for media_type in ('application/json', 'application/json; indent=4'):
+            self.assertEqual(ORJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type))
+
+    def test_falls_back_without_orjson(self):
+        data = {'result': True, 'errorCode': '', 'message': '操作成功', 'data': {'price': Decimal('19.99')}}
+        # sys.modules 中的 None 讓 import orjson 拋出 ImportError
+        with mock.patch.dict(sys.modules, {'orjson': None}), mock.patch.object(renderers, '_orjson', None), \
+                self.assertLogs('shared_models.renderers', 'WARNING'):
+            self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class ProductFilterTests(TestCase):
+    """商品列表的篩選、搜尋與排序"""
+
+    def setUp(self):
+        phones = Category.objects.create(name='手機')
+        accessories = Category.objects.create(name='配件')
+        Product.objects.create(name='智慧手機', description='旗艦機', price=999, stock_quantity=5, category=phones)
+        Product.objects.create(name='手機殼', description='適用智慧手機', price=20, stock_quantity=0,
+                               category=accessories)
+        sharded = Product.objects.create(name='充電線', description='USB-C', price=10, stock_quantity=0,
+                                         category=accessories)
+        inventory.set_stock(inventory.rebalance(sharded.id, 2), 3)
+
+    def names(self, query):
+        response = self.client.get(f'/api/products/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.json()['data']['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.names('search=智慧手機&ordering=price'), ['手機殼', '智慧手機'])
+        self.assertEqual(self.names('in_stock=true&ordering=-price'), ['智慧手機', '充電線'])
+        self.assertEqual(self.names('min_price=15&max_price=100'), ['手機殼'])
+
+    def test_ordering_is_kept_across_pages(self):
+        first = self.client.get('/api/products/?ordering=price&page_size=2').json()['data']
+        self.assertEqual([product['name'] for product in first['results']], ['充電線', '手機殼'])
+        second = self.client.get(first['next']).json()['data']
+        self.assertEqual([product['name'] for product in second['results']], ['智慧手機'])
+
+    def test_invalid_parameters(self):
+        for query in ('ordering=stock', 'min_price=abc', 'min_price=10&max_price=5', 'category=a'):
+            response = self.client.get(f'/api/products/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertEqual(response.json()['errorCode'], 'VALIDATION_ERROR')
+
+
+class KeysetPaginationTests(TestCase):
+    """游標往後、往前翻頁都回到相同的資料；無法解析的游標回傳 400"""
+
+    def setUp(self):
+        for i in range(7):
+            # 價格重複時以 id 決定順序
+            Product.objects.create(name=f'商品 {i}', description='測試商品', price=10 * (i % 3), stock_quantity=1)
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        return [product['id'] for product in data['results']], data['next'], data['previous']
+
+    def test_round_trip(self):
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        pages, links = [], []
+        url = '/api/products/?ordering=price&page_size=3'
+        while url:
+            ids, url, previous = self.page(url)
+            pages.append(ids)
+            links.append(previous)
+        self.assertEqual([len(ids) for ids in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), expected)
+        self.assertIsNone(links[0])
+
+        # 從最後一頁往前翻，每一頁與往後翻時相同
+        for index in (2, 1):
+            ids, _, previous = self.page(links[index])
+            self.assertEqual(ids, pages[index - 1])
+        self.assertIsNone(previous)
+
+    def test_invalid_cursor(self):
+        def encode(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        cursors = [
+            'not-a-cursor', encode([1, 2]), encode({'r': 0}), encode({'r': 0, 'v': ['2024-01-01T00:00:00']}),
+            encode({'r': 0, 'v': ['yesterday', 1]}), encode({'r': 0, 'v': [None, 1]}),
+            encode({'r': 0, 'v': ['2024-01-01T00:00:00', 'abc']}),
+            encode({'r': 0, 'v': 'ab'}),
+        ]
+        for cursor in cursors:
+            response = self.client.get(f'/api/products/?cursor={cursor}')
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json(), {
+                'result': False, 'errorCode': 'INVALID_CURSOR', 'message': '無效的分頁游標', 'data': None
+            })
+        self.assertEqual(self.client.get('/api/categories/?cursor=not-a-cursor').status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class CategoryStatsTests(TestCase):
+    """類別統計的增量更新結果應與完整重建相同"""
+
+    def stats(self):
+        return list(CategoryStats.objects.order_by('category_id').values(
+            'category_id', 'product_count', 'price_sum', 'min_price', 'max_price', 'stock_total'
+        ))
+
+    def test_incremental_updates_match_rebuild(self):
+        phones = Category.objects.create(name='手機')
+        accessories = Category.objects.create(name='配件')
+        cheap = Product.objects.create(name='手機殼', description='', price=20, stock_quantity=7, category=phones)
+        Product.objects.create(name='智慧手機', description='', price=999, stock_quantity=5, category=phones)
+        sharded = Product.objects.create(name='充電線', description='', price=10, stock_quantity=6,
+                                         category=accessories)
+        sharded = inventory.rebalance(sharded.id, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.set_stock(sharded, 9)
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.reserve_items('ORD-1', {cheap.id: 2, sharded.id: 4})
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.release_reservation('ORD-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.reserve_items('ORD-2', {sharded.id: 1})
+
+        # 移動類別、調整最低價、下架後刪除
+        cheap.refresh_from_db()
+        cheap.category = accessories
+        cheap.save()
+        sharded.price = 15
+        sharded.save(update_fields=['price', 'updated_at'])
+        sharded.is_active = False
+        sharded.save(update_fields=['is_active', 'updated_at'])
+        sharded.is_active = True
+        sharded.save(update_fields=['is_active', 'updated_at'])
+        Product.objects.get(name='智慧手機').delete()
+
+        incremental = self.stats()
+        category_stats.rebuild()
+        self.assertEqual(incremental, self.stats())
+        self.assertEqual(incremental[1], {
+            'category_id': accessories.id, 'product_count': 2, 'price_sum': Decimal('35.00'),
+            'min_price': Decimal('15.00'), 'max_price': Decimal('20.00'), 'stock_total': 15,
+        })
+
+    def test_summary_endpoint(self):
+        phones = Category.objects.create(name='手機')
+        Category.objects.create(name='空類別')
+        Product.objects.create(name='A', description='', price=10, stock_quantity=1, category=phones)
+        Product.objects.create(name='B', description='', price=15, stock_quantity=2, category=phones)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/categories/summary/')
+        data = response.json()['data']
+        self.assertEqual([row['name'] for row in data], ['手機', '空類別'])
+        self.assertEqual(
+            {key: data[0][key] for key in ('product_count', 'min_price', 'max_price', 'avg_price', 'stock_total')},
+            {'product_count': 2, 'min_price': '10.00', 'max_price': '15.00', 'avg_price': '12.50', 'stock_total': 3}
+        )
+        self.assertIsNone(data[1]['avg_price'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class SeedCatalogTests(TestCase):
+    """seed_catalog 以固定的亂數種子建立類別與商品，並重建類別統計"""
+
+    def seed(self, prefix, **options):
+        call_command('seed_catalog', categories=3, products=25, stock=7, batch_size=10, prefix=prefix,
+                     stdout=io.StringIO(), **options)
+        return list(Product.objects.filter(name__startswith=f'{prefix}-').order_by('id').values_list(
+            'price', 'category__name'))
+
+    def test_seed_catalog(self):
+        products = self.seed('first')
+        self.assertEqual(len(products), 25)
+        self.assertEqual(Category.objects.filter(name__startswith='first-').count(), 3)
+        totals = CategoryStats.objects.aggregate(count=Sum('product_count'), stock=Sum('stock_total'))
+        self.assertEqual(totals, {'count': 25, 'stock': 175})
+
+        # 相同種子產生相同的價格與類別分佈
+        again = self.seed('second')
+        self.assertEqual([(price, name.replace('second-', 'first-')) for price, name in again], products)
+        with self.assertRaises(CommandError):
+            self.seed('first')
+
+
+class ProductProjectionTests(TestCase):
+    """商品列表以 values() 產生的輸出需與 ProductSerializer 完全相同"""
+
+    def setUp(self):
+        category = Category.objects.create(name='配件')
+        Product.objects.create(name='手機殼', description='', price=Decimal('19.90'), stock_quantity=5,
+                               category=category)
+        Product.objects.create(name='未分類', description='無類別', price=7, stock_quantity=0)
+        sharded = Product.objects.create(name='充電線', description='', price=10, stock_quantity=4,
+                                         category=category)
+        inventory.set_stock(inventory.rebalance(sharded.id, 2), 3)
+
+    def test_matches_serializer(self):
+        expected = ProductSerializer(
+            Product.objects.filter(is_active=True).select_related('category').order_by('-created_at', '-id'),
+            many=True
+        ).data
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.json()['data']['results'], json.loads(json.dumps(expected)))
+
+    def test_sparse_fields(self):
+        response = self.client.get('/api/products/?fields=price,id&ordering=price')
+        self.assertEqual(response.json()['data']['results'], [
+            {'id': Product.objects.get(name='未分類').id, 'price': '7.00'},
+            {'id': Product.objects.get(name='充電線').id, 'price': '10.00'},
+            {'id': Product.objects.get(name='手機殼').id, 'price': '19.90'},
+        ])
+        self.assertEqual(self.client.get('/api/products/?fields=id,secret').status_code, 400)
@@ -3,7 +3,14 @@ from . import views
 
 urlpatterns = [
     path('products/', views.ProductListView.as_view(), name='products'),
+    path('products/events/', views.product_event_feed, name='product-event-feed'),
+    path('products/export/', views.product_export, name='product-export'),
+    path('products/stock/', views.product_stock_batch, name='product-stock-batch'),
+    path('products/stock/reservations/', views.stock_reservation_create, name='stock-reservation'),
+    path('products/stock/reservations/<str:reference>/commit/', views.stock_reservation_commit, name='stock-reservation-commit'),
+    path('products/stock/reservations/<str:reference>/release/', views.stock_reservation_release, name='stock-reservation-release'),
     path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
     path('products/<int:product_id>/stock/', views.product_stock_check, name='product-stock'),
     path('categories/', views.CategoryListView.as_view(), name='category-list'),
+    path('categories/summary/', views.CategorySummaryView.as_view(), name='category-summary'),
 ]
\ No newline at end of file
@@ -1,12 +1,28 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
-from .models import Product, Category
-from .serializers import ProductSerializer, ProductCreateSerializer, CategorySerializer
+from .models import Product, Category, CategoryStats, ProductEvent, StockReservation
+from .serializers import (
+    ProductSerializer, ProductCreateSerializer, CategorySerializer, CategorySummarySerializer,
+    StockReservationCreateSerializer, StockReservationSerializer
+)
+from . import events, inventory
+from .caching import CatalogCacheMixin, get_catalog_version, latest_update
+from .filters import apply_product_filters, parse_product_filters
+from shared_models import metrics
+from shared_models.projections import Projection, parse_fields_param
+from shared_models.exports import EXPORT_CONTENT_TYPES, iter_batches, parse_datetime_param, streaming_export
 from shared_models.serializers import BaseResponseSerializer
+from django.conf import settings
+import time
 
-class ProductListView(generics.ListCreateAPIView):
-    queryset = Product.objects.filter(is_active=True)
+# 列表與 ProductSerializer 輸出相同，但直接由 values() 的 dict 產生
+PRODUCT_PROJECTION = Projection(ProductSerializer)
+# 分頁游標、分片庫存與最後修改時間需要的欄位
+PRODUCT_LIST_COLUMNS = ('id', 'shard_count', 'stock_quantity', 'updated_at')
+
+class ProductListView(CatalogCacheMixin, generics.ListCreateAPIView):
+    queryset = Product.objects.filter(is_active=True).select_related('category')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -14,12 +30,35 @@ class ProductListView(generics.ListCreateAPIView):
         return ProductSerializer
     
     def list(self, request, *args, **kwargs):
-        """GET 請求 - 商品列表"""
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return BaseResponseSerializer.success(
-            data=serializer.data,
-            message="商品列表查詢成功"
+        """GET 請求 - 商品列表（篩選、搜尋、排序、fields 稀疏欄位，keyset 分頁，回應快取）"""
+        try:
+            self.filters = parse_product_filters(request.query_params)
+            self.fields = parse_fields_param(request.query_params.get('fields'), PRODUCT_PROJECTION.names)
+        except ValueError as e:
+            return BaseResponseSerializer.fail(message=str(e), error_code="VALIDATION_ERROR")
+        return self.cached_response(request, self._build_list)
+    
+    def get_keyset_ordering(self):
+        return self.filters['ordering']
+    
+    def _build_list(self):
+        projection = PRODUCT_PROJECTION.only(self.fields) if self.fields else PRODUCT_PROJECTION
+        columns = dict.fromkeys([
+            *projection.columns, *PRODUCT_LIST_COLUMNS, *(field.lstrip('-') for field in self.filters['ordering'])
+        ])
+        queryset = apply_product_filters(self.get_queryset(), self.filters)
+        page = self.paginate_queryset(queryset.values(*columns))
+        with metrics.timer('serialize'):
+            if 'stock_quantity' in projection:
+                # 與 ProductSerializer 相同，分片商品顯示分片加總
+                stock_levels = inventory.get_stock_levels(page)
+                for row in page:
+                    row['stock_quantity'] = stock_levels[row['id']]
+            data = projection.rows(page)
+        return (
+            self.paginator.get_paginated_data(data),
+            "商品列表查詢成功",
+            latest_update(page, get_catalog_version())
         )
     
     def create(self, request, *args, **kwargs):
@@ -54,31 +93,42 @@ class ProductListView(generics.ListCreateAPIView):
             return errors[0]
         return "資料驗證失敗"
 
-class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.all()
+class ProductDetailView(CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Product.objects.select_related('category')
     serializer_class = ProductSerializer
     
     def retrieve(self, request, *args, **kwargs):
-        """GET 請求 - 商品詳情"""
+        """GET 請求 - 商品詳情（回應快取）"""
+        return self.cached_response(request, self._build_detail)
+    
+    def _build_detail(self):
         product = self.get_object()
-        return BaseResponseSerializer.success(
-            data=self.get_serializer(product).data,
-            message="商品查詢成功"
+        return (
+            self.get_serializer(product).data,
+            "商品查詢成功",
+            latest_update([product], 0)
         )
 
+STOCK_FIELDS = ('id', 'name', 'price', 'stock_quantity', 'shard_count')
+MAX_BATCH_SIZE = 100
+
+def _stock_data(product, stock_quantity):
+    """庫存查詢回應資料；product 為 values(*STOCK_FIELDS) 的 dict"""
+    return {
+        'id': product['id'],
+        'name': product['name'],
+        'price': str(product['price']),
+        'stock_quantity': stock_quantity,
+        'available': stock_quantity > 0
+    }
+
 @api_view(['GET'])
 def product_stock_check(request, product_id):
     """檢查商品庫存 - 供其他服務使用"""
     try:
-        product = Product.objects.get(id=product_id, is_active=True)
+        product = Product.objects.values(*STOCK_FIELDS).get(id=product_id, is_active=True)
         return BaseResponseSerializer.success(
-            data={
-                'id': product.id,
-                'name': product.name,
-                'price': str(product.price),
-                'stock_quantity': product.stock_quantity,
-                'available': product.stock_quantity > 0
-            },
+            data=_stock_data(product, inventory.get_stock_level(product)),
             message="庫存查詢成功"
         )
     except Product.DoesNotExist:
@@ -87,15 +137,226 @@ def product_stock_check(request, product_id):
             error_code="PRODUCT_NOT_FOUND"
         )
 
-class CategoryListView(generics.ListCreateAPIView):
+@api_view(['GET'])
+def product_stock_batch(request):
+    """批次檢查商品庫存 - 供其他服務使用，例如 ?ids=1,2,3"""
+    try:
+        product_ids = {int(i) for i in request.query_params.get('ids', '').split(',') if i.strip()}
+    except ValueError:
+        return BaseResponseSerializer.fail(
+            message="ids 必須為以逗號分隔的數字",
+            error_code="INVALID_IDS"
+        )
+    
+    if not product_ids:
+        return BaseResponseSerializer.fail(message="ids 為必填參數", error_code="INVALID_IDS")
+    
+    if len(product_ids) > MAX_BATCH_SIZE:
+        return BaseResponseSerializer.fail(
+            message=f"一次最多查詢 {MAX_BATCH_SIZE} 個商品",
+            error_code="BATCH_TOO_LARGE"
+        )
+    
+    # 單一 id__in 查詢取得所有商品
+    products = list(Product.objects.values(*STOCK_FIELDS).filter(id__in=product_ids, is_active=True))
+    stock_levels = inventory.get_stock_levels(products)
+    found = [_stock_data(product, stock_levels[product['id']]) for product in products]
+    found_ids = {item['id'] for item in found}
+    
+    return BaseResponseSerializer.success(
+        data={
+            'products': found,
+            'missing': sorted(product_ids - found_ids)
+        },
+        message="庫存查詢成功"
+    )
+
+PRODUCT_EXPORT_FIELDS = ['id', 'name', 'description', 'price', 'stock_quantity', 'category_id',
+                         'category_name', 'is_active', 'created_at', 'updated_at']
+
+def _product_export_rows(queryset, chunk_size):
+    """逐批讀取商品，分片商品的庫存每批以一次查詢加總"""
+    for products in iter_batches(queryset.iterator(chunk_size=chunk_size), chunk_size):
+        stock_levels = inventory.get_stock_levels(products)
+        for product in products:
+            yield {
+                'id': product.id,
+                'name': product.name,
+                'description': product.description,
+                'price': product.price,
+                'stock_quantity': stock_levels[product.id],
+                'category_id': product.category_id,
+                'category_name': product.category.name if product.category else None,
+                'is_active': product.is_active,
+                'created_at': product.created_at,
+                'updated_at': product.updated_at,
+            }
+
+@api_view(['GET'])
+def product_export(request):
+    """串流匯出商品 (NDJSON / CSV)，可依類別、上架狀態與建立時間篩選"""
+    export_format = request.query_params.get('file_format', 'ndjson')
+    if export_format not in EXPORT_CONTENT_TYPES:
+        return BaseResponseSerializer.fail(
+            message=f"不支援的格式: {export_format}（可用: {', '.join(EXPORT_CONTENT_TYPES)}）",
+            error_code="VALIDATION_ERROR"
+        )
+    
+    queryset = Product.objects.select_related('category').order_by('id')
+    try:
+        created_after = parse_datetime_param(request.query_params.get('created_after'))
+        created_before = parse_datetime_param(request.query_params.get('created_before'), end=True)
+    except ValueError as e:
+        return BaseResponseSerializer.fail(message=str(e), error_code="VALIDATION_ERROR")
+    
+    category = request.query_params.get('category')
+    if category:
+        if not category.isdigit():
+            return BaseResponseSerializer.fail(message="category 必須為數字", error_code="VALIDATION_ERROR")
+        queryset = queryset.filter(category_id=int(category))
+    if created_after:
+        queryset = queryset.filter(created_at__gte=created_after)
+    if created_before:
+        queryset = queryset.filter(created_at__lt=created_before)
+    
+    is_active = request.query_params.get('is_active')
+    if is_active is not None:
+        queryset = queryset.filter(is_active=is_active.lower() in ('true', '1'))
+    
+    return streaming_export(
+        _product_export_rows(queryset, settings.EXPORT_CHUNK_SIZE), export_format, 'products',
+        csv_fields=PRODUCT_EXPORT_FIELDS
+    )
+
+MAX_EVENT_LIMIT = 1000
+
+@api_view(['GET'])
+def product_event_feed(request):
+    """商品事件串流 - 回傳 id 大於 after 的事件，例如 ?after=120&limit=500&wait=25
+
+    wait 大於 0 時為長輪詢：沒有新事件就等待到有事件或逾時，消費端不需頻繁輪詢。
+    """
+    try:
+        after = int(request.query_params.get('after', 0))
+        limit = int(request.query_params.get('limit', 500))
+        wait = float(request.query_params.get('wait', 0))
+    except ValueError:
+        return BaseResponseSerializer.fail(
+            message="after、limit 與 wait 必須為數字",
+            error_code="VALIDATION_ERROR"
+        )
+    limit = max(1, min(limit, MAX_EVENT_LIMIT))
+    wait = max(0.0, min(wait, settings.PRODUCT_EVENT_MAX_WAIT))
+    
+    deadline = time.monotonic() + wait
+    while True:
+        # 並行交易尚未提交時，只回傳之後不會再出現更小 id 的事件
+        page = events.committed_events(after, limit + 1, max(deadline - time.monotonic(), 0))
+        if page or time.monotonic() >= deadline:
+            break
+        # 長輪詢期間不持有交易，只以主鍵索引檢查是否有新事件
+        time.sleep(min(settings.PRODUCT_EVENT_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+    
+    has_more = len(page) > limit
+    page = page[:limit]
+    return BaseResponseSerializer.success(
+        data={
+            'events': [events.serialize_event(event) for event in page],
+            'next_after': page[-1].id if page else after,
+            'has_more': has_more,
+            # 保留期限外的事件已刪除；after 小於 earliest_id - 1 時消費端需要重新同步
+            'earliest_id': ProductEvent.objects.order_by('id').values_list('id', flat=True).first(),
+        },
+        message="商品事件查詢成功"
+    )
+
+def _reservation_data(reference):
+    """預留回應資料，附上商品名稱與價格"""
+    reservations = StockReservation.objects.select_related('product').filter(
+        reference=reference
+    ).order_by('product_id')
+    return {
+        'reference': reference,
+        'items': StockReservationSerializer(reservations, many=True).data
+    }
+
+@api_view(['POST'])
+def stock_reservation_create(request):
+    """預留庫存 - 在單一交易內以條件式 UPDATE 扣除多個商品的庫存"""
+    serializer = StockReservationCreateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return BaseResponseSerializer.fail(
+            message=_first_error_message(serializer.errors) or "資料驗證失敗",
+            error_code="VALIDATION_ERROR"
+        )
+    
+    reference = serializer.validated_data['reference']
+    try:
+        inventory.reserve_items(reference, serializer.validated_data['items'])
+    except inventory.InventoryError as e:
+        return BaseResponseSerializer.fail(
+            message=e.message,
+            error_code=e.error_code,
+            data={'product_id': e.product_id} if e.product_id else None,
+            status_code=status.HTTP_409_CONFLICT
+        )
+    
+    return BaseResponseSerializer.created(
+        data=_reservation_data(reference),
+        message="庫存預留成功"
+    )
+
+@api_view(['POST'])
+def stock_reservation_commit(request, reference):
+    """確認庫存預留"""
+    if not StockReservation.objects.filter(reference=reference).exists():
+        return BaseResponseSerializer.not_found(message="預留不存在", error_code="RESERVATION_NOT_FOUND")
+    
+    inventory.commit_reservation(reference)
+    return BaseResponseSerializer.success(data=_reservation_data(reference), message="庫存預留已確認")
+
+@api_view(['POST'])
+def stock_reservation_release(request, reference):
+    """釋放庫存預留並歸還庫存"""
+    if not StockReservation.objects.filter(reference=reference).exists():
+        return BaseResponseSerializer.not_found(message="預留不存在", error_code="RESERVATION_NOT_FOUND")
+    
+    inventory.release_reservation(reference)
+    return BaseResponseSerializer.success(data=_reservation_data(reference), message="庫存預留已釋放")
+
+def _first_error_message(errors):
+    """提取第一個錯誤訊息（包含巢狀的項目錯誤）"""
+    if isinstance(errors, dict):
+        for messages in errors.values():
+            message = _first_error_message(messages)
+            if message:
+                return message
+    elif isinstance(errors, list):
+        for messages in errors:
+            message = _first_error_message(messages)
+            if message:
+                return message
+    elif errors:
+        return str(errors)
+    return None
+
+class CategoryListView(CatalogCacheMixin, generics.ListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     
     def list(self, request, *args, **kwargs):
-        """GET 請求 - 類別列表"""
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return BaseResponseSerializer.success(serializer.data)
+        """GET 請求 - 類別列表（keyset 分頁，回應快取）"""
+        return self.cached_response(request, self._build_list)
+    
+    def _build_list(self):
+        page = self.paginate_queryset(self.get_queryset())
+        with metrics.timer('serialize'):
+            data = self.get_serializer(page, many=True).data
+        return (
+            self.paginator.get_paginated_data(data),
+            "操作成功",
+            latest_update(page, get_catalog_version())
+        )
     
     def create(self, request, *args, **kwargs):
         """POST 請求 - 建立類別"""
@@ -124,4 +385,24 @@ class CategoryListView(generics.ListCreateAPIView):
                     return messages
         elif isinstance(errors, list) and errors:
             return errors[0]
-        return "資料驗證失敗"
\ No newline at end of file
+        return "資料驗證失敗"
+
+class CategorySummaryView(CatalogCacheMixin, generics.ListAPIView):
+    """類別摘要：各類別的上架商品數、價格區間、平均價格與庫存總量
+
+    資料來自隨商品變更增量更新的 CategoryStats，只讀取類別數量的資料列，
+    不會對商品表執行 GROUP BY；類別數量不多，不分頁。
+    """
+    queryset = CategoryStats.objects.select_related('category').order_by('category__name')
+    serializer_class = CategorySummarySerializer
+    pagination_class = None
+    
+    def list(self, request, *args, **kwargs):
+        """GET 請求 - 類別摘要（回應快取）"""
+        return self.cached_response(request, self._build_summary)
+    
+    def _build_summary(self):
+        rows = list(self.get_queryset())
+        with metrics.timer('serialize'):
+            data = self.get_serializer(rows, many=True).data
+        return data, "操作成功", latest_update(rows, get_catalog_version())
@@ -0,0 +1,269 @@
+"""可重現的壓力測試：以固定並發數呼叫各端點，輸出吞吐量、延遲百分位數與資料庫查詢數
+
+準備資料（兩個服務各自執行）：
+    python manage.py seed_catalog --products 10000          # 商品服務
+    python manage.py seed_orders --orders 10000 --products 10000   # 訂單服務
+
+啟動服務時設定 QUERY_COUNT_HEADER=True，回應會附上 X-DB-Query-Count 標頭供本腳本統計。
+只壓測訂單服務時可以用 scripts/stub_product_service.py 取代商品服務。
+
+執行：
+    python scripts/benchmark.py --concurrency 16 --duration 30 --output benchmark-results/base.json
+    python scripts/benchmark.py --compare benchmark-results/base.json --threshold 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+QUERY_COUNT_HEADER = 'X-DB-Query-Count'
+
+
+def product_list(ctx):
+    return ctx.list_page('product_list', f'{ctx.args.product_url}/api/products/')
+
+
+def product_detail(ctx):
+    return ctx.session.get(f'{ctx.args.product_url}/api/products/{ctx.product_id()}/')
+
+
+def stock_batch(ctx):
+    ids = ','.join(str(ctx.product_id()) for _ in range(ctx.args.stock_ids))
+    return ctx.session.get(f'{ctx.args.product_url}/api/products/stock/', params={'ids': ids})
+
+
+def order_list(ctx):
+    return ctx.list_page('order_list', f'{ctx.args.order_url}/api/orders/')
+
+
+def order_create(ctx):
+    items = [
+        {'product_id': product_id, 'quantity': ctx.rng.randint(1, 3)}
+        for product_id in {ctx.product_id() for _ in range(ctx.rng.randint(1, 3))}
+    ]
+    return ctx.session.post(f'{ctx.args.order_url}/api/orders/', json={
+        'customer_name': 'Benchmark',
+        'customer_email': f'bench-{uuid.uuid4().hex[:8]}@example.com',
+        'customer_phone': '0912345678',
+        'shipping_address': '壓測路 1 號',
+        'items': items,
+    })
+
+
+SCENARIOS = {
+    'product_list': product_list,
+    'product_detail': product_detail,
+    'stock_batch': stock_batch,
+    'order_list': order_list,
+    'order_create': order_create,
+}
+
+
+class WorkerContext:
+    """每個執行緒各自的連線與亂數產生器，結果不需要跨執行緒加鎖"""
+
+    def __init__(self, args, seed):
+        self.args = args
+        self.session = requests.Session()
+        self.rng = random.Random(seed)
+        self.cursors = {}
+
+    def product_id(self):
+        return self.rng.randint(1, self.args.products)
+
+    def list_page(self, name, url):
+        """沿著回應的 next 游標往下翻頁，翻滿 --list-pages 頁或到底後從第一頁重新開始
+
+        只取 next 連結中的游標參數，避免服務在代理後面時回傳的主機名稱與壓測目標不同
+        """
+        depth, cursor = self.cursors.get(name, (0, None))
+        params = {'page_size': 20}
+        if cursor:
+            params['cursor'] = cursor
+        response = self.session.get(url, params=params)
+        next_link = None
+        if response.status_code == 200:
+            next_link = (response.json().get('data') or {}).get('next')
+        if next_link and depth + 1 < self.args.list_pages:
+            cursor = parse_qs(urlsplit(next_link).query).get('cursor', [None])[0]
+            self.cursors[name] = (depth + 1, cursor)
+        else:
+            self.cursors[name] = (0, None)
+        return response
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_worker(args, scenario, seed, deadline, measure_from):
+    """持續送出請求直到 deadline；measure_from 之前的請求視為暖機不列入統計"""
+    ctx = WorkerContext(args, seed)
+    latencies, query_counts, errors = [], [], {}
+    func = SCENARIOS[scenario]
+    while True:
+        start = time.perf_counter()
+        if start >= deadline:
+            break
+        try:
+            response = func(ctx)
+            outcome = response.status_code
+            queries = response.headers.get(QUERY_COUNT_HEADER)
+        except requests.RequestException as e:
+            outcome, queries = type(e).__name__, None
+        elapsed = time.perf_counter() - start
+        if start < measure_from:
+            continue
+        if outcome in (200, 201):
+            latencies.append(elapsed)
+            if queries is not None:
+                query_counts.append(int(queries))
+        else:
+            errors[str(outcome)] = errors.get(str(outcome), 0) + 1
+    ctx.session.close()
+    return latencies, query_counts, errors
+
+
+def run_scenario(args, scenario):
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    deadline = measure_from + args.duration
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [
+            executor.submit(run_worker, args, scenario, args.seed * 1000 + index, deadline, measure_from)
+            for index in range(args.concurrency)
+        ]
+        results = [future.result() for future in futures]
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    query_counts = [count for result in results for count in result[1]]
+    errors = {}
+    for result in results:
+        for key, count in result[2].items():
+            errors[key] = errors.get(key, 0) + count
+
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / args.duration, 2),
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+            'p50': ms(percentile(latencies, 0.50)),
+            'p95': ms(percentile(latencies, 0.95)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(latencies[-1] if latencies else None),
+        },
+        'queries': {
+            'mean': round(sum(query_counts) / len(query_counts), 2) if query_counts else None,
+            'max': max(query_counts) if query_counts else None,
+        },
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """與基準結果比較，吞吐量下降或 p95 上升超過 threshold 比例即視為退步"""
+    regressions = []
+    for scenario, current in results.items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if not previous or not previous['rps'] or not current['requests']:
+            continue
+        checks = [
+            ('rps', previous['rps'], current['rps'], current['rps'] < previous['rps'] * (1 - threshold)),
+            ('p95', previous['latency_ms']['p95'], current['latency_ms']['p95'],
+             current['latency_ms']['p95'] > previous['latency_ms']['p95'] * (1 + threshold)),
+        ]
+        if previous['queries']['max'] is not None and current['queries']['max'] is not None:
+            checks.append(('queries', previous['queries']['max'], current['queries']['max'],
+                           current['queries']['max'] > previous['queries']['max']))
+        for metric, before, after, regressed in checks:
+            mark = '退步' if regressed else 'ok'
+            print(f'  {scenario:<16}{metric:<9}{before:>10} -> {after:<10}{mark}')
+            if regressed:
+                regressions.append(f'{scenario}.{metric}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--product-url', default=os.environ.get('PRODUCT_SERVICE_URL', 'http://localhost:8001'))
+    parser.add_argument('--order-url', default=os.environ.get('ORDER_SERVICE_URL', 'http://localhost:8002'))
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='以逗號分隔，預設全部')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20, help='每個情境量測的秒數')
+    parser.add_argument('--warmup', type=float, default=3, help='每個情境開始量測前的暖機秒數')
+    parser.add_argument('--products', type=int, default=10000, help='隨機選取的商品 ID 範圍（與 seed_catalog 一致）')
+    parser.add_argument('--stock-ids', type=int, default=20, help='stock_batch 每次查詢的商品數')
+    parser.add_argument('--list-pages', type=int, default=10, help='列表情境沿 next 游標連續翻頁的深度')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='結果 JSON 路徑，預設寫入 benchmark-results/<時間>.json')
+    parser.add_argument('--compare', help='基準結果 JSON，有退步時以非零狀態結束')
+    parser.add_argument('--threshold', type=float, default=0.1, help='比較時允許的變動比例')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f'未知的情境: {", ".join(unknown)}（可用：{", ".join(SCENARIOS)}）')
+
+    results = {}
+    for scenario in scenarios:
+        print(f'{scenario}：並發 {args.concurrency}，暖機 {args.warmup}s，量測 {args.duration}s ...', flush=True)
+        results[scenario] = result = run_scenario(args, scenario)
+        latency = result['latency_ms']
+        print(f"  {result['rps']} req/s  p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms"
+              f"  queries {result['queries']['mean']}  errors {result['errors'] or 0}")
+
+    report = {
+        'environment': environment(),
+        'config': {key: getattr(args, key) for key in
+                   ('product_url', 'order_url', 'concurrency', 'duration', 'warmup', 'products',
+                    'stock_ids', 'list_pages', 'seed')},
+        'scenarios': results,
+    }
+    output = args.output or os.path.join('benchmark-results', datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'結果已寫入 {output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f'與 {args.compare} 比較（允許 {args.threshold:.0%}）：')
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'效能退步: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
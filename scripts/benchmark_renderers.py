@@ -0,0 +1,138 @@
+"""比較 DRF JSONRenderer 與 ORJSONRenderer 輸出大型商品、訂單列表的耗時，並確認輸出位元組相同
+
+不需要資料庫，資料依 ProductSerializer、OrderSerializer 的欄位產生兩種形式：
+- serialized：經過 DRF serializer 後的資料（Decimal、datetime 已轉為字串），即一般 API 回應
+- raw：values() 查詢的原始值（Decimal、datetime 物件），renderer 需要自行轉換
+
+用法：
+    pip install orjson
+    python scripts/benchmark_renderers.py --items 1000,10000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared-models'))
+
+import django
+from django.conf import settings
+
+settings.configure(USE_TZ=False, REST_FRAMEWORK={})
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from shared_models.renderers import ORJSONRenderer  # noqa: E402
+
+BASE_TIME = datetime(2024, 1, 1, 8, 0, 0)
+
+
+def drf_datetime(value):
+    return value.isoformat()
+
+
+def products(count, raw):
+    rows = []
+    for i in range(1, count + 1):
+        price = Decimal(f'{i % 1000}.{i % 100:02d}')
+        created = BASE_TIME + timedelta(minutes=i, microseconds=i * 137 % 1000000)
+        rows.append({
+            'id': i,
+            'name': f'商品 {i}',
+            'description': f'第 {i} 號測試商品，含中文描述與 "引號"',
+            'price': price if raw else str(price),
+            'stock_quantity': i % 500,
+            'category': i % 20 + 1,
+            'category_name': f'類別 {i % 20 + 1}',
+            'is_active': True,
+            'created_at': created if raw else drf_datetime(created),
+            'updated_at': created if raw else drf_datetime(created),
+        })
+    return rows
+
+
+def orders(count, raw):
+    rows = []
+    for i in range(1, count + 1):
+        items = []
+        for n in range(1, i % 3 + 2):
+            unit_price = Decimal(f'{(i * n) % 1000}.99')
+            subtotal = unit_price * n
+            items.append({
+                'product_id': i * n % 10000,
+                'product_name': f'商品 {i * n % 10000}',
+                'unit_price': unit_price if raw else str(unit_price),
+                'quantity': n,
+                'subtotal': subtotal if raw else str(subtotal),
+            })
+        total = sum(Decimal(str(item['subtotal'])) for item in items)
+        created = BASE_TIME + timedelta(seconds=i * 7)
+        rows.append({
+            'id': i,
+            'order_number': f'ORD-{i:08X}',
+            'customer_name': f'客戶 {i % 1000}',
+            'customer_email': f'customer{i % 1000}@example.com',
+            'customer_phone': '0912345678',
+            'shipping_address': '台北市信義區市府路 1 號',
+            'status': ('pending', 'confirmed', 'shipped')[i % 3],
+            'total_amount': total if raw else str(total),
+            'notes': '',
+            'items': items,
+            'created_at': created if raw else drf_datetime(created),
+            'updated_at': created if raw else drf_datetime(created),
+        })
+    return rows
+
+
+def envelope(results):
+    """與 BaseResponseSerializer.success 加上分頁資料相同的結構"""
+    return {
+        'result': True,
+        'errorCode': '',
+        'message': '列表查詢成功',
+        'data': {'next': 'eyJ2IjpbIjIwMjQtMDEtMDEiLDEwXX0', 'previous': None, 'page_size': len(results),
+                 'results': results},
+    }
+
+
+def best_of(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', default='1000,10000', help='列表筆數，以逗號分隔')
+    parser.add_argument('--repeat', type=int, default=5, help='每組重複次數，取最快的一次')
+    args = parser.parse_args()
+
+    stdlib, fast = JSONRenderer(), ORJSONRenderer()
+    print(f"{'資料':<22}{'筆數':>8}{'大小':>12}{'JSONRenderer':>15}{'ORJSONRenderer':>17}{'倍數':>8}  輸出")
+    mismatched = False
+    for count in (int(value) for value in args.items.split(',')):
+        for name, build in (('products', products), ('orders', orders)):
+            for raw in (False, True):
+                data = envelope(build(count, raw))
+                expected = stdlib.render(data, 'application/json')
+                actual = fast.render(data, 'application/json')
+                identical = expected == actual
+                mismatched |= not identical
+                slow = best_of(lambda: stdlib.render(data, 'application/json'), args.repeat)
+                quick = best_of(lambda: fast.render(data, 'application/json'), args.repeat)
+                label = f"{name} ({'raw' if raw else 'serialized'})"
+                print(f'{label:<22}{count:>8}{len(expected) / 1024:>10.0f}KB{slow * 1000:>13.2f}ms'
+                      f'{quick * 1000:>15.2f}ms{slow / quick:>7.1f}x  {"相同" if identical else "不同"}')
+    if mismatched:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
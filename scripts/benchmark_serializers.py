@@ -0,0 +1,163 @@
+"""比較列表端點以 DRF serializer 與以 values() + Projection 產生資料的耗時，並確認輸出相同
+
+不需要資料庫：
+- DRF：未儲存的模型實例（類別與訂單項目已預先載入），即原本 ProductSerializer、OrderSerializer 的路徑
+- Projection：與 values() 查詢回傳相同的 dict，即目前列表端點的路徑
+只量測序列化，不含查詢與 JSON 輸出（JSON 輸出見 benchmark_renderers.py）。
+
+用法：
+    python scripts/benchmark_serializers.py --items 100,1000,10000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for path in ('shared-models', 'product_service', 'order_service'):
+    sys.path.insert(0, os.path.join(ROOT, path))
+
+import django
+from django.conf import settings
+
+settings.configure(
+    USE_TZ=False,
+    INSTALLED_APPS=['django.contrib.contenttypes', 'rest_framework', 'shared_models', 'products', 'orders'],
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    REST_FRAMEWORK={},
+)
+django.setup()
+
+from orders.models import Order, OrderItem  # noqa: E402
+from orders.views import ORDER_ITEM_PROJECTION, ORDER_PROJECTION  # noqa: E402
+from orders.serializers import OrderSerializer  # noqa: E402
+from products.models import Category, Product  # noqa: E402
+from products.serializers import ProductSerializer  # noqa: E402
+from products.views import PRODUCT_PROJECTION  # noqa: E402
+
+BASE_TIME = datetime(2024, 1, 1, 8, 0, 0)
+CATEGORIES = [Category(id=i, name=f'類別 {i}') for i in range(1, 21)]
+
+
+def product_rows(count):
+    rows = []
+    for i in range(1, count + 1):
+        created = BASE_TIME + timedelta(minutes=i, microseconds=i * 137 % 1000000)
+        category = CATEGORIES[i % 20]
+        rows.append({
+            'id': i, 'name': f'商品 {i}', 'description': f'第 {i} 號測試商品',
+            'price': Decimal(f'{i % 1000}.{i % 100:02d}'), 'stock_quantity': i % 500, 'shard_count': 0,
+            'category': category.id, 'category__name': category.name, 'is_active': True,
+            'created_at': created, 'updated_at': created,
+        })
+    return rows
+
+
+def product_instances(rows):
+    products = []
+    for row in rows:
+        product = Product(
+            id=row['id'], name=row['name'], description=row['description'], price=row['price'],
+            stock_quantity=row['stock_quantity'], shard_count=0, category_id=row['category'], is_active=True,
+            created_at=row['created_at'], updated_at=row['updated_at'],
+        )
+        product.category = CATEGORIES[row['category'] - 1]
+        products.append(product)
+    return products
+
+
+def order_rows(count):
+    orders, items = [], {}
+    for i in range(1, count + 1):
+        created = BASE_TIME + timedelta(seconds=i * 7)
+        lines = []
+        for n in range(1, i % 3 + 2):
+            unit_price = Decimal(f'{(i * n) % 1000}.99')
+            lines.append({'order_id': i, 'product_id': i * n % 10000, 'product_name': f'商品 {i * n % 10000}',
+                          'unit_price': unit_price, 'quantity': n, 'subtotal': unit_price * n})
+        items[i] = lines
+        orders.append({
+            'id': i, 'order_number': f'ORD-{i:08X}', 'customer_name': f'客戶 {i % 1000}',
+            'customer_email': f'customer{i % 1000}@example.com', 'customer_phone': '0912345678',
+            'shipping_address': '台北市信義區市府路 1 號', 'status': ('pending', 'confirmed', 'shipped')[i % 3],
+            'total_amount': sum(line['subtotal'] for line in lines), 'notes': '',
+            'created_at': created, 'updated_at': created,
+        })
+    return orders, items
+
+
+def order_instances(orders, items):
+    instances = []
+    for row in orders:
+        order = Order(**row)
+        order._prefetched_objects_cache = {'items': [
+            OrderItem(id=index, **line) for index, line in enumerate(items[row['id']])
+        ]}
+        instances.append(order)
+    return instances
+
+
+def drf_products(products):
+    return ProductSerializer(products, many=True).data
+
+
+def projected_products(rows):
+    return PRODUCT_PROJECTION.rows(rows)
+
+
+def drf_orders(orders):
+    return OrderSerializer(orders, many=True).data
+
+
+def projected_orders(orders, items):
+    nested = {order_id: ORDER_ITEM_PROJECTION.rows(lines) for order_id, lines in items.items()}
+    return [ORDER_PROJECTION.row(row, {'items': nested[row['id']]}) for row in orders]
+
+
+def best_of(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', default='100,1000,10000', help='列表筆數，以逗號分隔')
+    parser.add_argument('--repeat', type=int, default=5, help='每組重複次數，取最快的一次')
+    args = parser.parse_args()
+
+    print(f"{'資料':<12}{'筆數':>8}{'DRF serializer':>17}{'Projection':>13}{'倍數':>8}  輸出")
+    mismatched = False
+    for count in (int(value) for value in args.items.split(',')):
+        rows = product_rows(count)
+        products = product_instances(rows)
+        orders, items = order_rows(count)
+        instances = order_instances(orders, items)
+        cases = (
+            ('products', lambda: drf_products(products), lambda: projected_products(rows)),
+            ('orders', lambda: drf_orders(instances), lambda: projected_orders(orders, items)),
+        )
+        for name, slow_path, fast_path in cases:
+            # ReturnList 與 OrderedDict 轉成一般結構後比較，欄位順序也需相同
+            expected = [list(dict(row).items()) for row in slow_path()]
+            actual = [list(row.items()) for row in fast_path()]
+            if name == 'orders':
+                expected = [[(k, [dict(i) for i in v] if k == 'items' else v) for k, v in row] for row in expected]
+            identical = expected == actual
+            mismatched |= not identical
+            slow = best_of(slow_path, args.repeat)
+            quick = best_of(fast_path, args.repeat)
+            print(f'{name:<12}{count:>8}{slow * 1000:>15.2f}ms{quick * 1000:>11.2f}ms{slow / quick:>7.1f}x  '
+                  f'{"相同" if identical else "不同"}')
+    if mismatched:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""本機模擬的商品服務，讓訂單服務可以在單機上單獨壓測
+
+只實作訂單服務會呼叫的端點，資料存在記憶體中：
+- GET  /api/products/stock/?ids=1,2,3
+- GET  /api/products/<id>/stock/
+- POST /api/products/stock/reservations/
+- POST /api/products/stock/reservations/<reference>/commit/
+- POST /api/products/stock/reservations/<reference>/release/
+- GET  /api/products/events/（永遠回傳空的事件列表）
+
+用法：
+    python scripts/stub_product_service.py --port 8001 --products 10000 --latency-ms 5
+    PRODUCT_SERVICE_URL=http://localhost:8001 python manage.py runserver 8002
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RESERVATION_PATH = re.compile(r'^/api/products/stock/reservations/([^/]+)/(commit|release)/$')
+PRODUCT_STOCK_PATH = re.compile(r'^/api/products/(\d+)/stock/$')
+
+
+class Catalog:
+    """記憶體中的商品與預留，以單一鎖保護"""
+
+    def __init__(self, products, stock):
+        self.products = {
+            product_id: {'id': product_id, 'name': f'商品 {product_id}',
+                         'price': f'{(product_id % 1000) + 0.99:.2f}', 'stock_quantity': stock}
+            for product_id in range(1, products + 1)
+        }
+        self.reservations = {}
+        self.lock = threading.Lock()
+
+    def stock_data(self, product):
+        return {**product, 'available': product['stock_quantity'] > 0}
+
+    def reserve(self, reference, items):
+        with self.lock:
+            if reference in self.reservations:
+                reservation = self.reservations[reference]
+                if reservation['status'] == 'released':
+                    return 409, 'RESERVATION_RELEASED', f'預留 {reference} 已釋放', None
+                return 201, '', '庫存預留成功', reservation
+            for item in items:
+                product = self.products.get(item['product_id'])
+                if product is None:
+                    return 409, 'PRODUCT_NOT_FOUND', f"商品 ID {item['product_id']} 不存在", None
+                if product['stock_quantity'] < item['quantity']:
+                    return 409, 'INSUFFICIENT_STOCK', f"商品 ID {item['product_id']} 庫存不足", None
+            for item in items:
+                self.products[item['product_id']]['stock_quantity'] -= item['quantity']
+            reservation = {
+                'reference': reference,
+                'status': 'reserved',
+                'items': [
+                    {'product_id': item['product_id'], 'quantity': item['quantity'], 'status': 'reserved',
+                     'name': self.products[item['product_id']]['name'],
+                     'price': self.products[item['product_id']]['price']}
+                    for item in items
+                ],
+            }
+            self.reservations[reference] = reservation
+            return 201, '', '庫存預留成功', reservation
+
+    def finish(self, reference, action):
+        with self.lock:
+            reservation = self.reservations.get(reference)
+            if reservation is None:
+                return 404, 'RESERVATION_NOT_FOUND', '預留不存在', None
+            if action == 'release' and reservation['status'] != 'released':
+                for item in reservation['items']:
+                    self.products[item['product_id']]['stock_quantity'] += item['quantity']
+            reservation['status'] = 'released' if action == 'release' else 'committed'
+            return 200, '', '預留已更新', reservation
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    catalog = None
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, result, message='', data=None, error_code=''):
+        body = json.dumps({'result': result, 'errorCode': error_code, 'message': message, 'data': data},
+                          ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(self.path)
+        if url.path == '/api/products/stock/':
+            ids = [int(i) for i in parse_qs(url.query).get('ids', [''])[0].split(',') if i]
+            products = [self.catalog.stock_data(self.catalog.products[i]) for i in ids if i in self.catalog.products]
+            missing = [i for i in ids if i not in self.catalog.products]
+            return self._send(200, True, '庫存查詢成功', {'products': products, 'missing': missing})
+        if url.path == '/api/products/events/':
+            after = int(parse_qs(url.query).get('after', ['0'])[0])
+            return self._send(200, True, '商品事件查詢成功',
+                              {'events': [], 'next_after': after, 'has_more': False, 'earliest_id': None})
+        match = PRODUCT_STOCK_PATH.match(url.path)
+        if match and int(match.group(1)) in self.catalog.products:
+            return self._send(200, True, '庫存查詢成功',
+                              self.catalog.stock_data(self.catalog.products[int(match.group(1))]))
+        self._send(404, False, '資源不存在', error_code='NOT_FOUND')
+
+    def do_POST(self):
+        if self.latency:
+            time.sleep(self.latency)
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        path = urlparse(self.path).path
+        if path == '/api/products/stock/reservations/':
+            status, code, message, data = self.catalog.reserve(payload['reference'], payload['items'])
+        else:
+            match = RESERVATION_PATH.match(path)
+            if not match:
+                return self._send(404, False, '資源不存在', error_code='NOT_FOUND')
+            status, code, message, data = self.catalog.finish(match.group(1), match.group(2))
+        self._send(status, status < 400, message, data, code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--products', type=int, default=10000, help='商品 ID 範圍為 1..N')
+    parser.add_argument('--stock', type=int, default=10 ** 9, help='每個商品的初始庫存')
+    parser.add_argument('--latency-ms', type=float, default=0, help='每個請求額外延遲的毫秒數，模擬網路與資料庫')
+    args = parser.parse_args()
+
+    Handler.catalog = Catalog(args.products, args.stock)
+    Handler.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f'商品服務模擬器：http://{args.host}:{args.port}（{args.products} 個商品，延遲 {args.latency_ms}ms）')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""檢視 TracingMiddleware 匯出的 span 檔案，將同一個 trace 跨服務的 span 組成樹狀耗時
+
+用法：
+    python scripts/trace_report.py traces/order-service.jsonl traces/product-service.jsonl
+    python scripts/trace_report.py traces/*.jsonl --trace 4bf92f3577b34da6a3ce929d0e0e4736
+    python scripts/trace_report.py traces/*.jsonl --slowest 3 --name "POST api/orders/"
+
+每行為一批 OTLP/HTTP JSON，也可以直接 POST 到 collector 的 /v1/traces。
+"""
+import argparse
+import json
+from collections import defaultdict
+
+KIND_NAMES = {1: 'internal', 2: 'server', 3: 'client'}
+
+
+def load_spans(paths):
+    spans = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                payload = json.loads(line)
+                for resource_spans in payload.get('resourceSpans', []):
+                    service = next(
+                        (attr['value'].get('stringValue') for attr in resource_spans['resource']['attributes']
+                         if attr['key'] == 'service.name'), '?'
+                    )
+                    for scope_spans in resource_spans.get('scopeSpans', []):
+                        for span in scope_spans.get('spans', []):
+                            span['service'] = service
+                            span['start'] = int(span['startTimeUnixNano'])
+                            span['end'] = int(span['endTimeUnixNano'])
+                            span['attrs'] = {
+                                attr['key']: next(iter(attr['value'].values())) for attr in span.get('attributes', [])
+                            }
+                            spans[span['spanId']] = span
+    traces = defaultdict(list)
+    for span in spans.values():
+        traces[span['traceId']].append(span)
+    return traces
+
+
+def roots_of(spans):
+    ids = {span['spanId'] for span in spans}
+    return sorted((span for span in spans if span.get('parentSpanId') not in ids), key=lambda span: span['start'])
+
+
+def print_trace(trace_id, spans, collapse_db):
+    children = defaultdict(list)
+    for span in spans:
+        children[span.get('parentSpanId') or ''].append(span)
+    for group in children.values():
+        group.sort(key=lambda span: span['start'])
+    roots = roots_of(spans)
+    origin = roots[0]['start'] if roots else 0
+    total = max(span['end'] for span in spans) - origin
+    print(f'trace {trace_id}  {total / 1e6:.2f}ms  {len(spans)} spans')
+
+    def walk(span, depth):
+        duration = (span['end'] - span['start']) / 1e6
+        offset = (span['start'] - origin) / 1e6
+        detail = span['attrs'].get('db.statement', '') if span['name'] == 'db.query' else ''
+        error = '  [錯誤]' if span.get('status', {}).get('code') == 2 else ''
+        print(f"  {'  ' * depth}{span['name']:<{max(40 - 2 * depth, 10)}} {span['service']:<16}"
+              f"+{offset:>8.2f}ms {duration:>9.2f}ms {KIND_NAMES.get(span['kind'], '')}{error}"
+              f"{'  ' + detail[:60] if detail and not collapse_db else ''}")
+        nested = children.get(span['spanId'], [])
+        queries = [child for child in nested if child['name'] == 'db.query']
+        if collapse_db and queries:
+            db_time = sum(child['end'] - child['start'] for child in queries) / 1e6
+            print(f"  {'  ' * (depth + 1)}{f'db.query × {len(queries)}':<{max(38 - 2 * depth, 10)}} "
+                  f"{span['service']:<16}{'':>11} {db_time:>9.2f}ms")
+            nested = [child for child in nested if child['name'] != 'db.query']
+        for child in nested:
+            walk(child, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='span 檔案（TRACING_FILE）')
+    parser.add_argument('--trace', help='只顯示指定的 trace ID（回應標頭 X-Trace-Id）')
+    parser.add_argument('--name', help='只顯示根 span 名稱符合的 trace，例如 "POST api/orders/"')
+    parser.add_argument('--slowest', type=int, default=5, help='顯示最慢的 N 個 trace')
+    parser.add_argument('--show-queries', action='store_true', help='逐筆列出查詢，預設彙總為次數與總時間')
+    args = parser.parse_args()
+
+    traces = load_spans(args.files)
+    if args.trace:
+        selected = [args.trace] if args.trace in traces else []
+    else:
+        candidates = []
+        for trace_id, spans in traces.items():
+            roots = roots_of(spans)
+            if args.name and not any(root['name'] == args.name for root in roots):
+                continue
+            duration = max(span['end'] for span in spans) - min(span['start'] for span in spans)
+            candidates.append((duration, trace_id))
+        selected = [trace_id for _, trace_id in sorted(candidates, reverse=True)[:args.slowest]]
+
+    if not selected:
+        print('找不到符合的 trace')
+        return
+    for trace_id in selected:
+        print_trace(trace_id, traces[trace_id], collapse_db=not args.show_queries)
+
+
+if __name__ == '__main__':
+    main()
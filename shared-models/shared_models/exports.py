@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
+
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# 每次寫出的資料列數；合併成較大的區塊可減少 WSGI 寫入次數
+WRITE_BATCH_ROWS = 200
+
+
+def iter_batches(iterable: Iterable, size: int) -> Iterator[List]:
+    """將可迭代物件切成固定大小的清單"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_datetime_param(value: Optional[str], end: bool = False) -> Optional[datetime]:
+    """解析日期或日期時間參數；只有日期且 end=True 時回傳隔天 00:00（用於 < 比較）
+
+    格式錯誤時拋出 ValueError。
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is not None:
+        return parsed
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f'日期格式錯誤: {value}（應為 YYYY-MM-DD 或 ISO 8601 日期時間）')
+    if end:
+        day += timedelta(days=1)
+    return datetime.combine(day, time.min)
+
+
+def _ndjson_lines(rows: Iterable[Dict]) -> Iterator[str]:
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for batch in iter_batches(rows, WRITE_BATCH_ROWS):
+        yield ''.join(encoder.encode(row) + '\n' for row in batch)
+
+
+def _csv_lines(rows: Iterable[Dict], fields: List[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for batch in iter_batches(rows, WRITE_BATCH_ROWS):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def streaming_export(rows: Iterable[Dict], export_format: str, filename: str,
+                     csv_fields: List[str], csv_row: Optional[Callable[[Dict], Dict]] = None):
+    """以串流回應輸出 NDJSON 或 CSV
+
+    rows 應為惰性產生器（例如 QuerySet.iterator()），回應開始傳送後才會逐批讀取資料庫，
+    記憶體用量只與批次大小有關。csv_row 可將巢狀資料攤平成單行。
+    """
+    if export_format == 'csv':
+        if csv_row is not None:
+            rows = map(csv_row, rows)
+        content = _csv_lines(rows, csv_fields)
+    else:
+        content = _ndjson_lines(rows)
+
+    response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    # 避免反向代理緩衝整個回應
+    response['X-Accel-Buffering'] = 'no'
+    return response
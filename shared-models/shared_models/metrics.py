@@ -0,0 +1,367 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+INF_LABEL = 'le="+Inf"'
+# 多行程模式下各行程寫入累計值的最短間隔（秒）
+MULTIPROC_FLUSH_INTERVAL = 1.0
+
+
+class Histogram:
+    """Prometheus 直方圖，各標籤組合的累計值保存在行程記憶體中"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # 每個桶的計數、總和、次數
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> Dict[Tuple, list]:
+        with self._lock:
+            return {labels: [list(counts), total, count] for labels, (counts, total, count) in self._series.items()}
+
+    @staticmethod
+    def combine(series: Dict[Tuple, list], labels: Tuple, value: list):
+        """將另一個行程的累計值加到 series"""
+        current = series.get(labels)
+        if current is None:
+            series[labels] = [list(value[0]), value[1], value[2]]
+            return
+        current[0] = [a + b for a, b in zip(current[0], value[0])]
+        current[1] += value[1]
+        current[2] += value[2]
+
+    def expose(self, snapshot: Optional[Dict[Tuple, list]] = None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        if snapshot is None:
+            snapshot = self.snapshot()
+        series = sorted((labels, counts, total, count) for labels, (counts, total, count) in snapshot.items())
+        for labels, counts, total, count in series:
+            base = _format_labels(self.labelnames, labels)
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f'{self.name}_bucket{_join_labels(base, le)} {bucket_count}')
+            lines.append(f'{self.name}_bucket{_join_labels(base, INF_LABEL)} {count}')
+            lines.append(f'{self.name}_sum{_wrap(base)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_wrap(base)} {count}')
+        return lines
+
+
+class Counter:
+    """Prometheus 計數器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._series: Dict[Tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> Dict[Tuple, int]:
+        with self._lock:
+            return dict(self._series)
+
+    @staticmethod
+    def combine(series: Dict[Tuple, int], labels: Tuple, value: int):
+        series[labels] = series.get(labels, 0) + value
+
+    def expose(self, snapshot: Optional[Dict[Tuple, int]] = None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        if snapshot is None:
+            snapshot = self.snapshot()
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f'{self.name}{_wrap(_format_labels(self.labelnames, labels))} {value}')
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values) -> str:
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _join_labels(base: str, extra: str) -> str:
+    return '{' + (f'{base},{extra}' if base else extra) + '}'
+
+
+def _wrap(base: str) -> str:
+    return '{' + base + '}' if base else ''
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else f'{int(value)}.0'
+
+
+REQUESTS = Counter('http_requests_total', '處理的請求數（不受取樣影響）', ('view', 'method', 'status'))
+REQUEST_DURATION = Histogram('http_request_duration_seconds', '取樣請求的總處理時間',
+                             ('view', 'method', 'status'))
+DB_QUERIES = Histogram('http_request_db_queries', '取樣請求的資料庫查詢數', ('view',), COUNT_BUCKETS)
+DB_DURATION = Histogram('http_request_db_duration_seconds', '取樣請求的資料庫查詢時間合計', ('view',))
+SERIALIZE_DURATION = Histogram('http_request_serialize_duration_seconds', '取樣請求的序列化時間（serializer 與 render）',
+                               ('view',))
+UPSTREAM_CALLS = Histogram('http_request_upstream_calls', '取樣請求呼叫其他服務的次數',
+                           ('view', 'upstream'), COUNT_BUCKETS)
+UPSTREAM_DURATION = Histogram('upstream_request_duration_seconds', '呼叫其他服務的單次耗時（含重試）',
+                              ('upstream',))
+
+REGISTRY = [REQUESTS, REQUEST_DURATION, DB_QUERIES, DB_DURATION, SERIALIZE_DURATION, UPSTREAM_CALLS,
+            UPSTREAM_DURATION]
+
+
+class RequestMetrics:
+    """單一取樣請求的耗時累計；各階段為 {名稱: [次數, 秒數]}"""
+
+    __slots__ = ('phases',)
+
+    def __init__(self):
+        self.phases: Dict[str, list] = {}
+
+    def add(self, phase: str, seconds: float, count: int = 1):
+        entry = self.phases.get(phase)
+        if entry is None:
+            self.phases[phase] = [count, seconds]
+        else:
+            entry[0] += count
+            entry[1] += seconds
+
+    def get(self, phase: str) -> Tuple[int, float]:
+        count, seconds = self.phases.get(phase, (0, 0.0))
+        return count, seconds
+
+
+# 目前請求的累計物件；未取樣的請求為 None，各記錄點直接略過
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar('request_metrics', default=None)
+
+
+def current() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+def should_sample() -> bool:
+    rate = getattr(settings, 'PERF_METRICS_SAMPLE_RATE', 1.0)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def activate(metrics: Optional[RequestMetrics]):
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timer(phase: str):
+    """計時一段程式碼並計入目前取樣請求的指定階段，例如 with timer('serialize'): ..."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(phase, time.perf_counter() - start)
+
+
+@contextmanager
+def track_upstream(name: str):
+    """計時一次對外部服務的呼叫（含重試），計入目前請求與 upstream_request_duration_seconds"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.add(f'upstream:{name}', elapsed)
+        UPSTREAM_DURATION.observe(elapsed, name)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """資料庫查詢計時；安裝在每條連線上，未取樣的請求只多一次 ContextVar 讀取"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add('db', time.perf_counter() - start)
+
+
+def install_db_wrapper(connection, **kwargs):
+    """connection_created 訊號接收器，也可直接對既有連線呼叫"""
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+def record_request(view: str, method: str, status: int, total: float, metrics: RequestMetrics):
+    """將取樣請求的各階段耗時寫入直方圖"""
+    REQUEST_DURATION.observe(total, view, method, status)
+    queries, db_seconds = metrics.get('db')
+    DB_QUERIES.observe(queries, view)
+    DB_DURATION.observe(db_seconds, view)
+    _, serialize_seconds = metrics.get('serialize')
+    SERIALIZE_DURATION.observe(serialize_seconds, view)
+    for phase, (count, _) in metrics.phases.items():
+        if phase.startswith('upstream:'):
+            UPSTREAM_CALLS.observe(count, view, phase[len('upstream:'):])
+
+
+def server_timing(total: float, metrics: RequestMetrics) -> str:
+    """Server-Timing 標頭值，耗時以毫秒表示"""
+    entries = []
+    for phase, (count, seconds) in metrics.phases.items():
+        name = phase.replace(':', '-')
+        entries.append(f'{name};dur={seconds * 1000:.2f};desc="{count}"')
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+def _multiproc_dir() -> Optional[str]:
+    return getattr(settings, 'PERF_METRICS_MULTIPROC_DIR', '') or None
+
+
+class _ProcessFile:
+    """本行程在多行程目錄中的檔案；fork 後的子行程改用新的檔名"""
+
+    def __init__(self):
+        self.pid = None
+        self.name = None
+        self.flushed_at = 0.0
+        self.lock = threading.Lock()
+
+    def path(self, directory: str) -> str:
+        if self.pid != os.getpid():
+            os.makedirs(directory, exist_ok=True)
+            self.pid = os.getpid()
+            # 檔名加上隨機值：重新啟動的 worker 可能拿到相同的 pid，不能覆寫已結束行程的累計值
+            self.name = f'{self.pid}-{uuid.uuid4().hex[:8]}.json'
+            self.flushed_at = 0.0
+            atexit.register(flush, force=True)
+        return os.path.join(directory, self.name)
+
+
+_process_file = _ProcessFile()
+
+
+def flush(force: bool = False):
+    """多行程模式：把本行程的累計值寫入 PERF_METRICS_MULTIPROC_DIR，最多每秒一次
+
+    gunicorn 有多個 worker 時，/metrics 的請求只會落在其中一個 worker；
+    各 worker 把累計值寫入共用目錄，抓取時由回應的 worker 讀取所有檔案加總。
+    已結束的 worker（例如 max_requests 重新啟動）的檔案保留，計數器不會倒退；目錄在 gunicorn 啟動時清空。
+    """
+    directory = _multiproc_dir()
+    if directory is None:
+        return
+    now = time.monotonic()
+    if not force and now - _process_file.flushed_at < MULTIPROC_FLUSH_INTERVAL:
+        return
+    with _process_file.lock:
+        try:
+            path = _process_file.path(directory)
+        except OSError as exc:
+            logger.warning(f"效能指標無法寫入 {directory}: {exc}")
+            return
+        _process_file.flushed_at = now
+        data = {metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+                for metric in REGISTRY}
+        temporary = f'{path}.tmp'
+        try:
+            with open(temporary, 'w') as file:
+                json.dump(data, file)
+            # 以 rename 取代，讀取端不會讀到寫到一半的檔案
+            os.replace(temporary, path)
+        except OSError as exc:
+            # 指標寫入失敗不影響請求
+            logger.warning(f"效能指標無法寫入 {directory}: {exc}")
+
+
+def _collect(directory: str) -> Dict[str, Dict]:
+    """讀取所有行程的檔案並加總"""
+    flush(force=True)
+    metrics_by_name = {metric.name: metric for metric in REGISTRY}
+    merged: Dict[str, Dict] = {name: {} for name in metrics_by_name}
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, series in data.items():
+            metric = metrics_by_name.get(name)
+            if metric is None:
+                continue
+            for labels, value in series:
+                metric.combine(merged[name], tuple(labels), value)
+    return merged
+
+
+def render_metrics() -> str:
+    directory = _multiproc_dir()
+    merged = _collect(directory) if directory else {}
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose(merged[metric.name] if directory else None))
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """清除所有累計值（測試用）"""
+    for metric in REGISTRY:
+        metric.clear()
+
+
+def metrics_view(request):
+    """Prometheus 文字格式的指標；設定 PERF_METRICS_MULTIPROC_DIR 時為所有 worker 的加總，否則為回應的 worker 本身"""
+    if not getattr(settings, 'PERF_METRICS_ENABLED', True):
+        raise Http404
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,173 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from . import metrics, tracing
+
+
+class QueryCountMiddleware:
+    """在回應加上 X-DB-Query-Count 標頭，供壓測工具統計各端點的查詢數
+
+    只在 QUERY_COUNT_HEADER = True 時啟用；串流回應只計算開始傳送前的查詢，
+    async view 在其他執行緒執行的查詢不會被計入。
+    """
+
+    header = 'X-DB-Query-Count'
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_COUNT_HEADER', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        count = 0
+
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        response[self.header] = str(count)
+        return response
+
+
+class PerformanceMetricsMiddleware:
+    """記錄每個請求的總時間、資料庫查詢數與時間、對外服務呼叫與回應序列化時間
+
+    依 PERF_METRICS_SAMPLE_RATE 取樣，未取樣的請求只累計請求數；取樣請求的耗時寫入
+    /metrics 的直方圖，PERF_SERVER_TIMING = True 時另外附上 Server-Timing 標頭。
+    串流回應只計算開始傳送前的時間。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PERF_SERVER_TIMING', True)
+        # 之後建立的連線（包括 async view 使用的執行緒）都會安裝計時 wrapper
+        connection_created.connect(metrics.install_db_wrapper, dispatch_uid='perf_metrics_db_wrapper')
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not metrics.should_sample():
+            response = self.get_response(request)
+            metrics.REQUESTS.inc(_view_name(request), request.method, response.status_code)
+            metrics.flush()
+            return response
+
+        request_metrics, token, start = self._begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+        return self._finish(request, response, request_metrics, start)
+
+    async def __acall__(self, request):
+        if not metrics.should_sample():
+            response = await self.get_response(request)
+            metrics.REQUESTS.inc(_view_name(request), request.method, response.status_code)
+            metrics.flush()
+            return response
+
+        request_metrics, token, start = self._begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+        return self._finish(request, response, request_metrics, start)
+
+    def _begin(self):
+        metrics.install_db_wrapper(connection)
+        request_metrics = metrics.RequestMetrics()
+        return request_metrics, metrics.activate(request_metrics), time.perf_counter()
+
+    def _finish(self, request, response, request_metrics, start):
+        total = time.perf_counter() - start
+        view = _view_name(request)
+        metrics.REQUESTS.inc(view, request.method, response.status_code)
+        metrics.record_request(view, request.method, response.status_code, total, request_metrics)
+        metrics.flush()
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing(total, request_metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        """DRF Response 在 view 回傳後才 render，以 render 前後的時間作為序列化時間"""
+        request_metrics = metrics.current()
+        if request_metrics is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                request_metrics.add('serialize', time.perf_counter() - start)
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+class TracingMiddleware:
+    """分散式追蹤的入口：沿用請求的 traceparent 標頭，沒有時產生新的 trace
+
+    view、資料庫查詢與經由 ServiceClient 的對外呼叫都記錄為這個 span 的子 span，
+    對外呼叫會帶上 traceparent，下游服務的 span 因此屬於同一個 trace。
+    回應附上 X-Trace-Id 標頭，方便以 trace ID 查詢。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'TRACING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        connection_created.connect(tracing.install_db_wrapper, dispatch_uid='tracing_db_wrapper')
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        span = self._begin(request)
+        with tracing.activate(span):
+            response = self.get_response(request)
+            return self._finish(request, response, span)
+
+    async def __acall__(self, request):
+        span = self._begin(request)
+        with tracing.activate(span):
+            response = await self.get_response(request)
+            return self._finish(request, response, span)
+
+    def _begin(self, request):
+        tracing.install_db_wrapper(connection)
+        span = tracing.start_server_span(request.method, request.META.get('HTTP_TRACEPARENT'))
+        span.set_attribute('http.method', request.method)
+        span.set_attribute('http.target', request.get_full_path())
+        return span
+
+    def _finish(self, request, response, span):
+        route = _view_name(request)
+        span.name = f'{request.method} {route}'
+        span.set_attribute('http.route', route)
+        span.set_attribute('http.status_code', response.status_code)
+        if response.status_code >= 500:
+            span.status = tracing.STATUS_ERROR
+        response['X-Trace-Id'] = span.trace_id
+        return response
+
+
+def _view_name(request):
+    """以 URL 樣式作為標籤，避免每個商品 ID 產生一組時間序列"""
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
@@ -0,0 +1,159 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.pagination import BasePagination
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .serializers import BaseResponseSerializer
+
+
+class InvalidCursor(APIException):
+    """游標無法解析或已被修改；回應格式與 BaseResponseSerializer.fail 相同"""
+    status_code = status.HTTP_400_BAD_REQUEST
+    error_code = 'INVALID_CURSOR'
+
+    def __init__(self, message):
+        super().__init__(message)
+        # DRF 的 exception_handler 直接輸出 dict 型別的 detail
+        self.detail = BaseResponseSerializer.fail(message=message, error_code=self.error_code).data
+
+
+class KeysetPagination(BasePagination):
+    """Keyset（游標）分頁
+
+    以排序欄位的值作為游標，下一頁以 WHERE (created_at, id) < (...) 取得，
+    深層頁面不需要 OFFSET 掃過前面所有資料。排序的最後一個欄位必須唯一（通常是 id），
+    且排序欄位不可為 NULL。視圖可以設定 keyset_ordering 或 get_keyset_ordering() 改變排序。
+    """
+
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = '無效的分頁游標'
+
+    def get_ordering(self, view):
+        if hasattr(view, 'get_keyset_ordering'):
+            return tuple(view.get_keyset_ordering())
+        return tuple(getattr(view, 'keyset_ordering', self.ordering))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering_fields = self.get_ordering(view)
+        self.page_size_value = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset.model)
+
+        reverse = False
+        if cursor is not None:
+            reverse, values = cursor
+            queryset = queryset.filter(self._keyset_filter(values, reverse))
+
+        ordering = self.ordering_fields
+        if reverse:
+            ordering = tuple(self._invert(field) for field in ordering)
+        rows = list(queryset.order_by(*ordering)[:self.page_size_value + 1])
+
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.next_values = self._row_values(rows[-1]) if rows and self.has_next else None
+        self.previous_values = self._row_values(rows[0]) if rows and self.has_previous else None
+        return rows
+
+    def get_paginated_data(self, data):
+        """分頁資料，放在 BaseResponseSerializer 的 data 欄位中"""
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+    def get_paginated_response(self, data):
+        return BaseResponseSerializer.success(data=self.get_paginated_data(data))
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        return self._link(False, self.next_values)
+
+    def get_previous_link(self):
+        if self.previous_values is None:
+            return None
+        return self._link(True, self.previous_values)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query', 'schema': {'type': 'integer'}},
+        ]
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def _keyset_filter(self, values, reverse):
+        """展開成 (a < x) OR (a = x AND b < y) ...，並加上首欄位的範圍條件方便使用索引"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering_fields, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        first = self.ordering_fields[0]
+        bound = 'lte' if first.startswith('-') != reverse else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
+
+    def _row_values(self, row):
+        # values() 查詢的資料列為 dict
+        if isinstance(row, dict):
+            return [row[field.lstrip('-')] for field in self.ordering_fields]
+        return [getattr(row, field.lstrip('-')) for field in self.ordering_fields]
+
+    def _link(self, reverse, values):
+        payload = {'r': int(reverse), 'v': [v.isoformat() if hasattr(v, 'isoformat') else str(v) for v in values]}
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            raw_values = payload['v']
+            # 排序欄位不可為 NULL；clean() 另外檢查整數範圍，這些值直接用於 WHERE 條件
+            if len(raw_values) != len(self.ordering_fields) or None in raw_values:
+                raise ValueError
+            values = [
+                model._meta.get_field(field.lstrip('-')).clean(raw, None)
+                for field, raw in zip(self.ordering_fields, raw_values)
+            ]
+            return bool(payload['r']), values
+        except (TypeError, ValueError, KeyError, FieldDoesNotExist, DjangoValidationError):
+            raise InvalidCursor(self.invalid_cursor_message)
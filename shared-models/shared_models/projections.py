@@ -0,0 +1,133 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from django.conf import settings
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import empty
+from rest_framework.settings import api_settings
+
+# 資料庫回傳的值已是輸出型別，to_representation 不會改變內容，直接複製
+PASSTHROUGH_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+
+
+class Projection:
+    """以 values() 查詢的 dict 產生與 serializer 相同的輸出，省去 DRF 逐欄位的屬性存取與呼叫
+
+    欄位對應在建立時由 serializer 的欄位編譯一次：每個輸出欄位記錄 values() 的鍵與轉換函式，
+    轉換沿用欄位本身的 to_representation（Decimal、datetime 的格式與 DRF 設定一致），
+    int、str、bool 直接複製。巢狀 serializer 與 SerializerMethodField 列在 external 中，
+    由呼叫端以 row(values, external) 提供，輸出時仍維持 serializer 的欄位順序。
+    """
+
+    def __init__(self, serializer_class, external: Sequence[str] = (), fields: Optional[Sequence[str]] = None):
+        self.serializer_class = serializer_class
+        self.external = tuple(external)
+        self._compiled = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only or (fields is not None and name not in fields):
+                continue
+            if name in self.external:
+                self._compiled.append((name, None, None, False))
+            else:
+                self._compiled.append((name, self._key(field), self._converter(field), self._omit_null(field)))
+        self.names = [name for name, _, _, _ in self._compiled]
+        # values() 需要查詢的欄位
+        self.columns = list(dict.fromkeys(key for _, key, _, _ in self._compiled if key is not None))
+        self._subsets: Dict = {}
+
+    @staticmethod
+    def _key(field) -> str:
+        if isinstance(field, serializers.SerializerMethodField) or isinstance(field, serializers.BaseSerializer):
+            raise ValueError(f'欄位 {field.field_name} 無法由 values() 產生，請列在 external 中')
+        # source='category.name' 對應 values('category__name')；外鍵欄位對應 values('category') 即主鍵
+        return field.source.replace('.', '__')
+
+    @staticmethod
+    def _converter(field):
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            return None
+        if isinstance(field, PASSTHROUGH_FIELDS):
+            return None
+        if isinstance(field, serializers.ChoiceField) and all(
+            key == value for key, value in field.choice_strings_to_values.items()
+        ):
+            # 字串選項的輸出即資料庫中的值
+            return None
+        if isinstance(field, serializers.DecimalField):
+            return _decimal_converter(field)
+        if isinstance(field, serializers.DateTimeField):
+            return _datetime_converter(field)
+        return field.to_representation
+
+    @staticmethod
+    def _omit_null(field) -> bool:
+        # 與 DRF 相同：巢狀來源（category.name）的中間物件為 None 時，非必填欄位不輸出
+        return '.' in field.source and field.default is empty and not field.allow_null and not field.required
+
+    def only(self, names: Iterable[str]) -> 'Projection':
+        """稀疏欄位：只輸出指定的欄位（依原本的欄位順序），未知的欄位由 parse_fields_param 檢查"""
+        names = set(names)
+        names = tuple(name for name in self.names if name in names)
+        if names not in self._subsets:
+            self._subsets[names] = Projection(self.serializer_class, self.external, names)
+        return self._subsets[names]
+
+    def row(self, values: Dict, external: Optional[Dict] = None) -> Dict:
+        data = {}
+        for name, key, convert, omit_null in self._compiled:
+            if key is None:
+                data[name] = external[name]
+                continue
+            value = values[key]
+            if value is None:
+                if not omit_null:
+                    data[name] = None
+            else:
+                data[name] = value if convert is None else convert(value)
+        return data
+
+    def rows(self, rows: Iterable[Dict]) -> List[Dict]:
+        return [self.row(values) for values in rows]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+
+def _decimal_converter(field):
+    """資料庫回傳的 Decimal 已是欄位的小數位數，直接格式化；其他情況交給 to_representation"""
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.decimal_places is None:
+        return field.to_representation
+    exponent = -field.decimal_places
+    to_representation = field.to_representation
+
+    def convert(value):
+        if value.is_finite() and value.as_tuple().exponent == exponent:
+            return '{:f}'.format(value)
+        return to_representation(value)
+    return convert
+
+
+def _datetime_converter(field):
+    """USE_TZ = False 時資料庫回傳不含時區的 datetime，ISO 8601 輸出即 isoformat()"""
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if settings.USE_TZ or output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    to_representation = field.to_representation
+
+    def convert(value):
+        if getattr(value, 'tzinfo', True) is None:
+            return value.isoformat()
+        return to_representation(value)
+    return convert
+
+
+def parse_fields_param(value: Optional[str], available: Sequence[str]) -> Optional[List[str]]:
+    """解析 ?fields=id,name；未指定時回傳 None 表示全部欄位，包含未知欄位時拋出 ValueError"""
+    if not value:
+        return None
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise ValueError(f"fields 包含未知的欄位: {', '.join(unknown)}（可用: {', '.join(available)}）"
+                         if unknown else 'fields 不可為空')
+    return names
@@ -0,0 +1,72 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# PostgreSQL: "Seq Scan on products_product"；SQLite: "SCAN products_product"（不含 USING INDEX）
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING (?:COVERING )?INDEX)'),
+}
+
+
+def estimate_rows(table):
+    """估計資料表筆數；PostgreSQL 使用統計資訊，不實際 COUNT"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+        row = cursor.fetchone()
+    return max(row[0], 0) if row else 0
+
+
+def find_seq_scans(queryset, analyze=False):
+    """回傳 (執行計畫, 有循序掃描的資料表清單)"""
+    pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+    if pattern is None:
+        raise CommandError(f'不支援的資料庫: {connection.vendor}')
+    plan = queryset.explain(analyze=True) if analyze else queryset.explain()
+    return plan, sorted(set(pattern.findall(plan)))
+
+
+class BaseQueryPlanCommand(BaseCommand):
+    """對各端點實際使用的查詢執行 EXPLAIN，回報大型資料表上的循序掃描
+
+    子類別實作 get_querysets()，回傳 [(名稱, QuerySet), ...]。
+    """
+
+    help = "對各端點的查詢執行 EXPLAIN，回報大型資料表上的循序掃描"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=10000,
+                            help='資料表筆數達到此值才視為大型資料表（預設 10000）')
+        parser.add_argument('--analyze', action='store_true', help='使用 EXPLAIN ANALYZE（會實際執行查詢）')
+        parser.add_argument('--verbose-plans', action='store_true', help='輸出完整執行計畫')
+
+    def get_querysets(self):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        table_rows = {}
+        problems = 0
+
+        for name, queryset in self.get_querysets():
+            plan, tables = find_seq_scans(queryset, analyze=options['analyze'])
+            large = []
+            for table in tables:
+                if table not in table_rows:
+                    table_rows[table] = estimate_rows(table)
+                if table_rows[table] >= options['min_rows']:
+                    large.append(f'{table} (~{table_rows[table]} 筆)')
+
+            if large:
+                problems += 1
+                self.stdout.write(self.style.WARNING(f'[SEQ SCAN] {name}: {", ".join(large)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'[OK] {name}'))
+            if options['verbose_plans'] or large:
+                self.stdout.write(plan)
+
+        if problems:
+            raise CommandError(f'{problems} 個查詢在大型資料表上使用循序掃描')
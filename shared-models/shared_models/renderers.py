@@ -0,0 +1,57 @@
+import logging
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+logger = logging.getLogger(__name__)
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+# orjson 模組；None 表示尚未載入，False 表示未安裝
+_orjson = None
+
+
+def load_orjson():
+    """第一次輸出時才載入 orjson，未安裝時回傳 None"""
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson
+        except ImportError:
+            logger.warning('未安裝 orjson，ORJSONRenderer 改用 JSONRenderer 輸出')
+            orjson = False
+        _orjson = orjson
+    return _orjson or None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """以 orjson 輸出與 JSONRenderer 相同內容的 JSON
+
+    datetime、date、time 與 UUID 由 orjson 直接處理；Decimal、timedelta、lazy 字串等其他型別
+    沿用 DRF JSONEncoder.default 的轉換規則。以下情況交給 JSONRenderer 處理，輸出完全相同：
+    未安裝 orjson、要求縮排（Accept: application/json; indent=4）、UNICODE_JSON = False，
+    或 orjson 無法處理的值（例如超過 64 位元的整數）。
+    與 JSONRenderer 的差異只在極大或極小的浮點數指數寫法（1e16 對 1e+16，數值相同），
+    以及 NaN/Infinity 輸出為 null 而不是拋出例外。
+    """
+
+    default = staticmethod(encoders.JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        orjson = load_orjson()
+        if orjson is None or self.ensure_ascii or not self.compact or \
+                self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # 與 JSONRenderer 一致，跳脫 U+2028、U+2029 讓輸出是合法的 JavaScript
+        if LINE_SEPARATOR in ret or PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028').replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
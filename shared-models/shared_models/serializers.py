@@ -24,6 +24,16 @@ class BaseResponseSerializer:
             "data": data
         }, status=status.HTTP_201_CREATED)
     
+    @staticmethod
+    def accepted(data=None, message="已受理"):
+        """已受理、稍後處理的回應"""
+        return Response({
+            "result": True,
+            "errorCode": "",
+            "message": message,
+            "data": data
+        }, status=status.HTTP_202_ACCEPTED)
+    
     @staticmethod
     def fail(message="操作失敗", error_code="OPERATION_FAILED", data=None, status_code=status.HTTP_400_BAD_REQUEST):
         """失敗回應"""
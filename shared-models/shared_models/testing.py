@@ -0,0 +1,39 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountAssertionsMixin:
+    """測試用：確認端點的查詢次數不會隨資料筆數成長（N+1 防護）
+
+    用法：
+        self.assertQueriesDoNotScale(self.create_products, lambda: self.client.get('/api/products/'))
+    """
+
+    query_count_sizes = (2, 10)
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as context:
+            response = func()
+        return context, response
+
+    def assertQueriesDoNotScale(self, create_rows, request, sizes=None):
+        """依序建立不同筆數的資料並呼叫 request，各次的查詢數必須相同
+
+        create_rows(n) 需讓資料總數成為 n；request() 回傳的回應必須為 2xx。
+        """
+        sizes = sizes or self.query_count_sizes
+        results = []
+        for size in sizes:
+            create_rows(size)
+            context, response = self.count_queries(request)
+            self.assertLess(response.status_code, 300, getattr(response, 'content', b'')[:500])
+            results.append((size, context))
+
+        baseline_size, baseline = results[0]
+        for size, context in results[1:]:
+            if len(context) != len(baseline):
+                queries = '\n'.join(query['sql'] for query in context.captured_queries)
+                self.fail(
+                    f'查詢數隨資料筆數成長：{baseline_size} 筆時 {len(baseline)} 次，'
+                    f'{size} 筆時 {len(context)} 次\n{queries}'
+                )
@@ -0,0 +1,324 @@
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# W3C Trace Context：version-trace_id-parent_id-flags
+TRACEPARENT_HEADER = 'traceparent'
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+# OTLP 的 SpanKind 數值
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+MAX_STATEMENT_LENGTH = 500
+
+
+class Span:
+    """一段有開始與結束時間的操作；結束時交給匯出器"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'sampled', 'start_ns', 'end_ns',
+                 'attributes', 'status')
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: int, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = _random_hex(16)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes: Dict = {}
+        self.status = STATUS_UNSET
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.status = STATUS_ERROR
+        self.attributes['error.type'] = type(error).__name__
+        self.attributes['error.message'] = str(error)[:500]
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.sampled:
+                get_exporter().export(self)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def _random_hex(length: int) -> str:
+    return f'{random.getrandbits(length * 4):0{length}x}'
+
+
+_current: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def parse_traceparent(value: Optional[str]):
+    """解析 traceparent 標頭，回傳 (trace_id, parent_id, sampled)；格式錯誤時回傳 None"""
+    match = TRACEPARENT_RE.match((value or '').strip().lower())
+    if not match:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == '0' * 32 or parent_id == '0' * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+def start_server_span(name: str, traceparent: Optional[str] = None) -> Span:
+    """請求入口的 span：沿用上游傳入的 trace，沒有時在此產生新的 trace 並決定是否取樣"""
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+    else:
+        rate = settings.TRACING_SAMPLE_RATE
+        trace_id, parent_id = _random_hex(32), None
+        sampled = rate >= 1 or (rate > 0 and random.random() < rate)
+    return Span(trace_id, parent_id, name, KIND_SERVER, sampled)
+
+
+@contextmanager
+def activate(span: Span):
+    """將 span 設為目前的 span，區塊結束時還原並結束 span"""
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+
+
+@contextmanager
+def start_span(name: str, kind: int = KIND_INTERNAL, attributes: Optional[Dict] = None):
+    """建立目前 span 的子 span；不在追蹤中的請求回傳 None"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    span = Span(parent.trace_id, parent.span_id, name, kind, parent.sampled)
+    if attributes:
+        span.attributes.update(attributes)
+    with activate(span):
+        yield span
+
+
+def inject(headers: Dict) -> Dict:
+    """在對外請求的標頭加上目前 span 的 traceparent"""
+    span = _current.get()
+    if span is not None:
+        headers[TRACEPARENT_HEADER] = span.traceparent
+    return headers
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """每個查詢一個 span；未追蹤或未取樣時直接執行"""
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return execute(sql, params, many, context)
+    connection = context['connection']
+    with start_span('db.query', attributes={
+        'db.system': connection.vendor,
+        'db.statement': sql[:MAX_STATEMENT_LENGTH],
+    }):
+        return execute(sql, params, many, context)
+
+
+def install_db_wrapper(connection, **kwargs):
+    """connection_created 訊號接收器，也可直接對既有連線呼叫"""
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes: Dict) -> List[Dict]:
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items()]
+
+
+def otlp_payload(service_name: str, spans: List[Span]) -> Dict:
+    """OTLP/HTTP JSON 格式（ExportTraceServiceRequest）"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': _otlp_attributes({'service.name': service_name})},
+        'scopeSpans': [{
+            'scope': {'name': 'shared_models.tracing'},
+            'spans': [{
+                'traceId': span.trace_id,
+                'spanId': span.span_id,
+                'parentSpanId': span.parent_id or '',
+                'name': span.name,
+                'kind': span.kind,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns),
+                'attributes': _otlp_attributes(span.attributes),
+                'status': {'code': span.status},
+            } for span in spans],
+        }],
+    }]}
+
+
+class BatchExporter:
+    """背景執行緒批次匯出 span，請求執行緒只負責放入佇列；佇列滿時丟棄"""
+
+    def __init__(self, service_name: str, batch_size: int = 512, interval: float = 1.0,
+                 max_queue: int = 10000):
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        # gunicorn fork 後的 worker 需要自己的背景執行緒
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            spans = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(spans) < self.batch_size:
+                try:
+                    spans.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self.write(spans)
+            except Exception as e:
+                logger.warning(f"匯出 {len(spans)} 個 span 失敗: {e}")
+
+    def flush(self):
+        """同步匯出佇列中剩餘的 span（測試與管理命令結束前使用）"""
+        spans = []
+        while True:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if spans:
+            self.write(spans)
+
+    def write(self, spans: List[Span]):
+        raise NotImplementedError
+
+
+class FileExporter(BatchExporter):
+    """每批 span 寫成一行 OTLP JSON，可用 scripts/trace_report.py 檢視或轉送給 collector"""
+
+    def __init__(self, service_name: str, path: str, **kwargs):
+        super().__init__(service_name, **kwargs)
+        self.path = path
+
+    def write(self, spans: List[Span]):
+        line = json.dumps(otlp_payload(self.service_name, spans), ensure_ascii=False)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+class OTLPExporter(BatchExporter):
+    """以 OTLP/HTTP JSON 送到 collector，例如 http://otel-collector:4318/v1/traces"""
+
+    def __init__(self, service_name: str, endpoint: str, timeout: float = 2.0, **kwargs):
+        super().__init__(service_name, **kwargs)
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._session = None
+
+    def write(self, spans: List[Span]):
+        import requests
+
+        if self._session is None:
+            self._session = requests.Session()
+        response = self._session.post(self.endpoint, json=otlp_payload(self.service_name, spans),
+                                      timeout=self.timeout)
+        response.raise_for_status()
+
+
+class MemoryExporter:
+    """保存在記憶體中（測試用）"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def flush(self):
+        pass
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = _build_exporter()
+    return _exporter
+
+
+def set_exporter(exporter):
+    """替換匯出器，回傳原本的匯出器"""
+    global _exporter
+    with _exporter_lock:
+        previous, _exporter = _exporter, exporter
+    return previous
+
+
+def _build_exporter():
+    if settings.TRACING_EXPORTER == 'otlp':
+        return OTLPExporter(settings.TRACING_SERVICE_NAME, settings.TRACING_OTLP_ENDPOINT)
+    if settings.TRACING_EXPORTER == 'memory':
+        return MemoryExporter()
+    return FileExporter(settings.TRACING_SERVICE_NAME, settings.TRACING_FILE)